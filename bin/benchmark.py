@@ -0,0 +1,574 @@
+#!/usr/bin/env python
+"""
+Benchmarks for textbites resources.
+
+usage: benchmark.py search [bible.json file] [--repeat N]
+       benchmark.py memory [bible.json file]
+       benchmark.py startup [bible.json file]
+       benchmark.py ingest [bible.json file]
+       benchmark.py resolve [bible.json file] [--count N]
+       benchmark.py fold [bible.json file]
+       benchmark.py trigram [bible.json file]
+       benchmark.py rank [bible.json file] [--translations N] [-k K]
+       benchmark.py load <data dir> [--processes N]
+       benchmark.py suite [data files...] [--output results.json]
+       benchmark.py compare <old results.json> <new results.json>
+       benchmark.py scale [--books 1,16,66] [--quotes 1000,100000]
+
+"""
+import argparse
+import gc
+import json
+import os.path
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from textbites import library
+from textbites import synthetic
+from textbites.api import REFERENCE_ERRORS, Index
+from textbites.bible.bible import BibleResource
+from textbites.bible.binary import write_binary
+from textbites.bible.data import BIBLE_ABBRS
+from textbites.books import BookResource
+from textbites.quotes import Quote
+from textbites.simple_books import LineResource
+
+
+DEFAULT_BIBLE = os.path.join(os.path.dirname(__file__),
+    "../textbites/data/NKJV.bible.json")
+SEARCH_QUERIES = ["love", "(?i)lord", r"Mr\.", "^And", "the [a-z]+ of",
+                  r"\d+", "(?i)daughter|wife"]
+DATA_DIR = os.path.join(os.path.dirname(__file__), "../textbites/data")
+SUITE_FILES = [os.path.join(DATA_DIR, f) for f in
+    ["_PnP_Sample.bible.json", "PnP_Sample.simple.json", "Quotes.quotes.tsv"]]
+SUITE_FORMATS = ["bible.json", "bible.bin", "simple.json", "quotes.tsv"]
+SUITE_QUERIES = [("literal", "love"), ("literal_phrase", "in the"),
+                 ("ignorecase", "(?i)the lord"), ("regex", "the [a-z]+ of"),
+                 ("anchored", "^And")]
+FOLD_QUERIES = ["(?i)the lord", r"(?i)mr\. bennet", "(?i)in the", "(?i)love,",
+                "(?i)nomatch here"]
+RANK_QUERIES = ["love", "the lord", "faith hope love", "daughter wife mother",
+                "nomatch"]
+
+
+def best_of(func, repeat):
+  """ Return (result, best seconds) of calling func repeat times.
+  """
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return result, best
+
+
+def bench_search(args):
+  """ Compare line by line search against single buffer search over
+      the whole Bible.
+  """
+  scanned = BibleResource.from_json(args.file)
+  buffered = BibleResource.from_json(args.file, text_buffer=True)
+  # time the searches themselves, not the result cache
+  scanned.result_cache.resize(0)
+  buffered.result_cache.resize(0)
+  print("Searching {} lines".format(len(scanned.lines)))
+  print("{:<16} {:>8} {:>10} {:>10} {:>8}".format(
+      "query", "hits", "scan ms", "buffer ms", "speedup"))
+  for query in SEARCH_QUERIES:
+    scan_hits, scan_time = best_of(
+        lambda: scanned.top_reference().search(query), args.repeat)
+    buf_hits, buf_time = best_of(
+        lambda: buffered.top_reference().search(query), args.repeat)
+    assert ([h.pretty() for h in scan_hits] ==
+            [h.pretty() for h in buf_hits]), query
+    print("{:<16} {:>8} {:>10.2f} {:>10.2f} {:>7.1f}x".format(
+        query, len(scan_hits), scan_time * 1000, buf_time * 1000,
+        scan_time / buf_time))
+
+
+def traced(func):
+  """ Return (result, bytes allocated and still held, peak bytes) of
+      calling func.
+  """
+  gc.collect()
+  tracemalloc.start()
+  result = func()
+  current, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return result, current, peak
+
+
+def bench_memory(args):
+  """ Compare the memory held by a Bible stored as Line objects against
+      one stored compactly in a LineTable.
+  """
+  print("{:<10} {:>10} {:>10} {:>8}".format(
+      "layout", "held MB", "peak MB", "B/line"))
+  held = {}
+  for layout, compact in [("objects", False), ("compact", True)]:
+    res, held[layout], peak = traced(lambda: BibleResource.from_json(
+        args.file, compact=compact))
+    print("{:<10} {:>10.1f} {:>10.1f} {:>8.0f}".format(layout,
+        held[layout] / 1e6, peak / 1e6, held[layout] / len(res.lines)))
+    del res
+  print("compact holds {:.1f}x less".format(held["objects"] / held["compact"]))
+
+
+def bench_ingest(args):
+  """ Compare peak memory while loading a Bible by decoding the whole
+      JSON file first against streaming it.
+  """
+  print("{:<8} {:>10} {:>10} {:>10} {:>10}".format(
+      "mode", "held MB", "peak MB", "peak/held", "seconds"))
+  for mode, stream in [("decoded", False), ("stream", True)]:
+    start = time.perf_counter()
+    res, held, peak = traced(lambda: BibleResource.from_json(
+        args.file, compact=True, stream=stream))
+    elapsed = time.perf_counter() - start
+    print("{:<8} {:>10.1f} {:>10.1f} {:>10.2f} {:>10.2f}".format(
+        mode, held / 1e6, peak / 1e6, peak / held, elapsed))
+    del res
+
+
+def bench_startup(args):
+  """ Compare cold start to a first reference lookup from JSON against
+      the memory mapped binary format.
+  """
+  tmpdir = tempfile.mkdtemp()
+  try:
+    bin_file = os.path.join(tmpdir, "bench.bible.bin")
+    res = BibleResource.from_json(args.file)
+    write_binary(res, bin_file)
+    # a verse from the middle, so it works for any bible
+    str_ref = res.lines[len(res.lines) // 2].pretty()
+    loaders = [("json", lambda: BibleResource.from_json(args.file)),
+               ("binary", lambda: BibleResource.from_binary(bin_file))]
+    print("Looking up", str_ref)
+    print("{:<8} {:>10}".format("format", "ms"))
+    times = {}
+    for name, loader in loaders:
+      text, times[name] = best_of(
+          lambda: loader().reference(str_ref).text(), args.repeat)
+      print("{:<8} {:>10.2f}".format(name, times[name] * 1000))
+    print("binary starts {:.0f}x faster".format(times["json"] / times["binary"]))
+  finally:
+    shutil.rmtree(tmpdir)
+
+
+def bench_fold(args):
+  """ Compare case insensitive plain text queries scanned line by line
+      against searching the folded text, and report its memory.
+  """
+  scanned = BibleResource.from_json(args.file)
+  folded = BibleResource.from_json(args.file, folded_text=True)
+  scanned.result_cache.resize(0)
+  folded.result_cache.resize(0)
+  print("{:<18} {:>8} {:>10} {:>10} {:>8}".format(
+      "query", "hits", "scan ms", "folded ms", "speedup"))
+  for query in FOLD_QUERIES:
+    scan_hits, scan_time = best_of(
+        lambda: scanned.top_reference().search(query), args.repeat)
+    fold_hits, fold_time = best_of(
+        lambda: folded.top_reference().search(query), args.repeat)
+    assert ([h.pretty() for h in scan_hits] ==
+            [h.pretty() for h in fold_hits]), query
+    print("{:<18} {:>8} {:>10.2f} {:>10.2f} {:>7.1f}x".format(
+        query, len(scan_hits), scan_time * 1000, fold_time * 1000,
+        scan_time / fold_time))
+  print("folded text holds {:.1f} MB".format(
+      folded.index_sizes()["folded_text"] / 1e6))
+
+
+def bench_trigram(args):
+  """ Compare regex queries scanned line by line against narrowing them
+      to candidate lines with the trigram index, and report its memory.
+  """
+  scanned = BibleResource.from_json(args.file)
+  start = time.perf_counter()
+  indexed = BibleResource.from_json(args.file, trigram_index=True)
+  print("loaded with trigram index in {:.1f} ms".format(
+      (time.perf_counter() - start) * 1000))
+  scanned.result_cache.resize(0)
+  indexed.result_cache.resize(0)
+  print("{:<18} {:>8} {:>10} {:>10} {:>8}".format(
+      "query", "hits", "scan ms", "trigram ms", "speedup"))
+  for query in SEARCH_QUERIES + FOLD_QUERIES:
+    scan_hits, scan_time = best_of(
+        lambda: scanned.top_reference().search(query), args.repeat)
+    hits, indexed_time = best_of(
+        lambda: indexed.top_reference().search(query), args.repeat)
+    assert ([h.pretty() for h in scan_hits] ==
+            [h.pretty() for h in hits]), query
+    print("{:<18} {:>8} {:>10.2f} {:>10.2f} {:>7.1f}x".format(
+        query, len(hits), scan_time * 1000, indexed_time * 1000,
+        scan_time / indexed_time))
+  print("trigram index holds {:.1f} MB".format(
+      indexed.index_sizes()["trigram_index"] / 1e6))
+
+
+def reference_strings(res, count, seed=15):
+  """ Return count reference strings to lines of res in common forms,
+      chosen at random.
+  """
+  rand = random.Random(seed)
+  lines = res.lines
+  str_refs = []
+  for _ in range(count):
+    line = lines[rand.randrange(len(lines))]
+    book = rand.choice([line.book, BIBLE_ABBRS.get(line.book, line.book)])
+    str_refs.append(rand.choice([
+        "%s %d:%d" % (book, line.cnum, line.lnum),
+        "%s %d:%d-%d" % (book, line.cnum, line.lnum, line.lnum + 2),
+        "%s %d" % (book, line.cnum)]))
+  return str_refs
+
+
+def bench_resolve(args):
+  """ Compare resolving reference strings one call at a time against
+      resolving them as a batch.
+  """
+  res = BibleResource.from_json(args.file)
+  str_refs = reference_strings(res, args.count)
+
+  def each():
+    results = []
+    for str_ref in str_refs:
+      try:
+        results.append(res.reference(str_ref))
+      except REFERENCE_ERRORS as e:
+        results.append(e)
+    return results
+
+  print("{:<8} {:>10} {:>12}".format("mode", "ms", "refs/s"))
+  times = {}
+  for mode, func in [("each", each),
+                     ("batch", lambda: res.resolve_many(str_refs))]:
+    results, times[mode] = best_of(func, args.repeat)
+    print("{:<8} {:>10.1f} {:>12.0f}".format(
+        mode, times[mode] * 1000, len(str_refs) / times[mode]))
+  print("batch is {:.1f}x faster".format(times["each"] / times["batch"]))
+
+
+def bench_rank(args):
+  """ Time ranked search for the top k lines across a library of several
+      translations, against searching all of them for the same words.
+  """
+  names = ["translation%d" % n for n in range(1, args.translations + 1)]
+  for name in names:
+    res = BibleResource.from_json(args.file)
+    res.result_cache.resize(0)
+    library.add(name, res)
+  start = time.perf_counter()
+  library.ranked_search("warm", args.k, names)
+  print("built {} ranking indexes in {:.1f} ms".format(
+      len(names), (time.perf_counter() - start) * 1000))
+  print("{:<24} {:>8} {:>10} {:>10}".format(
+      "query", "hits", "search ms", "top k ms"))
+  for query in RANK_QUERIES:
+    pattern = r"(?i)\b(?:%s)\b" % "|".join(query.split())
+    hits, search_time = best_of(lambda: [h for name in names for h in
+        library.get(name).top_reference().search(pattern)], args.repeat)
+    _, rank_time = best_of(
+        lambda: library.ranked_search(query, args.k, names), args.repeat)
+    print("{:<24} {:>8} {:>10.2f} {:>10.2f}".format(
+        query, len(hits), search_time * 1000, rank_time * 1000))
+
+
+def bench_load(args):
+  """ Compare loading a data directory one file at a time against
+      parsing the files in a process pool.
+  """
+  start = time.perf_counter()
+  library.dynamically_load_dir(args.dir, lazy=False)
+  serial = time.perf_counter() - start
+  library._resources.clear()
+  report = library.parallel_load_dir(args.dir, args.processes)
+  print("{:<30} {:>10}".format("file", "parse ms"))
+  for f, seconds in sorted(report["files"].items()):
+    print("{:<30} {:>10.1f}".format(f, seconds * 1000))
+  print("serial {:.1f} ms, parallel {:.1f} ms, {:.1f}x faster".format(
+      serial * 1000, report["wall"] * 1000, serial / report["wall"]))
+
+
+def sample_references(res, count, seed=15):
+  """ Return count reference strings in the common forms for the format
+      of res, chosen at random.
+  """
+  if isinstance(res, BibleResource):
+    return reference_strings(res, count, seed)
+  rand = random.Random(seed)
+  leaves = list(res.walk())
+  str_refs = []
+  for _ in range(count):
+    leaf = leaves[rand.randrange(len(leaves))]
+    if isinstance(leaf, Quote):
+      str_refs.append(rand.choice([leaf.speaker, leaf.qid]))
+    else:
+      # by position, as ViewBooks lines don't hold their numbers
+      cnum = leaf.parent().position() + 1
+      lnum = leaf.position() + 1
+      end = min(lnum + 2, len(leaf.parent()))
+      str_refs.append(rand.choice([
+          "%d:%d" % (cnum, lnum),
+          "%d:%d-%d" % (cnum, lnum, end),
+          "%d" % cnum,
+          "%d-%d" % (cnum, cnum)]))
+  return str_refs
+
+
+def suite_record(results, benchmark, resource, func, repeat, count=1):
+  """ Time func, and trace its peak memory, adding the result.
+  """
+  _, seconds = best_of(func, repeat)
+  _, held, peak = traced(func)
+  result = { "benchmark" : benchmark,
+             "resource" : resource,
+             "count" : count,
+             "seconds" : seconds,
+             "us_per_op" : seconds * 1e6 / count,
+             "peak_bytes" : peak }
+  results.append(result)
+  print("{:<24} {:<24} {:>8} {:>12.2f} {:>10.1f}".format(benchmark,
+      resource, count, result["us_per_op"], peak / 1e3), file=sys.stderr)
+
+
+def suite_resource(results, name, res, args):
+  """ Run the reference, traversal, text and search benchmarks on res.
+  """
+  str_refs = sample_references(res, args.count)
+
+  def parse():
+    for str_ref in str_refs:
+      try:
+        res.reference(str_ref)
+      except REFERENCE_ERRORS:
+        pass
+  suite_record(results, "reference", name, parse, args.repeat, len(str_refs))
+
+  leaves = list(res.walk())
+  parents = []
+  for leaf in leaves:
+    if not parents or leaf.parent() is not parents[-1]:
+      parents.append(leaf.parent())
+
+  def children(ref=res.top_reference()):
+    return 1 + sum(children(c) for c in ref.children() or [])
+  suite_record(results, "traverse/children", name, children, args.repeat,
+               len(leaves))
+
+  def forward():
+    for parent in parents:
+      ref = parent.children()[0]
+      while ref != None:
+        ref = next(ref)
+  suite_record(results, "traverse/next", name, forward, args.repeat,
+               len(leaves))
+
+  def backward():
+    for parent in parents:
+      ref = parent.children()[-1]
+      while ref != None:
+        ref = ref.previous()
+  suite_record(results, "traverse/previous", name, backward, args.repeat,
+               len(leaves))
+
+  suite_record(results, "text/lines", name,
+      lambda: [l.text() for l in leaves], args.repeat, len(leaves))
+  if isinstance(res, LineResource):
+    suite_record(results, "text/chapters", name,
+        lambda: [c.text() for c in parents], args.repeat, len(parents))
+    ranges = [res.resolve(Index(c.children()[0].line_num,
+                                c.children()[min(4, len(c) - 1)].line_num))
+                for c in parents]
+    suite_record(results, "text/ranges", name,
+        lambda: [r.text() for r in ranges], args.repeat, len(ranges))
+
+  cache = getattr(res, "result_cache", None)
+  if cache != None:
+    cache.resize(0)
+  for kind, query in SUITE_QUERIES:
+    suite_record(results, "search/" + kind, name,
+        lambda: res.top_reference().search(query), args.repeat)
+
+
+def bench_suite(args):
+  """ Time loading each data file, per format, then reference parsing,
+      traversal, text and search over the loaded resource, writing the
+      timings and memory peaks as JSON.
+  """
+  results = []
+  tmpdir = tempfile.mkdtemp()
+  print("{:<24} {:<24} {:>8} {:>12} {:>10}".format(
+      "benchmark", "resource", "count", "us/op", "peak KB"), file=sys.stderr)
+  try:
+    for datafile in args.files:
+      fmt = [f for f in SUITE_FORMATS if datafile.endswith(f)]
+      if not fmt:
+        print("Unknown resource format for file:", datafile, file=sys.stderr)
+        continue
+      files = [(fmt[0], datafile)]
+      if fmt[0] == "bible.json":
+        # the binary format too, loaded first so the JSON one is measured
+        bin_file = os.path.join(tmpdir,
+            os.path.basename(datafile)[:-len("json")] + "bin")
+        write_binary(BibleResource.from_json(datafile), bin_file)
+        files.insert(0, ("bible.bin", bin_file))
+      for fmt, path in files:
+        name = library._loader_for(path)[0]
+        suite_record(results, "load/" + fmt, name,
+            lambda: library.load(path, lazy=False), args.repeat)
+      suite_resource(results, name, library.get(name), args)
+      if fmt == "simple.json":
+        # the library loads SimpleBooks, so time the ViewBooks design too
+        name += " (ViewBooks)"
+        suite_record(results, "load/simple.json", name,
+            lambda: BookResource.from_json(datafile), args.repeat)
+        suite_resource(results, name, BookResource.from_json(datafile), args)
+  finally:
+    shutil.rmtree(tmpdir)
+  write_report(results, args)
+
+
+def write_report(results, args):
+  """ Write the results as JSON to args.output, or standard output.
+  """
+  report = { "python" : platform.python_version(),
+             "platform" : platform.platform(),
+             "repeat" : args.repeat,
+             "created" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+             "results" : results }
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent=1)
+  else:
+    json.dump(report, sys.stdout, indent=1)
+    print()
+
+
+def bench_scale(args):
+  """ Time loading, reference parsing and search over generated bibles
+      and quotes of increasing size, writing the results as JSON.
+  """
+  results = []
+  tmpdir = tempfile.mkdtemp()
+  print("{:<24} {:<24} {:>8} {:>12} {:>10}".format(
+      "benchmark", "resource", "count", "us/op", "peak KB"), file=sys.stderr)
+  try:
+    files = []
+    for books in args.books:
+      filename = os.path.join(tmpdir, "SYN%dbooks.bible.json" % books)
+      synthetic.write_bible(filename, args.seed, books=books)
+      files.append(filename)
+    for count in args.quotes:
+      filename = os.path.join(tmpdir, "SYN%d.quotes.tsv" % count)
+      synthetic.write_quotes(filename, args.seed, count, max(count // 10, 1))
+      files.append(filename)
+    for filename in files:
+      name = library._loader_for(filename)[0]
+      fmt = filename.split(".", 1)[1]
+      suite_record(results, "load/" + fmt, name,
+          lambda: library.load(filename, lazy=False), args.repeat)
+      res = library.get(name)
+      str_refs = sample_references(res, args.count, args.seed)
+      suite_record(results, "reference", name,
+          lambda: res.resolve_many(str_refs), args.repeat, len(str_refs))
+      cache = getattr(res, "result_cache", None)
+      if cache != None:
+        cache.resize(0)
+      for kind, query in SUITE_QUERIES:
+        suite_record(results, "search/" + kind, name,
+            lambda: res.top_reference().search(query), args.repeat)
+      library._resources.pop(name, None)
+  finally:
+    shutil.rmtree(tmpdir)
+  write_report(results, args)
+
+
+def bench_compare(args):
+  """ Compare the per operation times of two suite runs.
+  """
+  runs = []
+  for filename in [args.old, args.new]:
+    with open(filename) as f:
+      runs.append(dict(((r["benchmark"], r["resource"]), r)
+                         for r in json.load(f)["results"]))
+  old, new = runs
+  print("{:<24} {:<24} {:>12} {:>12} {:>8}".format(
+      "benchmark", "resource", "old us/op", "new us/op", "new/old"))
+  for key in sorted(set(old) & set(new)):
+    before = old[key]["us_per_op"]
+    after = new[key]["us_per_op"]
+    print("{:<24} {:<24} {:>12.2f} {:>12.2f} {:>8.2f}".format(
+        key[0], key[1], before, after, after / before if before else 0.0))
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description="textbites benchmarks")
+  common = argparse.ArgumentParser(add_help=False)
+  common.add_argument("--repeat", type=int, default=5,
+                      help="take the best of this many runs")
+  bible = argparse.ArgumentParser(add_help=False)
+  bible.add_argument("file", nargs="?", default=DEFAULT_BIBLE,
+                     help="bible.json file")
+  commands = parser.add_subparsers(dest="command")
+  commands.required = True
+  for name, func in [("search", bench_search), ("memory", bench_memory),
+                     ("startup", bench_startup), ("ingest", bench_ingest),
+                     ("fold", bench_fold), ("trigram", bench_trigram)]:
+    command = commands.add_parser(name, parents=[common, bible],
+                                  help=func.__doc__)
+    command.set_defaults(func=func)
+  resolve = commands.add_parser("resolve", parents=[common, bible],
+                                help=bench_resolve.__doc__)
+  resolve.add_argument("--count", type=int, default=100000,
+                       help="number of reference strings")
+  resolve.set_defaults(func=bench_resolve)
+  rank = commands.add_parser("rank", parents=[common, bible],
+                             help=bench_rank.__doc__)
+  rank.add_argument("--translations", type=int, default=3,
+                    help="number of copies of the bible to load")
+  rank.add_argument("-k", type=int, default=10, help="number of top lines")
+  rank.set_defaults(func=bench_rank)
+  load = commands.add_parser("load", parents=[common], help=bench_load.__doc__)
+  load.add_argument("dir", help="data directory")
+  load.add_argument("--processes", type=int, default=None)
+  load.set_defaults(func=bench_load)
+  suite = commands.add_parser("suite", parents=[common],
+                              help=bench_suite.__doc__)
+  suite.add_argument("files", nargs="*", default=SUITE_FILES,
+                     help="bible.json, simple.json or quotes.tsv files")
+  suite.add_argument("--count", type=int, default=1000,
+                     help="number of reference strings per resource")
+  suite.add_argument("--output", default=None,
+                     help="JSON file to write, else standard output")
+  suite.set_defaults(func=bench_suite)
+  scale = commands.add_parser("scale", parents=[common],
+                              help=bench_scale.__doc__)
+  sizes = lambda value: [int(size) for size in value.split(",")]
+  scale.add_argument("--books", type=sizes, default=[1, 16, 66],
+                     help="comma separated numbers of books per bible")
+  scale.add_argument("--quotes", type=sizes, default=[1000, 100000],
+                     help="comma separated numbers of quotes")
+  scale.add_argument("--seed", type=int, default=0)
+  scale.add_argument("--count", type=int, default=1000,
+                     help="number of reference strings per resource")
+  scale.add_argument("--output", default=None,
+                     help="JSON file to write, else standard output")
+  scale.set_defaults(func=bench_scale)
+  compare = commands.add_parser("compare", help=bench_compare.__doc__)
+  compare.add_argument("old", help="results of an earlier suite run")
+  compare.add_argument("new", help="results of a later suite run")
+  compare.set_defaults(func=bench_compare)
+  args = parser.parse_args(argv[1:])
+  args.func(args)
+
+if __name__ == "__main__":
+  main(sys.argv)
@@ -10,6 +10,7 @@ import sys
 import re
 
 from textbites import library
+from textbites import instrument
 try:
   from pybible.data import BOOK_GROUPS
 except ImportError:
@@ -39,13 +40,14 @@ def load_library(resources):
       f = os.path.realpath(
         os.path.join(os.path.dirname(library.__file__), 
           "data/{}.bible.json".format(arg.upper())))
-      library.load(f)
+      if not library.load(f):
+        print("No resource found for:", arg)
   else:
     # load everything we find
     library.load_resources()
   print("Loading into library:", library.resources())
-  # map to lowercase resource names
-  return dict([(k.lower(),library.get(k)) for k in library.resources()])
+  # map lowercase to resource names, which are loaded when first used
+  return dict([(k.lower(), k) for k in library.resources()])
 
 def main(args):
   def cur_resname():
@@ -54,7 +56,7 @@ def main(args):
   setup_readline()
   resources = load_library(args[1:])
   # default is first resource loaded
-  cur_resource = list(resources.values())[0]
+  cur_resource = library.get(list(resources.values())[0])
   print("Setting resource to:", cur_resname())
   # for searching
   context = [cur_resource.top_reference()]
@@ -132,14 +134,14 @@ def main(args):
         break
     for query in tokenize_query(raw_query):
       if query in resources:
-        cur_resource = resources.get(query)
+        cur_resource = library.get(resources.get(query))
         print("Setting resource to:", cur_resname())
         context = [cur_resource.top_reference()]
       elif query in BOOK_GROUPS:
         context = [cur_resource.reference(b) for b in BOOK_GROUPS.get(query)]
         print("Setting resource to:", context_str())
       elif query in ('help', '?'):
-        print("Valid input: <resource|refernce|book or group to scope|search> or format <lines|block>")
+        print("Valid input: <resource|refernce|book or group to scope|search> or format <lines|block> or stats [on|off|reset]")
       elif query.startswith("format"):
         if query == "format lines":
           one_per_line = True
@@ -147,6 +149,19 @@ def main(args):
           one_per_line = False
         else:
           print("Say 'format lines' or 'format block'")
+      elif query.startswith("stats"):
+        if query == "stats on":
+          instrument.enable()
+        elif query == "stats off":
+          instrument.disable()
+        elif query == "stats reset":
+          instrument.reset()
+        elif query == "stats":
+          print(instrument.to_json())
+          if not instrument.enabled():
+            print("Timing is off, say 'stats on' to start it.")
+        else:
+          print("Say 'stats', 'stats on', 'stats off' or 'stats reset'")
       elif len(query.strip()):
         try:
           ref = cur_resource.reference(query)
@@ -1 +1 @@
-python  -m unittest "$@" test.test_library test.test_books test.test_simple_books test.test_quotes test.test_bible
+python  -m unittest "$@" test.test_library test.test_books test.test_simple_books test.test_quotes test.test_bible test.test_word_index test.test_text_buffer test.test_patterns test.test_json_stream test.test_result_cache test.test_intervals test.test_folded_text test.test_positional test.test_bm25 test.test_trigram test.test_synthetic test.test_instrument
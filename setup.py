@@ -5,7 +5,7 @@ setup(
     version='0.2.0',
     author='John Lehmann',
     author_email='john.lehmann@gmail.com',
-    packages=['textbites', 'textbites.bible'],
+    packages=['textbites', 'textbites.bible', 'textbites.search'],
     package_data={'textbites': ['data/*']},
     scripts=[],
     url='',
@@ -3,14 +3,20 @@
 Test functionality of books.
 """
 import unittest
+import tempfile
+import shutil
 
-from textbites.bible.bible import BibleResource
+from textbites.api import InvalidReferenceError
+from textbites.bible.bible import BibleResource, Bible
+from textbites.simple_books import Book, Chapter, build_lines
+from textbites.bible.binary import write_binary
+from textbites import library
 
 from . import test_simple_books
 import os.path
 
 
-SAMPLE_FILE = os.path.join(os.path.dirname(__file__), "../textbites/data/_PnP_Sample.bible.json")
+from .test_books_base import SAMPLE_FILE
 BIBLE_FILE = os.path.join(os.path.dirname(__file__), "../textbites/data/NKJV.bible.json")
 
 
@@ -30,6 +36,53 @@ class TestBibleBooksImpl(test_simple_books.TestSimpleBooksImpl, unittest.TestCas
     return self.res.top_reference().children()[0]
 
 
+class TestBibleBooksImplCompact(TestBibleBooksImpl):
+  """ Same contract with lines stored in a LineTable.
+  """
+
+  @classmethod
+  def setUpClass(cls):
+    cls.res = BibleResource.from_json(SAMPLE_FILE, compact=True)
+
+  def setUp(self):
+    self.res = TestBibleBooksImplCompact.res
+
+
+class TestBibleBooksImplBinary(TestBibleBooksImpl):
+  """ Same contract loading from the memory mapped binary format.
+  """
+
+  @classmethod
+  def setUpClass(cls):
+    cls.tmpdir = tempfile.mkdtemp()
+    cls.bin_file = os.path.join(cls.tmpdir, "Sample.bible.bin")
+    write_binary(BibleResource.from_json(SAMPLE_FILE), cls.bin_file)
+    cls.res = BibleResource.from_binary(cls.bin_file)
+
+  @classmethod
+  def tearDownClass(cls):
+    del cls.res
+    shutil.rmtree(cls.tmpdir)
+
+  def setUp(self):
+    self.res = TestBibleBooksImplBinary.res
+
+  def tearDown(self):
+    library._resources.pop("Sample", None)
+    library._sources.pop("Sample", None)
+
+  def test_same_lines(self):
+    expected = BibleResource.from_json(SAMPLE_FILE)
+    self.assertEqual(self.res.top_reference().pretty(), "TEST")
+    self.assertEqual([(l.pretty(), l.text(), l.line_num) for l in self.res.lines],
+        [(l.pretty(), l.text(), l.line_num) for l in expected.lines])
+
+  def test_library_load(self):
+    self.assertTrue(library.load(self.bin_file))
+    self.assertEqual(library.get("Sample").reference("1:2").pretty(),
+                     "PRIDE AND PREJUDICE 1:2")
+
+
 class TestBibleBooksImplWithBible(unittest.TestCase):
   """ Create the implementation-specific system under test which 
   is the Resource.
@@ -168,6 +221,63 @@ class TestBibleBooksImplWithBible(unittest.TestCase):
 
 
 
+class TestBookLookup(unittest.TestCase):
+  """ Book names are found through a dict of spellings, without the full
+  Bible data.
+  """
+
+  def setUp(self):
+    books = []
+    line_num = 0
+    for title in ["Mark", "John", "1 John"]:
+      lines = build_lines(title, 1, [(1, title + " one"), (2, title + " two")],
+                          line_num)
+      line_num += len(lines)
+      books.append(Book([Chapter(title, 1, lines)], title))
+    self.bible = Bible(books, "TEST")
+    self.bible._resource = BibleResource(self.bible)
+    self.res = self.bible.resource()
+
+  def test_get_book(self):
+    self.assertEqual(self.bible.get_book("John").title, "John")
+    self.assertRaises(InvalidReferenceError, self.bible.get_book, "jn")
+
+  def test_find_book_spellings(self):
+    from textbites.bible.bibleapi import normalize_book_name
+    for name in ["John", "jn", "jN", "JOHN", "1jn", "1 jn", "1 John", "mk"]:
+      self.assertEqual(self.bible.find_book(name).title,
+                       normalize_book_name(name))
+    self.assertEqual(self.bible.find_book("nothing"), None)
+    self.assertEqual(self.bible.find_book(None), None)
+
+  def test_reference(self):
+    self.assertEqual(self.res.reference("1jn 1:2").text(), "1 John two")
+    self.assertEqual(self.res.reference("jn").pretty(), "John")
+
+  def test_missing_book(self):
+    self.assertRaises(InvalidReferenceError, self.res.reference, "gen 1:1")
+    self.assertRaises(InvalidReferenceError, self.res.reference, "gen")
+
+  def test_resolve_many(self):
+    str_refs = ["jn 1:1", "1jn 1:2", "gen 1:1", "jn 5:1", "jn 1:1-9",
+                "garbage!", "jn", " jn 1:1 ", "Mark 1"]
+    results = self.res.resolve_many(str_refs)
+    self.assertEqual(len(results), len(str_refs))
+    for str_ref, result in zip(str_refs, results):
+      try:
+        expected = self.res.reference(str_ref).pretty()
+      except Exception as e:
+        self.assertIsInstance(result, type(e))
+      else:
+        self.assertEqual(result.pretty(), expected)
+    self.assertIs(results[0], results[7])
+
+  def test_reference_memoized(self):
+    ref = self.res.reference("jn 1:1")
+    self.assertIs(self.res.reference(" jn 1:1 "), ref)
+    self.assertEqual(self.res._references.stats()["hits"], 1)
+
+
   """
 TODO: Move to bible project
 #from pybible.bibref import BibleReference
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Test BM25 ranked search of lines and quotes.
+"""
+import os.path
+import unittest
+
+from textbites.search.bm25 import BM25Index
+from textbites.simple_books import SimpleBookResource
+from textbites.bible.bible import BibleResource
+from textbites.quotes import QuotesResource
+from textbites import library as Library
+
+from .test_books_base import DATA_FILE
+from .test_bible import SAMPLE_FILE
+from .test_quotes import TSV_DATA_FILE
+
+
+TEXTS = ["love one another", "faith without works is dead",
+         "love love love", "the greatest of these is love, said the one",
+         "nothing here"]
+
+
+class TestBM25Index(unittest.TestCase):
+
+  def setUp(self):
+    self.index = BM25Index.from_texts(TEXTS)
+
+  def test_order(self):
+    ranked = [pos for score, pos in self.index.top("love")]
+    self.assertEqual(ranked, [2, 0, 3])
+    scores = [score for score, pos in self.index.top("love")]
+    self.assertEqual(scores, sorted(scores, reverse=True))
+
+  def test_rare_words_weigh_more(self):
+    self.assertTrue(self.index.idf("faith") > self.index.idf("love"))
+    self.assertEqual([pos for score, pos in self.index.top("one faith")][0], 1)
+
+  def test_k_and_span(self):
+    self.assertEqual(len(self.index.top("love", 2)), 2)
+    self.assertEqual(self.index.top("love", 0), [])
+    self.assertEqual([pos for score, pos in self.index.top("love", 10, 1, 3)],
+                     [2])
+    self.assertEqual(self.index.top("nomatch"), [])
+    self.assertEqual(self.index.top("LOVE"), self.index.top("love"))
+
+  def test_ties_in_order(self):
+    index = BM25Index.from_texts(["a b", "b a", "a b"])
+    self.assertEqual([pos for score, pos in index.top("a")], [0, 1, 2])
+
+
+class TestRankedSearch(unittest.TestCase):
+
+  def assertRanked(self, ranked, hits, k):
+    """ Ranked results are the best k hits, best first.
+    """
+    self.assertEqual(len(ranked), min(k, len(hits)))
+    hit_names = set(h.pretty() for h in hits)
+    for score, ref in ranked:
+      self.assertTrue(ref.pretty() in hit_names)
+    scores = [score for score, ref in ranked]
+    self.assertEqual(scores, sorted(scores, reverse=True))
+
+  def test_simple_book(self):
+    res = SimpleBookResource.from_json(DATA_FILE)
+    book = res.top_reference()
+    ranked = book.ranked_search("daughter bennet", 3)
+    self.assertRanked(ranked, book.search(r"(?i)\b(daughter|bennet)\b"), 3)
+    self.assertIs(ranked[0][1], res.line(ranked[0][1].line_num))
+    chapter = res.reference("2")
+    self.assertRanked(chapter.ranked_search("the"),
+                      chapter.search(r"(?i)\bthe\b"), 10)
+    self.assertTrue("bm25_index" in res.index_sizes())
+
+  def test_bible(self):
+    res = BibleResource.from_json(SAMPLE_FILE)
+    bible = res.top_reference()
+    self.assertRanked(bible.ranked_search("my dear"),
+                      bible.search(r"(?i)\b(my|dear)\b"), 10)
+
+  def test_quotes(self):
+    res = QuotesResource.from_tsv(TSV_DATA_FILE)
+    ranked = res.ranked_search("love life", 5)
+    self.assertRanked(ranked, res.search(r"(?i)\b(love|life)\b"), 5)
+    self.assertEqual(res.ranked_search("nomatch"), [])
+
+
+class TestLibraryRankedSearch(unittest.TestCase):
+
+  def setUp(self):
+    Library.load(DATA_FILE)
+    Library.load(TSV_DATA_FILE)
+
+  def tearDown(self):
+    for name in ["PnP_Sample", "Quotes"]:
+      Library._resources.pop(name, None)
+
+  def test_merged(self):
+    ranked = Library.ranked_search("love daughter", 4, ["PnP_Sample", "Quotes"])
+    self.assertEqual(len(ranked), 4)
+    scores = [score for score, name, ref in ranked]
+    self.assertEqual(scores, sorted(scores, reverse=True))
+    best = (Library.get("PnP_Sample").top_reference().ranked_search("love daughter", 4) +
+            Library.get("Quotes").ranked_search("love daughter", 4))
+    self.assertEqual(scores, sorted([s for s, ref in best], reverse=True)[:4])
@@ -75,4 +75,36 @@ class TestBooksImpl(TestInterface, unittest.TestCase):
     
 #}}}
 
+  # view cache
+#{{{
+  def test_views_reused(self):
+    first = list(self.res.walk())
+    created = self.res.view_cache.stats()["created"]
+    second = list(self.res.walk())
+    self.assertEqual(self.res.view_cache.stats()["created"], created)
+    for a, b in zip(first, second):
+      self.assertIs(a, b)
+    self.assertIs(self.res.reference("2:3"), first[4])
+    self.assertIs(self.res.reference("2"), first[4].parent())
+
+  def test_views_shared_while_held(self):
+    self.res.view_cache.resize(0)
+    chapter = self.res.reference("2")
+    lines = chapter.children()
+    self.assertIs(self.res.reference("2:3"), lines[2])
+    self.assertIs(lines[2].parent(), chapter)
+    stats = self.res.view_cache.stats()
+    self.assertEqual(stats["size"], 0)
+    self.assertTrue(stats["reused"] > 0)
+    self.assertEqual(stats["shared"], len(lines) + 1)
+#}}}
+
+
+class TestBooksImplStreamed(TestBooksImpl):
+  """ Same contract when loaded incrementally.
+  """
+
+  def setUp(self):
+    self.res = BookResource.from_json(TestInterface.data_filename, stream=True)
+
 
@@ -2,15 +2,109 @@
 """
 Test functionality of books.
 """
+import json
 import os
 import os.path
+import shutil
+import tempfile
 
 from textbites.api import Reference, InvalidReferenceError
+from textbites.simple_books import SimpleBookResource
+from textbites.books import BookResource
+from textbites.bible.bible import BibleResource
 
 
 DATA_FILE = os.path.join(os.path.dirname(__file__), "../textbites/data/PnP_Sample.simple.json")
+SAMPLE_FILE = os.path.join(os.path.dirname(__file__), "../textbites/data/_PnP_Sample.bible.json")
 BOOK_NAME = "PRIDE AND PREJUDICE"
 
+# searches which every search structure must answer as a line scan does
+SEARCH_QUERIES = ["daughter", "daughter\n", "Mr", "(?i)mr", "the", "(?i)THE",
+    "love|wife", "(?i)bennet|bingley", "nomatchhere", "Mr\\.", "^It", "a w",
+    "\\.$", "(?i)BENNET", "d[aeiou]ugh", "^$", "s\\s+[A-Z]", "",
+    "(?i)mr. bennet", "(?i)daughter\n", "(?i)MY DEAR", "(?i)mr\\.",
+    "(?i)nomatch here", "(?i)of a", "Mr. Bennet", "the [a-z]+ of", "^And",
+    "\\d+", "(?i)DAUGHTER|wife", "Eliza(beth)?", "wa+s", "(?i:MY) dear",
+    "my (?-i:DEAR)", "^(?!The).*Bennet", "(?x) my \\s dear", "ab",
+    # case folding beyond ASCII
+    "(?i)istanbul", "(?i)İstanbul", "(?i)some", "(?i)ſome", "(?i)ii",
+    "(?i)ıi", "(?i)kiss", "(?i)sign k", "(?i)café", "(?i)strasse",
+    "(?i)STRAẞE",
+    # lookahead at the end of a line
+    "\\.(?=\\s)", "\\.(?!\\s)", "\\w(?=$)", "d(?!$)"]
+# lines which lowercasing the text, or sharing a buffer, would search wrongly
+SEARCH_LINES = ["İstanbul, ſome KIſS and the Kelvin sign K.", "ıi",
+                "a.", "b.c", "d.", "Café CAFÉ straße", "Mr. Bennet said"]
+
+
+class SameHitsTest(object):
+  """ Checks that searches with a search structure enabled give the same
+  hits as scanning every line, over the sample data and SEARCH_LINES.
+  Subclass with unittest.TestCase and set options to the from_json
+  arguments enabling the structure.
+  """
+  options = {}
+  queries = SEARCH_QUERIES
+  # whether the ViewBooks BookResource takes the options
+  books = False
+
+  @classmethod
+  def setUpClass(cls):
+    cls.tmp_dir = tempfile.mkdtemp()
+    cls.lines_file = os.path.join(cls.tmp_dir, "Lines.simple.json")
+    with open(cls.lines_file, 'w') as f:
+      json.dump({ "title" : "LINES", "author" : "Test",
+                  "chapters" : [{ "name" : "Chapter %d" % cnum,
+                                  "text" : "\n".join(SEARCH_LINES) }
+                                for cnum in [1, 2, 3]] }, f)
+    cls.lines_bible = os.path.join(cls.tmp_dir, "LINES.bible.json")
+    with open(cls.lines_bible, 'w') as f:
+      json.dump({ "version" : "LINES",
+                  "books" : [{ "name" : "Genesis",
+                               "chapters" : [{ "num" : 1,
+                                   "verses" : [{ "num" : vnum, "text" : text }
+                                     for vnum, text in enumerate(SEARCH_LINES, 1)]
+                               }] }] }, f)
+
+  @classmethod
+  def tearDownClass(cls):
+    shutil.rmtree(cls.tmp_dir)
+
+  def indexed_hits(self, ref, query):
+    return ref.search(query)
+
+  def scanned_hits(self, ref, query):
+    return ref.search(query)
+
+  def assertSameHits(self, indexed, scanned):
+    for query in self.queries:
+      self.assertEqual([h.pretty() for h in self.indexed_hits(indexed, query)],
+                       [h.pretty() for h in self.scanned_hits(scanned, query)],
+                       query)
+
+  def test_simple_book(self):
+    for filename in [DATA_FILE, self.lines_file]:
+      indexed = SimpleBookResource.from_json(filename, **self.options)
+      scanned = SimpleBookResource.from_json(filename)
+      self.assertSameHits(indexed.top_reference(), scanned.top_reference())
+      self.assertSameHits(indexed.reference("2:2-5"), scanned.reference("2:2-5"))
+
+  def test_bible(self):
+    for filename in [SAMPLE_FILE, self.lines_bible]:
+      indexed = BibleResource.from_json(filename, **self.options)
+      scanned = BibleResource.from_json(filename)
+      self.assertSameHits(indexed.top_reference(), scanned.top_reference())
+
+  def test_books(self):
+    if not self.books:
+      self.skipTest("BookResource doesn't take %s" % self.options)
+    for filename in [DATA_FILE, self.lines_file]:
+      indexed = BookResource.from_json(filename, **self.options)
+      scanned = BookResource.from_json(filename)
+      self.assertSameHits(indexed.top_reference(), scanned.top_reference())
+      self.assertSameHits(indexed.reference("2-3"), scanned.reference("2-3"))
+      self.assertSameHits(indexed.reference("2:2-5"), scanned.reference("2:2-5"))
+
 
 class TestInterface():
   """ Tests the contract for the interfaces Resource and Reference.
@@ -121,6 +215,33 @@ class TestInterface():
     self.assertIsInstance(ref, Reference)
     self.assertEqual(ref.children(), None)
 
+  def test_resolve_many(self):
+    results = self.res.resolve_many(["2:3", "chapter 2-5", "3"])
+    self.assertEqual(results[0].pretty(), BOOK_NAME + " 2:3")
+    self.assertIsInstance(results[1], InvalidReferenceError)
+    self.assertEqual(results[2].pretty(), BOOK_NAME + " 3")
+
+  def test_reference_siblings(self):
+    ref = self.res.reference("2:3")
+    self.assertEqual(ref.position(), 2)
+    self.assertEqual(ref.previous().pretty(), BOOK_NAME + " 2:2")
+    self.assertEqual(next(ref).pretty(), BOOK_NAME + " 2:4")
+    self.assertEqual(self.res.reference("2:1").previous(), None)
+    chapter = self.res.reference("2")
+    self.assertEqual(chapter.previous().pretty(), BOOK_NAME + " 1")
+    self.assertEqual(next(chapter).pretty(), BOOK_NAME + " 3")
+    last = chapter.children()[-1]
+    self.assertEqual(next(last), None)
+
+  def test_walk(self):
+    lines = list(self.res.walk())
+    book = self.get_test_book()
+    self.assertEqual(len(lines), sum(len(c.children()) for c in book.children()))
+    self.assertEqual(lines[0].pretty(), BOOK_NAME + " 1:1")
+    self.assertEqual(lines[-1].pretty(), BOOK_NAME + " 3:7")
+    self.assertEqual([l.pretty() for l in self.res.reference("2").walk()],
+        [l.pretty() for l in self.res.reference("2").children()])
+
 #}}}
 
   # Reference search()
@@ -190,10 +311,33 @@ class TestInterface():
     self.assertEqual(len(hits), 5)
     self.assertEqual(hits[1].pretty(), BOOK_NAME + " 2:5")
 
+  def test_book_search_paged(self):
+    book = self.get_test_book()
+    hits = [h.pretty() for h in book.search(r"Mr\.")]
+    self.assertEqual([h.pretty() for h in book.search(r"Mr\.", limit=2)],
+                     hits[:2])
+    self.assertEqual([h.pretty() for h in book.search(r"Mr\.", offset=1,
+                                                      limit=3)], hits[1:4])
+    self.assertEqual([h.pretty() for h in book.search(r"Mr\.", offset=2)],
+                     hits[2:])
+    self.assertEqual(book.search(r"Mr\.", offset=100), [])
+
+  def test_book_iter_search(self):
+    book = self.get_test_book()
+    hits = book.iter_search("daughter")
+    self.assertEqual(next(hits).pretty(), BOOK_NAME + " 1:2")
+    self.assertEqual([h.pretty() for h in hits],
+                     [BOOK_NAME + " 2:4", BOOK_NAME + " 3:1"])
+    hits = book.iter_search(r"Mr\.", first_chapter=2, last_chapter=2,
+                            first_line=2)
+    self.assertEqual([h.pretty() for h in hits],
+        [h.pretty() for h in book.search(r"Mr\.", first_chapter=2,
+                                         last_chapter=2, first_line=2)])
+
   def test_book_search_of_lines(self):
     # chapter 2:1-5
     lines = self.res.reference("2:1-5")
-    hits = lines.search("Mr\.")
+    hits = lines.search(r"Mr\.")
     self.assertEqual(len(hits), 2)
     self.assertEqual(hits[1].pretty(), BOOK_NAME + " 2:5")
 #}}}
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Test case insensitive search of the folded text and that it matches line by
+line search.
+"""
+import re
+import unittest
+
+from textbites.search.folded_text import FoldedText
+from textbites.simple_books import SimpleBookResource
+from textbites.books import BookResource
+
+from .test_books_base import DATA_FILE, SameHitsTest
+
+
+class TestFoldedText(unittest.TestCase):
+
+  def setUp(self):
+    self.texts = ["In the Beginning", "", "love one another", "God is LOVE."]
+    self.folded = FoldedText(self.texts)
+
+  def test_literal(self):
+    self.assertEqual(self.folded.literal("(?i)The Lord"), "the lord")
+    self.assertEqual(self.folded.literal(r"(?i)is love\."), "is love.")
+    self.assertEqual(self.folded.literal(re.compile("Love", re.I)), "love")
+    self.assertEqual(self.folded.literal("love"), None)
+    self.assertEqual(self.folded.literal("(?i)lo+ve"), None)
+    self.assertEqual(self.folded.literal(r"(?i)\w"), None)
+    self.assertEqual(self.folded.literal(re.compile("a b", re.I | re.X)), None)
+
+  def test_search(self):
+    for pattern in ["(?i)love", "(?i)N T", "(?i)is love\\.", "(?i)x"]:
+      expected = [i for i, t in enumerate(self.texts) if re.search(pattern, t)]
+      self.assertEqual(self.folded.search(pattern), expected, pattern)
+    self.assertEqual(self.folded.search("(?i)love", 3), [3])
+    self.assertEqual(self.folded.search("(?i)love", 0, 3), [2])
+
+  def test_folding(self):
+    folded = FoldedText(["İNN", "ſome", "ıi", "Café"])
+    self.assertEqual(folded.search("(?i)inn"), [0])
+    self.assertEqual(folded.search("(?i)SOME"), [1])
+    self.assertEqual(folded.search("(?i)ii"), [2])
+    self.assertEqual(folded.search("(?i)café"), None)
+
+  def test_unsupported(self):
+    self.assertEqual(self.folded.search("love"), None)
+    self.assertEqual(self.folded.search("(?i)^love"), None)
+
+  def test_nbytes(self):
+    self.assertTrue(self.folded.nbytes() > len(self.folded.buffer))
+
+
+class TestFoldedSearch(SameHitsTest, unittest.TestCase):
+  """ Search using the folded text must give the same hits as scanning.
+  """
+  options = { "folded_text" : True }
+  books = True
+
+  def test_index_sizes(self):
+    for res in [SimpleBookResource.from_json(DATA_FILE, folded_text=True),
+                BookResource.from_json(DATA_FILE, folded_text=True)]:
+      self.assertEqual(sorted(res.index_sizes()), ["folded_text"])
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Test timing instrumentation of library, reference and search calls.
+"""
+import json
+import unittest
+
+from textbites import instrument
+from textbites import library as Library
+from textbites.api import InvalidReferenceError
+from textbites.simple_books import Book, SimpleBookResource
+
+from .test_books_base import DATA_FILE
+
+
+class TestInstrument(unittest.TestCase):
+
+  def setUp(self):
+    instrument.reset()
+
+  def tearDown(self):
+    instrument.disable()
+    instrument.reset()
+    Library._resources.pop("PnP_Sample", None)
+
+  def test_disabled_unwrapped(self):
+    search = Book.search
+    loader_for = Library._loader_for
+    instrument.enable()
+    self.assertTrue(instrument.enabled())
+    self.assertIsNot(Book.search, search)
+    instrument.disable()
+    self.assertFalse(instrument.enabled())
+    self.assertIs(Book.search, search)
+    self.assertIs(Library._loader_for, loader_for)
+    SimpleBookResource.from_json(DATA_FILE).top_reference().search("wife")
+    self.assertEqual(instrument.stats(), {})
+
+  def test_counts(self):
+    instrument.enable()
+    Library.load(DATA_FILE, lazy=False)
+    res = Library.get("PnP_Sample")
+    for _ in range(3):
+      res.top_reference().search("daughter")
+    res.reference("2:3")
+    self.assertRaises(InvalidReferenceError, res.reference, "1:99")
+    stats = instrument.stats()["PnP_Sample"]
+    self.assertEqual(stats["load"]["count"], 1)
+    # only the outermost search is counted, not its chapters'
+    self.assertEqual(stats["search"]["count"], 3)
+    self.assertEqual(stats["search"]["results"], 9)
+    self.assertEqual(stats["reference"]["count"], 2)
+    self.assertEqual(stats["reference"]["errors"], 1)
+    search = stats["search"]
+    self.assertTrue(0 < search["p50"] <= search["p99"] <= search["max"])
+    self.assertAlmostEqual(search["mean"] * 3, search["total"])
+
+  def test_lazy_load(self):
+    """ A lazy load is timed when the resource is parsed, on first use.
+    """
+    instrument.enable()
+    Library.load(DATA_FILE)
+    self.assertEqual(instrument.stats(), {})
+    Library.get("PnP_Sample").reference("2:3")
+    Library.get("PnP_Sample")
+    stats = instrument.stats()["PnP_Sample"]
+    self.assertEqual(stats["load"]["count"], 1)
+    self.assertEqual(stats["reference"]["count"], 1)
+
+  def test_interrupted(self):
+    """ Calls after one interrupted by a BaseException are still recorded.
+    """
+    def interrupted(res):
+      raise KeyboardInterrupt()
+    timed = instrument._timed(interrupted, "search", lambda args: "x")
+    self.assertRaises(KeyboardInterrupt, timed, None)
+    self.assertEqual(instrument.stats()["x"]["search"]["errors"], 1)
+    instrument.enable()
+    res = SimpleBookResource.from_json(DATA_FILE)
+    res.top_reference().search("wife")
+    self.assertEqual(instrument.stats()[res.name()]["search"]["count"], 1)
+
+  def test_json(self):
+    instrument.enable()
+    res = SimpleBookResource.from_json(DATA_FILE)
+    res.reference("2").search("the")
+    stats = json.loads(instrument.to_json())
+    self.assertEqual(stats, instrument.stats())
+    self.assertEqual(list(stats), [res.name()])
+    instrument.reset()
+    self.assertEqual(instrument.stats(), {})
+
+
+class TestOperationStats(unittest.TestCase):
+
+  def test_percentiles(self):
+    stats = instrument.OperationStats()
+    for ms in range(1, 101):
+      stats.add(ms / 1000.0, 1)
+    summary = stats.summary()
+    self.assertEqual(summary["count"], 100)
+    self.assertEqual(summary["results"], 100)
+    self.assertAlmostEqual(summary["p50"], 0.051)
+    self.assertAlmostEqual(summary["p99"], 0.1)
+    self.assertAlmostEqual(summary["max"], 0.1)
+
+  def test_sample_bounded(self):
+    stats = instrument.OperationStats()
+    for n in range(instrument.SAMPLE_SIZE * 2):
+      stats.add(n)
+    self.assertEqual(len(stats.samples), instrument.SAMPLE_SIZE)
+    self.assertEqual(stats.count, instrument.SAMPLE_SIZE * 2)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Test the interval index of stored spans against checking each span.
+"""
+import random
+import unittest
+
+from textbites.api import Index
+from textbites.intervals import IntervalIndex
+from textbites.simple_books import SimpleBookResource
+
+from .test_books_base import DATA_FILE
+
+
+def overlaps(items, start, end):
+  return sorted([(span, value) for span, value in items
+                   if span.start <= end and span.end >= start],
+                key=lambda item: item[0])
+
+
+class TestIntervalIndex(unittest.TestCase):
+
+  def setUp(self):
+    rand = random.Random(14)
+    self.items = []
+    for n in range(500):
+      start = rand.randint(1, 1000)
+      self.items.append((Index(start, start + rand.randint(0, 30)), n))
+    self.index = IntervalIndex(self.items)
+
+  def assertMatches(self, items):
+    self.assertEqual(len(self.index), len(items))
+    for start in range(0, 1040, 7):
+      for end in [start, start + 3, start + 50]:
+        self.assertEqual(self.index.overlapping(Index(start, end)),
+                         overlaps(items, start, end))
+
+  def test_bulk_build(self):
+    self.assertMatches(self.items)
+
+  def test_empty(self):
+    self.assertEqual(IntervalIndex().overlapping(Index(1, 5)), [])
+
+  def test_add(self):
+    for n in range(100):
+      item = (Index(n * 10, n * 10 + 5), "added %d" % n)
+      self.index.add(*item)
+      self.items.append(item)
+    self.assertMatches(self.items)
+
+  def test_remove(self):
+    for item in self.items[:300:3] + [self.items[-1]]:
+      self.index.remove(*item)
+      self.items.remove(item)
+    self.assertMatches(self.items)
+    self.assertRaises(KeyError, self.index.remove, Index(1, 2), "missing")
+
+  def test_remove_added(self):
+    self.index.add(Index(5, 6), "note")
+    self.index.remove(Index(5, 6), "note")
+    self.assertMatches(self.items)
+
+  def test_reference(self):
+    res = SimpleBookResource.from_json(DATA_FILE)
+    index = IntervalIndex([(res.reference("1:2").indices(), "note"),
+                           (res.reference("2:1-3").indices(), "highlight")])
+    self.assertEqual([v for s, v in index.overlapping(res.reference("2"))],
+                     ["highlight"])
+    self.assertEqual([v for s, v in index.overlapping(res.reference("1-2"))],
+                     ["note", "highlight"])
+    self.assertEqual(index.overlapping(res.reference("3")), [])
+
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Test incremental JSON parsing and streamed loading of resources.
+"""
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from textbites import json_stream
+from textbites.simple_books import SimpleBookResource
+from textbites.bible.bible import BibleResource
+
+from .test_books_base import DATA_FILE
+from .test_bible import SAMPLE_FILE
+
+
+DOC = { "a" : [1, -2.5e3, { "b" : "x\"yé", "c" : [True, None, False] }],
+        "d" : {}, "e" : [[]], "f" : 12345 }
+
+
+def build_all(text, chunk_size):
+  events = json_stream.parse(io.StringIO(text), chunk_size)
+  return json_stream.build(events, *next(events)[1:])
+
+
+class TestJsonStream(unittest.TestCase):
+
+  def test_events(self):
+    events = list(json_stream.parse(io.StringIO('{"a": [1, {"b": null}]}')))
+    self.assertEqual(events, [
+      ("", "start_map", None), ("", "map_key", "a"),
+      ("a", "start_array", None), ("a.item", "number", 1),
+      ("a.item", "start_map", None), ("a.item", "map_key", "b"),
+      ("a.item.b", "null", None), ("a.item", "end_map", None),
+      ("a", "end_array", None), ("", "end_map", None)])
+
+  def test_build_across_chunks(self):
+    text = json.dumps(DOC)
+    for chunk_size in [1, 2, 3, 7, 1000]:
+      self.assertEqual(build_all(text, chunk_size), DOC)
+
+  def test_invalid(self):
+    self.assertRaises(ValueError, build_all, '{"a": tru}', 4)
+
+  def test_invalid_structure(self):
+    """ Rejects what json.loads rejects.
+    """
+    for text in ['{"a" "b" "c" 1}', '[1 2,,,3]', '[1,2,]', '{"a":1,}',
+                 '{1:2}', '{"a":}', '[,1]', '[1:2]', '{"a"]', '1 2', '',
+                 '{"a":1', '[1,']:
+      self.assertRaises(ValueError, json.loads, text)
+      self.assertRaises(ValueError, list,
+                        json_stream.parse(io.StringIO(text), 2))
+
+  def test_control_characters(self):
+    """ Control characters in strings must be escaped, as json.loads
+        requires.
+    """
+    for text in ['["a\nb"]', '{"a\tb": 1}', '["\x00"]', '["a\\\x1f"]']:
+      self.assertRaises(ValueError, json.loads, text)
+      self.assertRaises(ValueError, list,
+                        json_stream.parse(io.StringIO(text), 2))
+    self.assertEqual(build_all('["a\\nb\x7f"]', 2), ["a\nb\x7f"])
+
+
+class TestStreamedLoading(unittest.TestCase):
+  """ Streaming must build the same resource as decoding first.
+  """
+
+  def assertSameLines(self, streamed, loaded):
+    self.assertEqual(streamed.name(), loaded.name())
+    self.assertEqual([(l.pretty(), l.text(), l.line_num) for l in streamed.lines],
+                     [(l.pretty(), l.text(), l.line_num) for l in loaded.lines])
+
+  def test_simple_book(self):
+    self.assertSameLines(SimpleBookResource.from_json(DATA_FILE, stream=True),
+                         SimpleBookResource.from_json(DATA_FILE))
+
+  def test_bible(self):
+    self.assertSameLines(BibleResource.from_json(SAMPLE_FILE, stream=True),
+                         BibleResource.from_json(SAMPLE_FILE))
+
+  def test_names_after_chapters(self):
+    """ Chapters are held until the name they need is read.
+    """
+    with open(SAMPLE_FILE) as f:
+      bible = json.load(f)
+    bible = { "books" : [{ "chapters" : b["chapters"], "name" : b["name"] }
+                           for b in bible["books"]],
+              "version" : bible["version"] }
+    fd, filename = tempfile.mkstemp(suffix=".bible.json")
+    try:
+      with os.fdopen(fd, 'w') as f:
+        json.dump(bible, f)
+      self.assertSameLines(BibleResource.from_json(filename, stream=True),
+                           BibleResource.from_json(SAMPLE_FILE))
+    finally:
+      os.remove(filename)
+
+  def test_missing_version(self):
+    fd, filename = tempfile.mkstemp(suffix=".bible.json")
+    try:
+      with os.fdopen(fd, 'w') as f:
+        json.dump({ "books" : [] }, f)
+      for stream in [False, True]:
+        self.assertRaises(KeyError, BibleResource.from_json, filename,
+                          stream=stream)
+    finally:
+      os.remove(filename)
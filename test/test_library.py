@@ -4,9 +4,18 @@ Test functionality of books.
 """
 
 import unittest
+import os.path
+import shutil
+import tempfile
+import threading
+import time
 
 from textbites.api import Resource
 from textbites import library as Library
+from textbites.bible.bible import BibleResource
+from textbites.bible.binary import write_binary
+
+from .test_books_base import DATA_FILE, SAMPLE_FILE, BOOK_NAME
 
 class TestLibrary(unittest.TestCase):
 
@@ -18,3 +27,148 @@ class TestLibrary(unittest.TestCase):
     r1 = Library.get("r1")
     self.assertEqual(r1, r)
 
+
+class TestLazyLibrary(unittest.TestCase):
+
+  def tearDown(self):
+    for name in ["lazy", "PnP_Sample"]:
+      Library._resources.pop(name, None)
+      Library._sources.pop(name, None)
+
+  def test_loader_called_on_first_get(self):
+    calls = []
+    r = Resource()
+    Library.add("lazy", loader=lambda: calls.append(1) or r)
+    self.assertIn("lazy", Library.resources())
+    self.assertFalse(Library.is_loaded("lazy"))
+    self.assertEqual(calls, [])
+    self.assertIs(Library.get("lazy"), r)
+    self.assertIs(Library.get("lazy"), r)
+    self.assertTrue(Library.is_loaded("lazy"))
+    self.assertEqual(calls, [1])
+
+  def test_loader_called_once_across_threads(self):
+    calls = []
+    def loader():
+      calls.append(1)
+      time.sleep(0.01)
+      return Resource()
+    Library.add("lazy", loader=loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(Library.get("lazy")))
+                 for _ in range(8)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    self.assertEqual(calls, [1])
+    self.assertEqual(len(set(map(id, results))), 1)
+
+  def test_load_is_lazy(self):
+    self.assertTrue(Library.load(DATA_FILE))
+    self.assertFalse(Library.is_loaded("PnP_Sample"))
+    self.assertEqual(Library.get("PnP_Sample").name(), BOOK_NAME)
+
+  def test_load_eager(self):
+    self.assertTrue(Library.load(DATA_FILE, lazy=False))
+    self.assertTrue(Library.is_loaded("PnP_Sample"))
+
+  def test_load_options(self):
+    self.assertTrue(Library.load(DATA_FILE, word_index=True))
+    self.assertIsNotNone(Library.get("PnP_Sample").word_index)
+    self.assertTrue(Library.reload("PnP_Sample", lazy=False))
+    self.assertIsNotNone(Library.get("PnP_Sample").word_index)
+    self.assertTrue(Library.load(DATA_FILE))
+    self.assertIsNone(Library.get("PnP_Sample").word_index)
+
+  def test_load_missing_file(self):
+    for lazy in [True, False]:
+      self.assertFalse(Library.load("/nonexistent/Missing.bible.json", lazy))
+      self.assertNotIn("Missing", Library.resources())
+      self.assertFalse(Library.reload("Missing"))
+
+class TestParallelLibrary(unittest.TestCase):
+
+  def tearDown(self):
+    for name in ["PnP_Sample", "Quotes", "Sample"]:
+      Library._resources.pop(name, None)
+      Library._sources.pop(name, None)
+
+  def test_parallel_load_dir(self):
+    report = Library.parallel_load_dir(os.path.dirname(DATA_FILE), 2)
+    self.assertEqual(sorted(report["files"]),
+                     ["PnP_Sample.simple.json", "Quotes.quotes.tsv"])
+    self.assertTrue(report["wall"] > 0)
+    self.assertTrue(Library.is_loaded("PnP_Sample"))
+    book = Library.get("PnP_Sample")
+    self.assertEqual(len(book.top_reference().search("daughter")), 3)
+    self.assertEqual(book.reference("3:7").parent().pretty(), BOOK_NAME + " 3")
+    self.assertEqual(len(Library.get("Quotes").children()), 187)
+    self.assertTrue(report["concurrency"] > 0)
+
+  def test_parallel_load_dir_binary(self):
+    tmpdir = tempfile.mkdtemp()
+    try:
+      bin_file = os.path.join(tmpdir, "Sample.bible.bin")
+      write_binary(BibleResource.from_json(SAMPLE_FILE), bin_file)
+      Library.parallel_load_dir(tmpdir)
+      self.assertTrue(Library.is_loaded("Sample"))
+      self.assertTrue(Library.reload("Sample", lazy=False))
+      self.assertEqual(Library.get("Sample").reference("1:2").pretty(),
+                       "PRIDE AND PREJUDICE 1:2")
+    finally:
+      shutil.rmtree(tmpdir)
+
+
+class BlockedResource(Resource):
+  """ Resource whose searches wait until released.
+  """
+
+  def __init__(self):
+    self.released = threading.Event()
+
+  def top_reference(self):
+    return self
+
+  def search(self, pattern):
+    self.released.wait(10)
+    return ["late"]
+
+
+class TestLibrarySearch(unittest.TestCase):
+
+  def setUp(self):
+    Library.load(DATA_FILE)
+    Library.load(os.path.join(os.path.dirname(DATA_FILE), "Quotes.quotes.tsv"))
+
+  def tearDown(self):
+    for name in ["PnP_Sample", "Quotes", "slow", "broken"]:
+      Library._resources.pop(name, None)
+
+  def test_search_all(self):
+    report = Library.search("daughter", ["PnP_Sample", "Quotes"])
+    names = [name for name, ref in report["hits"]]
+    self.assertEqual(names.count("PnP_Sample"), 3)
+    self.assertEqual(names, sorted(names))
+    book_hits = [ref.pretty() for name, ref in report["hits"]
+                   if name == "PnP_Sample"]
+    self.assertEqual(book_hits, [h.pretty() for h in
+        Library.get("PnP_Sample").top_reference().search("daughter")])
+    self.assertEqual(report["timed_out"], [])
+    self.assertEqual(report["errors"], {})
+
+  def test_search_timeout_partial(self):
+    slow = BlockedResource()
+    Library.add("slow", slow)
+    try:
+      report = Library.search("daughter", ["PnP_Sample", "slow"], timeout=0.1)
+    finally:
+      slow.released.set()
+    self.assertEqual(report["timed_out"], ["slow"])
+    self.assertEqual(len(report["hits"]), 3)
+
+  def test_search_errors(self):
+    Library.add("broken", Resource())
+    report = Library.search("daughter", ["PnP_Sample", "broken"])
+    self.assertIsInstance(report["errors"]["broken"], NotImplementedError)
+    self.assertEqual(len(report["hits"]), 3)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Test the compiled pattern cache and that searches compile only once.
+"""
+import re
+import unittest
+
+from textbites.search import patterns
+from textbites.search.patterns import PatternCache
+from textbites.quotes import QuotesResource
+from textbites.simple_books import SimpleBookResource
+
+from .test_books_base import DATA_FILE
+from .test_quotes import TSV_DATA_FILE
+
+
+class TestPatternCache(unittest.TestCase):
+
+  def setUp(self):
+    self.cache = PatternCache(2)
+
+  def test_hits_and_misses(self):
+    first = self.cache.compile("a+")
+    self.assertIs(self.cache.compile("a+"), first)
+    self.assertEqual(self.cache.stats(),
+        { "hits" : 1, "misses" : 1, "evictions" : 0, "size" : 1,
+          "maxsize" : 2 })
+
+  def test_flags_are_part_of_key(self):
+    plain = self.cache.compile("a")
+    multi = self.cache.compile("a", re.M)
+    self.assertIsNot(plain, multi)
+    self.assertTrue(multi.flags & re.M)
+
+  def test_compiled_passes_through(self):
+    regex = re.compile("b")
+    self.assertIs(self.cache.compile(regex), regex)
+    self.assertEqual(self.cache.compile(regex, re.I).pattern, "b")
+    self.assertEqual(self.cache.stats()["misses"], 1)
+
+  def test_eviction_is_lru(self):
+    a = self.cache.compile("a")
+    self.cache.compile("b")
+    self.cache.compile("a")
+    self.cache.compile("c")
+    self.assertEqual(len(self.cache), 2)
+    self.assertIs(self.cache.compile("a"), a)
+    self.cache.compile("b")
+    self.assertEqual(self.cache.misses, 4)
+
+  def test_resize_and_clear(self):
+    for p in "abc":
+      self.cache.compile(p)
+    self.cache.resize(1)
+    self.assertEqual(len(self.cache), 1)
+    self.cache.clear()
+    self.assertEqual(self.cache.stats()["misses"], 0)
+
+
+class TestCompileOnce(unittest.TestCase):
+  """ A search should consult the shared cache once, not per line.
+  """
+
+  def setUp(self):
+    patterns.cache.clear()
+
+  def test_book_search(self):
+    res = SimpleBookResource.from_json(DATA_FILE)
+    res.top_reference().search(r"Mr\.")
+    self.assertEqual(patterns.stats()["misses"], 1)
+    self.assertEqual(patterns.stats()["hits"], 0)
+    res.reference("2").search(r"Mr\.")
+    self.assertEqual(patterns.stats()["hits"], 1)
+
+  def test_quotes_search(self):
+    res = QuotesResource.from_tsv(TSV_DATA_FILE)
+    hits = res.top_reference().search(re.compile("simple as possible"))
+    self.assertEqual(len(hits), 1)
+    self.assertEqual(patterns.stats()["misses"], 0)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Test the positional index query language, and that queries give the same
+Lines as the equivalent regex searches.
+"""
+import unittest
+
+from textbites.search.positional import PositionalIndex, QuerySyntaxError, parse
+from textbites.simple_books import SimpleBookResource
+
+from .test_books_base import DATA_FILE, SameHitsTest
+
+
+TEXTS = ["Love one another.", "faith without works is dead",
+         "By grace through faith, not works of the law", "one love",
+         "love is patient, love is kind, one to another"]
+
+
+class TestPositionalIndex(unittest.TestCase):
+
+  def setUp(self):
+    self.index = PositionalIndex()
+    for line_num, text in enumerate(TEXTS, 1):
+      self.index.add(line_num, text)
+
+  def test_parse(self):
+    self.assertEqual(parse('a b OR NOT c'),
+        ("or", ("and", ("word", "a"), ("word", "b")), ("not", ("word", "c"))))
+    self.assertEqual(parse('"A, b" NEAR/2 (c OR d)'),
+        ("near", 2, ("phrase", ["a", "b"]), ("or", ("word", "c"), ("word", "d"))))
+    for query in ['', 'a AND', '(a', 'a)', '"a', 'NEAR/2 a', '"..."']:
+      self.assertRaises(QuerySyntaxError, parse, query)
+
+  def test_words(self):
+    self.assertEqual(self.index.query("love"), [1, 4, 5])
+    self.assertEqual(self.index.query("LOVE"), [1, 4, 5])
+    self.assertEqual(self.index.query("hope"), [])
+    self.assertEqual(list(self.index.positions("love", 5)), [0, 3])
+
+  def test_phrase(self):
+    self.assertEqual(self.index.query('"love one another"'), [1])
+    self.assertEqual(self.index.query('"one love"'), [4])
+    self.assertEqual(self.index.query('"faith not works"'), [3])
+    self.assertEqual(self.index.query('"works faith"'), [])
+
+  def test_boolean(self):
+    self.assertEqual(self.index.query("faith AND works"), [2, 3])
+    self.assertEqual(self.index.query("faith works NOT law"), [2])
+    self.assertEqual(self.index.query("law OR dead"), [2, 3])
+    self.assertEqual(self.index.query("NOT love"), [2, 3])
+    self.assertEqual(self.index.query("(law OR dead) AND NOT grace"), [2])
+
+  def test_near(self):
+    self.assertEqual(self.index.query("love NEAR/1 one"), [1, 4])
+    self.assertEqual(self.index.query("love NEAR/2 another"), [1])
+    self.assertEqual(self.index.query("love NEAR/6 another"), [1, 5])
+    self.assertEqual(self.index.query('"is kind" NEAR/1 one'), [5])
+    self.assertEqual(self.index.query("(grace OR dead) NEAR/2 works"), [2])
+    self.assertRaises(QuerySyntaxError, self.index.query,
+                      "(faith AND works) NEAR/2 law")
+
+  def test_span(self):
+    self.assertEqual(self.index.query("love", 2, 4), [4])
+    self.assertEqual(self.index.query("NOT love", 3), [3])
+
+
+class TestLineQueries(SameHitsTest, unittest.TestCase):
+  """ Queries return the same Lines as the equivalent regex search.
+  """
+  options = { "positional_index" : True }
+  queries = [('"mr bennet"', r"(?i)\bmr\W+bennet\b"),
+             ("daughter", r"(?i)\bdaughter\b"),
+             ("wife OR daughter", r"(?i)\b(wife|daughter)\b"),
+             ("the", r"(?i)\bthe\b"),
+             ('"my dear"', r"(?i)\bmy\W+dear\b"),
+             ("mr NOT bennet", r"(?i)^(?!.*\bbennet\b).*\bmr\b"),
+             ("istanbul", r"(?i)\bistanbul\b"),
+             ("some", r"(?i)\bsome\b"),
+             ("ii", r"(?i)\bii\b"),
+             ("kiss", r"(?i)\bkiss\b"),
+             ('"sign k"', r"(?i)\bsign\W+k\b"),
+             ("CAFÉ", r"(?i)\bcafé\b")]
+
+  def indexed_hits(self, ref, query):
+    return ref.query(query[0])
+
+  def scanned_hits(self, ref, query):
+    return ref.search(query[1])
+
+  def test_same_lines(self):
+    res = SimpleBookResource.from_json(DATA_FILE)
+    for ref in [res.top_reference(), res.reference("2-3")]:
+      for query, pattern in self.queries:
+        for hit, line in zip(ref.query(query), ref.search(pattern)):
+          self.assertIs(hit, line)
+    self.assertTrue("positional_index" in res.index_sizes())
+
+  def test_built_on_first_query(self):
+    res = SimpleBookResource.from_json(DATA_FILE)
+    self.assertEqual(res.positional_index, None)
+    res.reference("3").query("bennet")
+    self.assertNotEqual(res.positional_index, None)
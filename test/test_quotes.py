@@ -5,6 +5,7 @@ Test functionality of books.
 import unittest
 import os
 
+from textbites.api import Index, InvalidReferenceError
 from textbites.quotes import QuotesResource
 
 
@@ -19,6 +20,20 @@ class TestQuotesBooksImpl(unittest.TestCase):
   def setUp(self):
     self.res = QuotesResource.from_tsv(TSV_DATA_FILE)
   
+  def test_walk(self):
+    quotes = list(self.res.walk())
+    self.assertEqual(len(quotes),
+        sum(len(p.children()) for p in self.res.children()))
+    self.assertEqual(quotes[1].position(), 1)
+    self.assertEqual(next(quotes[1]).pretty(), "Abba Eban::3")
+    self.assertEqual(next(quotes[2]), None)
+
+  def test_search_paged(self):
+    hits = self.res.search("the")
+    self.assertEqual(self.res.search("the", limit=5), hits[:5])
+    self.assertEqual(self.res.search("the", offset=5, limit=5), hits[5:10])
+    self.assertEqual(list(self.res.iter_search("the")), hits)
+
   def test_children(self):
     speakers = self.res.top_reference().children()
     self.assertEqual(len(speakers), 187)
@@ -49,6 +64,46 @@ class TestQuotesBooksImpl(unittest.TestCase):
     ref = self.res.reference("Albert Einstein::3")
     self.assertEqual(ref.text().find("simple as possible"), 19)
 
+  def test_person_reference_missing(self):
+    self.assertEqual(self.res.reference("Nobody"), None)
+    self.assertRaises(InvalidReferenceError,
+                      self.res.reference, "Albert Einstein::99")
+
+  def test_speakers(self):
+    self.assertEqual([p.pretty() for p in self.res.speakers("abr")],
+                     ["Abraham Lincoln"])
+    people = self.res.speakers("A")
+    self.assertTrue(len(people) > 2)
+    self.assertTrue(all(p.pretty().startswith("A") for p in people))
+    self.assertEqual(self.res.speakers("a", limit=2), people[:2])
+    self.assertEqual(len(self.res.speakers("")), 187)
+    self.assertEqual(self.res.speakers("zzz"), [])
+
+  def test_indices(self):
+    quotes = list(self.res.walk())
+    self.assertEqual([q.indices().start for q in quotes],
+                     list(range(1, len(quotes) + 1)))
+    self.assertEqual(self.res.quote(4), quotes[3])
+    self.assertEqual(self.res.quotes_in(Index(2, 4)), quotes[1:4])
+    abba = self.res.reference("Abba Eban")
+    self.assertEqual(abba.indices(), Index(1, 3))
+    self.assertRaises(InvalidReferenceError, self.res.quote, 0)
+    self.assertRaises(InvalidReferenceError, self.res.quote, len(quotes) + 1)
+
+  def test_resolve(self):
+    for ref in [self.res.quote(5), self.res.reference("Albert Einstein")]:
+      self.assertIs(self.res.resolve(ref.indices()), ref)
+    self.assertIs(self.res.resolve(Index(1, 2)),
+                  self.res.reference("Abba Eban"))
+    self.assertIs(self.res.resolve(Index(3, 4)), self.res)
+
+  def test_json(self):
+    res = QuotesResource.from_json({"people" : [
+      { "person" : "B", "quotes" : [{ "quote" : "two" }] },
+      { "person" : "A", "quotes" : [{ "quote" : "one" }, { "quote" : "1" }] }]})
+    self.assertEqual([q.pretty() for q in res.walk()], ["A::1", "A::2", "B::1"])
+    self.assertEqual(res.reference("b::1").indices(), Index(3, 3))
+
   #@unittest.skip("json off")
   #def test_json(self):
   #  speakers = self.res.top_reference().children()
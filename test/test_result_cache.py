@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Test caching of search results by scope and pattern.
+"""
+import pickle
+import unittest
+
+from textbites.api import Index
+from textbites.search.result_cache import ResultCache
+from textbites.simple_books import SimpleBookResource
+from textbites import library
+
+from .test_books_base import DATA_FILE
+
+
+class TestResultCache(unittest.TestCase):
+
+  def test_lru(self):
+    cache = ResultCache(2)
+    for n in range(3):
+      cache.put(n, [n])
+    self.assertEqual(cache.get(0), None)
+    self.assertEqual(list(cache.get(2)), [2])
+    self.assertEqual(cache.stats(), { "hits" : 1, "misses" : 1,
+        "evictions" : 1, "size" : 2, "maxsize" : 2 })
+
+  def test_disabled(self):
+    cache = ResultCache(0)
+    cache.put(1, [1])
+    self.assertEqual(len(cache), 0)
+
+  def test_pickle_keeps_size_only(self):
+    cache = ResultCache(5)
+    cache.put(1, [1])
+    copy = pickle.loads(pickle.dumps(cache))
+    self.assertEqual(copy.stats()["maxsize"], 5)
+    self.assertEqual(len(copy), 0)
+
+
+class TestCachedSearch(unittest.TestCase):
+
+  def setUp(self):
+    self.res = SimpleBookResource.from_json(DATA_FILE)
+    self.cache = self.res.result_cache
+
+  def test_repeat_search_hits(self):
+    book = self.res.top_reference()
+    first = [h.pretty() for h in book.search(r"Mr\.")]
+    self.assertEqual(self.cache.stats()["misses"], 1)
+    self.assertEqual([h.pretty() for h in book.search(r"Mr\.")], first)
+    self.assertEqual(self.cache.stats()["hits"], 1)
+
+  def test_keyed_by_scope_and_flags(self):
+    self.res.top_reference().search("mr")
+    self.res.reference("2").search("mr")
+    self.res.reference("2-3").search("mr")
+    self.res.top_reference().search("(?i)mr")
+    self.assertEqual(self.cache.stats()["misses"], 4)
+    self.res.reference("2-3").search("mr")
+    self.assertEqual(self.cache.stats()["hits"], 1)
+    self.assertEqual(self.cache.get(self.cache.key(Index(1, 0), "x")), None)
+
+  def test_reload_invalidates(self):
+    library.load(DATA_FILE)
+    try:
+      old = library.get("PnP_Sample")
+      old.top_reference().search("daughter")
+      self.assertEqual(len(old.result_cache), 1)
+      self.assertTrue(library.reload("PnP_Sample"))
+      new = library.get("PnP_Sample")
+      self.assertIsNot(new, old)
+      self.assertEqual(len(new.result_cache), 0)
+      self.assertFalse(library.reload("missing"))
+    finally:
+      library._resources.pop("PnP_Sample", None)
@@ -4,8 +4,9 @@ Test functionality of books.
 """
 import unittest
 
-from .test_books_base import TestInterface
-from textbites.simple_books import SimpleBookResource
+from .test_books_base import TestInterface, BOOK_NAME
+from textbites.api import Index, InvalidReferenceError
+from textbites.simple_books import SimpleBookResource, LineViews
 
 
 class TestSimpleBooksImpl(TestInterface, unittest.TestCase):
@@ -18,6 +19,68 @@ class TestSimpleBooksImpl(TestInterface, unittest.TestCase):
 
   def get_test_book(self):
     return self.res.top_reference()
+
+  def test_resolve_round_trip(self):
+    for str_ref in ["2:3", "2:2-4", "2", "2-3"]:
+      ref = self.res.reference(str_ref)
+      self.assertEqual(self.res.resolve(ref.indices()).pretty(), ref.pretty())
+    for line in self.res.walk():
+      self.assertEqual(self.res.resolve(line.indices()), line)
+
+  def test_resolve_covering(self):
+    book = self.get_test_book()
+    self.assertEqual(self.res.resolve(book.indices()).pretty(), BOOK_NAME)
+    # part of chapter 2 to part of chapter 3 is covered by both
+    span = Index(self.res.reference("2:5").indices().start,
+                 self.res.reference("3:1").indices().end)
+    self.assertEqual(self.res.resolve(span).pretty(), BOOK_NAME + " 2-3")
+
+  def test_resolve_out_of_range(self):
+    end = self.get_test_book().indices().end
+    self.assertRaises(InvalidReferenceError, self.res.resolve,
+                      Index(end, end + 1))
+    self.assertRaises(InvalidReferenceError, self.res.resolve, Index(0, 1))
+
+  def test_line_out_of_range(self):
+    end = self.get_test_book().indices().end
+    self.assertEqual(self.res.line(end).pretty(), BOOK_NAME + " 3:7")
+    for line_num in [0, -1, end + 1]:
+      self.assertRaises(InvalidReferenceError, self.res.line, line_num)
+    for span in [Index(-2, 3), Index(0, 1), Index(end, end + 1), Index(3, 2)]:
+      self.assertRaises(InvalidReferenceError, self.res.lines_in, span)
+      self.assertRaises(InvalidReferenceError, self.res.text_in, span)
+    self.assertEqual(len(self.res.lines_in(Index(1, end))), end)
+
+  def test_text_in(self):
+    ref = self.res.reference("2:2-4")
+    self.assertEqual(self.res.text_in(ref.indices()),
+                     "\n".join([l.text() for l in ref.children()]))
+
+
+class TestSimpleBooksImplCompact(TestSimpleBooksImpl):
+  """ Same contract with lines stored in a LineTable.
+  """
+
+  def setUp(self):
+    self.res = SimpleBookResource.from_json(TestInterface.data_filename,
+                                            compact=True)
+
+  def test_lines_are_views(self):
+    chapter = self.res.reference("2")
+    self.assertIsInstance(chapter.lines, LineViews)
+    line = chapter.children()[2]
+    self.assertIsNot(line, chapter.children()[2])
+    self.assertEqual(line, chapter.children()[2])
+    self.assertIs(line.parent(), chapter)
+    self.assertEqual(line.pretty(), self.res.reference("2:3").pretty())
+    self.assertEqual(line.previous().pretty(), BOOK_NAME + " 2:2")
+    self.assertEqual(next(line).pretty(), BOOK_NAME + " 2:4")
+    self.assertEqual(line.context(1).pretty(), BOOK_NAME + " 2:2-4")
+    self.assertEqual(self.res.line(line.line_num), line)
+
+  def test_lines_have_slots(self):
+    line = self.res.reference("2:3")
+    self.assertFalse(hasattr(line, '__dict__'))
   
 
 
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Test that generated data files are deterministic and load in the library.
+"""
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from textbites import library as Library
+from textbites import synthetic
+
+
+class TestSynthetic(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+    for name in ["SYN1", "SYN2", "SYNBook", "SYNQuotes"]:
+      Library._resources.pop(name, None)
+
+  def generate(self, seed=0):
+    return synthetic.generate(self.dir, seed, translations=2, books=3,
+        chapters=4, verses=5, lines=6, quotes=50, people=7)
+
+  def contents(self, filenames):
+    contents = []
+    for filename in filenames:
+      with open(filename) as f:
+        contents.append(f.read())
+    return contents
+
+  def test_deterministic(self):
+    first = self.contents(self.generate())
+    self.assertEqual(self.contents(self.generate()), first)
+    self.assertNotEqual(self.contents(self.generate(1)), first)
+    # translations differ from each other
+    self.assertNotEqual(first[0], first[1])
+
+  def test_loads(self):
+    filenames = self.generate()
+    self.assertEqual(sorted(os.listdir(self.dir)),
+        ["SYN1.bible.json", "SYN2.bible.json", "SYNBook.simple.json",
+         "SYNQuotes.quotes.tsv"])
+    for filename in filenames:
+      self.assertTrue(Library.load(filename, lazy=False))
+    bible = Library.get("SYN1")
+    self.assertEqual(len(bible.lines), 3 * 4 * 5)
+    self.assertEqual(bible.reference("Gen 4:5").pretty(), "Genesis 4:5")
+    book = Library.get("SYNBook")
+    self.assertEqual(len(book.lines), 4 * 6)
+    quotes = Library.get("SYNQuotes")
+    self.assertEqual(len(quotes.children()), 7)
+    self.assertEqual(len(list(quotes.walk())), 50)
+
+  def test_people(self):
+    gen = synthetic.Generator()
+    names = [gen.person(n) for n in range(1000)]
+    self.assertEqual(len(set(names)), 1000)
+    self.assertTrue(max(len(name.split(" ")) for name in names) <= 4)
+    self.assertRaises(ValueError, gen.bible, "X", books=1000)
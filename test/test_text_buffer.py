@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Test single buffer search and that it matches line by line search.
+"""
+import re
+import unittest
+
+from textbites.search.text_buffer import TextBuffer
+from textbites.books import BookResource
+
+from .test_books_base import DATA_FILE, SameHitsTest
+
+
+class TestTextBuffer(unittest.TestCase):
+
+  def setUp(self):
+    self.texts = ["In the beginning", "", "love one another", "God is love."]
+    self.buf = TextBuffer(self.texts)
+
+  def assertMatchesLines(self, pattern, first=0, last=None):
+    expected = [i for i, t in enumerate(self.texts[first:last], first)
+                  if re.search(pattern, t)]
+    self.assertEqual(self.buf.search(pattern, first, last), expected, pattern)
+
+  def test_text(self):
+    self.assertEqual(len(self.buf), 4)
+    self.assertEqual([self.buf.text(i) for i in range(4)], self.texts)
+
+  def test_search(self):
+    for pattern in ["love", "^l", "e$", "^$", r"g\s", r"n\s*", "", "x"]:
+      self.assertMatchesLines(pattern)
+
+  def test_search_limits(self):
+    self.assertMatchesLines("love", 3)
+    self.assertMatchesLines("love", 0, 3)
+    self.assertEqual(self.buf.search("love", 2, 2), [])
+
+  def test_search_compiled(self):
+    self.assertEqual(self.buf.search(re.compile("GOD", re.I)), [3])
+
+  def test_unsupported(self):
+    self.assertEqual(self.buf.search(r"\Alove"), None)
+    self.assertEqual(self.buf.search("(?<=is )love"), None)
+    self.assertEqual(self.buf.search("e(?=$)"), None)
+    self.assertEqual(self.buf.search(r"e(?!\s)"), None)
+    self.assertEqual(TextBuffer(["a\nb"]).search("b"), None)
+
+
+class TestBufferedSearch(SameHitsTest, unittest.TestCase):
+  """ Buffered search must give the same hits as scanning.
+  """
+  options = { "text_buffer" : True }
+  books = True
+
+  def test_books_limits(self):
+    buffered = BookResource.from_json(DATA_FILE, text_buffer=True)
+    scanned = BookResource.from_json(DATA_FILE)
+    limits = { "first_chapter" : 2, "last_chapter" : 2, "last_line" : 5 }
+    for query in self.queries:
+      self.assertEqual([h.pretty() for h in buffered.search(query, **limits)],
+                       [h.pretty() for h in scanned.search(query, **limits)],
+                       query)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Test narrowing regex searches with the trigram index, and that it gives the
+same hits as scanning.
+"""
+import re
+import unittest
+
+from textbites.search.trigram import TrigramIndex, trigram_query
+from textbites.simple_books import SimpleBookResource
+
+from .test_books_base import DATA_FILE, SameHitsTest
+
+
+class TestTrigramQuery(unittest.TestCase):
+
+  def test_literals(self):
+    self.assertEqual(trigram_query("Lord"),
+                     ("and", [("trigram", "lor"), ("trigram", "ord")]))
+    self.assertEqual(trigram_query("^the"), ("trigram", "the"))
+    self.assertEqual(trigram_query("(?i)THE"), ("trigram", "the"))
+
+  def test_structure(self):
+    self.assertEqual(trigram_query("abc|def"),
+                     ("or", [("trigram", "abc"), ("trigram", "def")]))
+    self.assertEqual(trigram_query("abc(def)+"),
+                     ("and", [("trigram", "abc"), ("trigram", "def")]))
+    self.assertEqual(trigram_query("abc(def)?"), ("trigram", "abc"))
+    self.assertEqual(trigram_query("abc[xy]def"),
+                     ("and", [("trigram", "abc"), ("trigram", "def")]))
+
+  def test_none(self):
+    for pattern in ["\\d+", "ab", "abc|d", "(abc)*", "[abc]+", "a.b.c"]:
+      self.assertEqual(trigram_query(pattern), None, pattern)
+
+
+class TestTrigramIndex(unittest.TestCase):
+
+  def setUp(self):
+    self.texts = ["In the Beginning", "love one another", "GOD IS LOVE",
+                  "The Kelvin sign K", "İNN", "KIſS"]
+    self.index = TrigramIndex.from_texts(self.texts)
+
+  def test_candidates(self):
+    self.assertEqual(self.index.candidates("love"), [1, 2])
+    self.assertEqual(self.index.candidates("(?i)love", 2), [2])
+    self.assertEqual(self.index.candidates("love", 0, 2), [1])
+    self.assertEqual(self.index.candidates("nomatch"), [])
+    self.assertEqual(self.index.candidates("\\w+"), None)
+
+  def test_case_folding(self):
+    """ Every line IGNORECASE matches is a candidate.
+    """
+    for pattern in ["(?i)ign k", "(?i)inn", "(?i)kiss", "(?i)iss"]:
+      candidates = self.index.candidates(pattern)
+      for pos, text in enumerate(self.texts):
+        if re.search(pattern, text):
+          self.assertTrue(pos in candidates, (pattern, text))
+
+
+class TestTrigramSearch(SameHitsTest, unittest.TestCase):
+  """ Search using the trigram index must give the same hits as scanning.
+  """
+  options = { "trigram_index" : True }
+
+  def test_iter_search(self):
+    indexed = SimpleBookResource.from_json(DATA_FILE, trigram_index=True)
+    scanned = SimpleBookResource.from_json(DATA_FILE)
+    for query in self.queries:
+      self.assertEqual(
+          [h.pretty() for h in indexed.top_reference().iter_search(query)],
+          [h.pretty() for h in scanned.top_reference().search(query)], query)
+    self.assertEqual(sorted(indexed.index_sizes()), ["trigram_index"])
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Test the inverted word index and that indexed search matches scanning.
+"""
+import unittest
+
+from textbites.search.word_index import WordIndex
+from textbites.simple_books import SimpleBookResource
+from textbites.bible.bible import BibleResource
+
+from .test_books_base import DATA_FILE, SAMPLE_FILE, SameHitsTest
+
+
+class TestWordIndex(unittest.TestCase):
+
+  def setUp(self):
+    self.index = WordIndex()
+    self.index.add(1, "In the beginning")
+    self.index.add(2, "Beloved, let us love one another")
+    self.index.add(3, "God is love.")
+
+  def test_postings(self):
+    self.assertEqual(list(self.index.postings("love")), [2, 3])
+    self.assertEqual(list(self.index.postings("missing")), [])
+
+  def test_search_substring(self):
+    self.assertEqual(self.index.search("love"), [2, 3])
+    self.assertEqual(self.index.search("eg"), [1])
+
+  def test_search_ignore_case(self):
+    self.assertEqual(self.index.search("beloved"), [])
+    self.assertEqual(self.index.search("(?i)beloved"), [2])
+
+  def test_search_alternation(self):
+    self.assertEqual(self.index.search("beginning|God"), [1, 3])
+
+  def test_search_span(self):
+    self.assertEqual(self.index.search("love", 3, 3), [3])
+    self.assertEqual(self.index.search("love", end=2), [2])
+
+  def test_search_folding(self):
+    self.index.add(4, "İstanbul ſome ıi")
+    self.assertEqual(self.index.search("(?i)istanbul"), [4])
+    self.assertEqual(self.index.search("(?i)SOME"), [4])
+    self.assertEqual(self.index.search("(?i)ii"), [4])
+    self.assertEqual(self.index.search("(?i)ſome"), None)
+
+  def test_search_not_plain(self):
+    self.assertEqual(self.index.search("lo.e"), None)
+    self.assertEqual(self.index.search("God is"), None)
+
+
+class TestIndexedSearch(SameHitsTest, unittest.TestCase):
+  """ Indexed search must give the same hits as scanning.
+  """
+  options = { "word_index" : True }
+
+  def test_off_by_default(self):
+    self.assertIsNone(SimpleBookResource.from_json(DATA_FILE).word_index)
+    self.assertIsNone(BibleResource.from_json(SAMPLE_FILE).word_index)
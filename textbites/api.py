@@ -33,6 +33,30 @@ class Resource:
     """
     raise NotImplementedError()
 
+  def resolve_many(self, str_refs):
+    """ Parse each string reference, returning a list of the reference or
+        the error for each, without raising.
+    """
+    results = []
+    for str_ref in str_refs:
+      try:
+        results.append(self.reference(str_ref))
+      except REFERENCE_ERRORS as e:
+        results.append(e)
+    return results
+
+  def resolve(self, index):
+    """ Return the smallest reference which covers this Index, the
+        inverse of Reference.indices().
+    """
+    raise NotImplementedError()
+
+  def walk(self):
+    """ Generate the lowest level references of the resource in reading
+        order.
+    """
+    return self.top_reference().walk()
+
 
 class Reference(object):
   """ Represents some section of text.
@@ -44,12 +68,16 @@ class Reference(object):
         detail.
       - next()/prev() - for walking the chain
   """
+  # empty so that subclasses may choose to use __slots__
+  __slots__ = ()
+
   def __init__(self):
-    # set parent for children
+    # set parent and position for children
     if self.children():
-      for child in self.children():
+      for pos, child in enumerate(self.children()):
         #print "Setting parent of %s to %s" % (child, self)
         child._parent = self
+        child._position = pos
 
   def resource(self):
     """ Return the resource that this is part of.
@@ -90,6 +118,20 @@ class Reference(object):
     """
     raise NotImplementedError()
 
+  def iter_search(self, pattern):
+    """ Return an iterator of the same references as search(), which
+        implementations may find lazily, so that stopping early saves
+        searching the rest.
+    """
+    return iter(self.search(pattern))
+
+  def ranked_search(self, query, k=10):
+    """ Return up to k (score, Reference) pairs of the lines, quotes or
+        other units within this scope most relevant to the words of
+        query, best first.
+    """
+    raise NotImplementedError()
+
   def children(self):
     """ Return an iterable of References under this item.
     """
@@ -112,17 +154,28 @@ class Reference(object):
       top = top.parent()
     return top
 
+  def position(self):
+    """ Return the index of this reference within its parent's children,
+        or None. This is set by the parent's ctor, otherwise it is
+        searched for.
+    """
+    try:
+      return self._position
+    except AttributeError:
+      pass
+    try:
+      return self.parent().children().index(self)
+    except:
+      return None
+
   def previous(self):
     """ Return reference for previous or None.
         For this, subclasses must have called Reference's ctor.
     """
     if self.parent():
-      try:
-        idx = self.parent().children().index(self)
-        if idx != -1 and idx >= 1:
-          return self.parent()[idx-1]
-      except:
-        pass
+      idx = self.position()
+      if idx != None and idx >= 1:
+        return self.parent()[idx-1]
     return None
 
   def __next__(self):
@@ -130,14 +183,23 @@ class Reference(object):
         For this, subclasses must have called Reference's ctor.
     """
     if self.parent():
-      try:
-        idx = self.parent().children().index(self)
-        if idx != -1 and idx+1 < len(self.parent()):
-          return self.parent()[idx+1]
-      except:
-        pass
+      idx = self.position()
+      if idx != None and idx+1 < len(self.parent()):
+        return self.parent()[idx+1]
     return None
 
+  def walk(self):
+    """ Generate the lowest level references under this one, e.g. lines,
+        in reading order.
+    """
+    children = self.children()
+    if not children:
+      yield self
+      return
+    for child in children:
+      for ref in child.walk():
+        yield ref
+
   def indices(self):
     """ Return a pair of integers representing the order of this reference
     within the resource. Used for determining overlap between references
@@ -160,7 +222,7 @@ class Reference(object):
 
   def __bool__(self):
     """ Don't want evaluation based on len(). """
-    return 1
+    return True
 
 Index = namedtuple('Index', ['start', 'end'])
 
@@ -180,3 +242,7 @@ class InvalidReferenceError(Exception):
     self.val = val
   def __str__(self):
     return repr(self.val)
+
+# raised for references which can't be resolved, e.g. a chapter out of range
+REFERENCE_ERRORS = (UnparsableReferenceError, InvalidReferenceError,
+                    IndexError, ValueError)
@@ -6,127 +6,323 @@ and resolving references.
 import re
 import logging
 import json
+from collections import defaultdict
 
 from textbites.api import Reference
 from textbites.api import Resource
 from textbites.api import UnparsableReferenceError
 from textbites.api import InvalidReferenceError
+from textbites.api import REFERENCE_ERRORS
 from textbites.utils import *
+from textbites import json_stream
 from textbites.simple_books import Book, ChapterRange, Chapter, LineRange, Line
+from textbites.simple_books import LineResource, LineTable, search_refs
+from textbites.simple_books import iter_refs, query_refs, rank_refs
+from textbites.simple_books import build_lines, all_lines
+from textbites.search.patterns import compile_pattern
+from textbites.lru import LRUCache
 
 from . import bibleapi
+from . import data
 
 logging.basicConfig(level=logging.DEBUG, format='%(message)s')
 log = logging.getLogger(__name__)
 
+REFERENCE_RE = re.compile("(?:((?:(?:[\d\w]+) )*\w+?) )?(\d+)(?:-(\d+))?(?::(\d+)(?:-(\d+))?)?$")
 
-class BibleResource(Resource):
+
+class BibleResource(LineResource):
 
   @staticmethod
-  def from_json(json_filename=None):
+  def from_json(json_filename=None, word_index=False, text_buffer=False,
+                compact=False, stream=False, folded_text=False,
+                positional_index=False, trigram_index=False):
     """ Load the bible into SimpleBook data structures.
+        compact stores lines in a LineTable rather than as Line objects.
+        stream reads the file incrementally, a chapter at a time, rather
+        than decoding it all first, so memory stays close to the result.
+    """
+    with open(json_filename, 'r') as f:
+      if stream:
+        return BibleResource._from_events(_stream_events(f), word_index,
+            text_buffer, compact, folded_text, positional_index,
+            trigram_index)
+      return BibleResource._from_events(_decoded_events(json.load(f)),
+          word_index, text_buffer, compact, folded_text, positional_index,
+          trigram_index)
+
+  @staticmethod
+  def _from_events(events, word_index, text_buffer, compact, folded_text,
+                   positional_index, trigram_index):
+    """ Build from (kind, book name, value) events, see _decoded_events.
     """
-    bible = json.load(open(json_filename, 'r'))
     new_books = []
+    new_chapters = []
     # this returns book names in order -- and assumes 
     # this implementation has them.
+    table = LineTable() if compact else None
     line_num = 0
-    for book in bible['books']:
-      book_name = book['name']
-      new_chapters = []
-      for chapter in book['chapters']:
+    version = None
+    for kind, book_name, value in events:
+      if kind == "version":
+        version = value
+      elif kind == "chapter":
         #assert cnum == chapter.getNumber()
-        cnum = chapter['num']
-        new_lines = []
-        for line in chapter['verses']:
-          line_num += 1
-          #assert lnum == verse.getNumber()
-          new_lines.append(Line(book_name, cnum, line['num'], line['text'], line_num))
+        cnum = value['num']
+        #assert lnum == verse.getNumber()
+        numbered = [(line['num'], line['text']) for line in value['verses']]
+        new_lines = build_lines(book_name, cnum, numbered, line_num, table)
+        line_num += len(new_lines)
         new_chapters.append(Chapter(book_name, cnum, new_lines))
+      elif kind == "book":
+        new_books.append(Book(new_chapters, book_name))
+        new_chapters = []
+    if version is None:
+      raise KeyError('version')
+    bible_ref = Bible(new_books, version)
+    bible_ref._resource = BibleResource(bible_ref, word_index, text_buffer,
+        folded_text, positional_index, trigram_index)
+    return bible_ref.resource()
+
+  @staticmethod
+  def from_binary(bin_filename, word_index=False, text_buffer=False,
+                  folded_text=False, positional_index=False,
+                  trigram_index=False):
+    """ Load a bible written by binary.write_binary. The file is memory
+        mapped so only the tables are read, and text is decoded when used.
+        Building any of the search indexes reads all of the text.
+    """
+    from .binary import MappedBible
+    mapped = MappedBible(bin_filename)
+    table = LineTable(texts=mapped.texts, cnums=mapped.cnums,
+        lnums=mapped.lnums, chapter_starts=mapped.chapter_starts)
+    new_books = []
+    for b, book_name in enumerate(mapped.book_names):
+      new_chapters = []
+      for c in range(mapped.book_starts[b], mapped.book_starts[b+1]):
+        lines = table.views(mapped.chapter_starts[c],
+                            mapped.chapter_starts[c+1])
+        new_chapters.append(Chapter(book_name, mapped.chapter_nums[c], lines))
       new_books.append(Book(new_chapters, book_name))
-    bible_ref = Bible(new_books, bible['version'])
-    bible_ref._resource = BibleResource(bible_ref)
+    bible_ref = Bible(new_books, mapped.version)
+    bible_ref._resource = BibleResource(bible_ref, word_index, text_buffer,
+        folded_text, positional_index, trigram_index)
     return bible_ref.resource()
 
-  def __init__(self, bible):
-    """ Stores only the top reference.
+  # number of parsed reference strings remembered
+  REFERENCE_CACHE_SIZE = 1024
+
+  def __init__(self, bible, word_index=False, text_buffer=False,
+               folded_text=False, positional_index=False,
+               trigram_index=False):
+    """ Stores the top reference and its lines.
     """
     # Needs book to be set, now or later!
     self.bible = bible
+    self._references = LRUCache(self.REFERENCE_CACHE_SIZE)
+    LineResource.__init__(self,
+        all_lines([c for b in bible.books for c in b.chapters]),
+        word_index, text_buffer, folded_text, positional_index,
+        trigram_index)
 
   def reference(self, str_ref):
     """ Parse this string reference and return an object. 
     Note: this only handles a single reference, and since chapter
     ranges are handled as separate refs, only the first is returned.
+    Resolved references are remembered, so repeated lookups skip parsing.
     """
     str_ref = str_ref.strip()
+    ref = self._references.get(str_ref)
+    if ref is None:
+      ref = self._parse_reference(str_ref)
+      self._references.put(str_ref, ref)
+    return ref
+
+  def resolve_many(self, str_refs):
+    """ Parse each string reference, returning a list of the reference or
+        the error for each, without raising. Strings are grouped by book
+        so each book name is looked up once, and repeated strings are
+        parsed once. The reference cache is not used.
+    """
+    str_refs = [str_ref.strip() for str_ref in str_refs]
+    # string -> reference or error
+    parsed = {}
+    # book name as written -> [(string, chapter and line groups)]
+    by_book = defaultdict(list)
+    for str_ref in dict.fromkeys(str_refs):
+      m = REFERENCE_RE.match(str_ref)
+      if m:
+        by_book[m.group(1)].append((str_ref, m.groups()[1:]))
+      else:
+        try:
+          parsed[str_ref] = self._book_reference(str_ref)
+        except REFERENCE_ERRORS as e:
+          parsed[str_ref] = e
+    for book_name, refs in by_book.items():
+      try:
+        book = self._book_for(book_name)
+      except REFERENCE_ERRORS as e:
+        for str_ref, groups in refs:
+          parsed[str_ref] = e
+        continue
+      for str_ref, groups in refs:
+        try:
+          parsed[str_ref] = self._lines_reference(book, *groups)
+        except REFERENCE_ERRORS as e:
+          parsed[str_ref] = e
+    return [parsed[str_ref] for str_ref in str_refs]
+
+  def _parse_reference(self, str_ref):
     # TODO: reuse this across 3 implementations by passing in a 
     # classname? or factory to produce the objects
-    m = re.match("(?:((?:(?:[\d\w]+) )*\w+?) )?(\d+)(?:-(\d+))?(?::(\d+)(?:-(\d+))?)?$", str_ref)
+    m = REFERENCE_RE.match(str_ref)
     if m:
-      book_name = m.group(1)
-      chap_start = safe_int(m.group(2))
-      chap_end = safe_int(m.group(3))
-      start = safe_int(m.group(4))
-      end = safe_int(m.group(5))
-      norm_book_name = bibleapi.normalize_book_name(book_name)
-      #print book_name, norm_book_name, str_ref, m.groups()
-      # handle implied book if they just said "chapter"
-      if norm_book_name == None or book_name.lower() == "chapter":
-        # if only 1 book, just return that
-        if len(self.top_reference().books) > 1:
-          raise UnparsableReferenceError("Book not found: " + book_name)
-        book = self.top_reference().children()[0]
-        book_name = book.title
+      return self._lines_reference(self._book_for(m.group(1)),
+                                   *m.groups()[1:])
+    return self._book_reference(str_ref)
+
+  def _book_for(self, book_name):
+    """ Book named in a reference, which may be implied.
+    """
+    book = self.top_reference().find_book(book_name)
+    # a valid name for a book this bible doesn't have
+    if book == None and bibleapi.normalize_book_name(book_name) != None:
+      raise InvalidReferenceError(book_name)
+    # handle implied book if they just said "chapter"
+    if book == None or book_name.lower() == "chapter":
+      # if only 1 book, just return that
+      if len(self.top_reference().books) > 1:
+        raise UnparsableReferenceError("Book not found: %s" % book_name)
+      book = self.top_reference().children()[0]
+    return book
+
+  def _lines_reference(self, book, chap_start, chap_end, start, end):
+    """ Reference within book from the matched chapter and line numbers.
+    """
+    chap_start = safe_int(chap_start)
+    chap_end = safe_int(chap_end)
+    start = safe_int(start)
+    end = safe_int(end)
+    book_name = book.title
+    if not chap_start:
+      return book
+    # same as simple impl below here except changed self.book to book
+    fc = zero_indexed(chap_start)
+    if not start:
+      if not chap_end:
+        return book.children()[fc]
       else:
-        book = self.top_reference().get_book(norm_book_name)
-        book_name = norm_book_name
-      if not chap_start:
-        return book
-      # same as simple impl below here except changed self.book to book
-      fc = zero_indexed(chap_start)
-      if not start:
-        if not chap_end:
-          return book.children()[fc]
-        else:
-          if chap_end > len(book.children()):
-            raise InvalidReferenceError()
-          return ChapterRange(
-              book_name, book.children()[fc:chap_end])
-      chapter = book.children()[fc]
-      if not end:
-        # leverage LineRange to extract a line
-        return LineRange(book_name, chapter, start, start).children()[0]
-      return LineRange(book_name, chapter, start, end)
+        if chap_end > len(book.children()):
+          raise InvalidReferenceError()
+        return ChapterRange(
+            book_name, book.children()[fc:chap_end])
+    chapter = book.children()[fc]
+    if not end:
+      # index the line directly, checked as a LineRange would be
+      if start > len(chapter.children()):
+        raise InvalidReferenceError("%d > the # chapters" % start)
+      return chapter.children()[start - 1]
+    return LineRange(book_name, chapter, start, end)
+
+  def _book_reference(self, str_ref):
+    """ Book named by the whole reference.
+    """
     # try to match a bookname by itself
-    try:
-      return self.top_reference().get_book(str_ref)
-    except:
-      pass
-    norm_book_name = bibleapi.normalize_book_name(str_ref)
-    if norm_book_name != None:
-      return self.top_reference().get_book(norm_book_name)
+    book = self.top_reference().find_book(str_ref)
+    if book != None:
+      return book
+    if bibleapi.normalize_book_name(str_ref) != None:
+      raise InvalidReferenceError(str_ref)
     raise UnparsableReferenceError("Reference didn't match regex: " + str_ref)
 
   def top_reference(self):
     return self.bible
 
 
+def _decoded_events(bible):
+  """ Yield the ("version", None, version), ("chapter", book name,
+      chapter) and ("book", book name, None) events, in that order within
+      a book, from which a bible is built.
+  """
+  yield "version", None, bible['version']
+  for book in bible['books']:
+    for chapter in book['chapters']:
+      yield "chapter", book['name'], chapter
+    yield "book", book['name'], None
+
+
+def _stream_events(f):
+  """ Yield the same events as _decoded_events while reading file f, so
+      only one chapter is decoded at a time. Chapters are held back if
+      their book's name comes after them.
+  """
+  events = json_stream.parse(f)
+  for prefix, event, value in events:
+    if prefix == "version" and event in json_stream.SCALARS:
+      yield "version", None, value
+    elif prefix == "books.item" and event == "start_map":
+      book_name = None
+      pending = []
+    elif prefix == "books.item.name" and event in json_stream.SCALARS:
+      book_name = value
+      for chapter in pending:
+        yield "chapter", book_name, chapter
+      pending = []
+    elif prefix == "books.item.chapters.item" and event == "start_map":
+      chapter = json_stream.build(events, event, value)
+      if book_name is None:
+        pending.append(chapter)
+      else:
+        yield "chapter", book_name, chapter
+    elif prefix == "books.item" and event == "end_map":
+      if book_name is None:
+        raise KeyError('name')
+      yield "book", book_name, None
+
+
 class Bible(Reference):
   """ 
   """
   def __init__(self, books, version):
     self.version = version
     self.books = books
+    self._index_books()
     Reference.__init__(self)
 
+  def _index_books(self):
+    """ Map titles to books, and every accepted spelling of a book's name,
+        lowercased, to the book. Abbreviations are also stored without
+        spaces, as bibleapi.normalize_book_name strips them.
+    """
+    self._titles = dict((book.title, book) for book in self.books)
+    self._spellings = dict((book.title.lower(), book) for book in self.books)
+    for name, abbr in data.BIBLE_ABBRS.items():
+      if name in self._titles:
+        self._spellings.setdefault(abbr.lower(), self._titles[name])
+    for abbr, name in data.BIBLE_ABBR_MAP.items():
+      book = self._titles.get(bibleapi.to_book_case(name))
+      if book != None:
+        self._spellings.setdefault(abbr, book)
+
   def get_book(self, book_name):
     """ Takes normalized book name.
     """
-    for book in self.books:
-      if book.title == book_name:
-        return book
-    raise InvalidReferenceError()
+    book = self._titles.get(book_name)
+    if book == None:
+      raise InvalidReferenceError()
+    return book
+
+  def find_book(self, name):
+    """ Return the book for any accepted spelling or abbreviation of its
+        name, or None.
+    """
+    if not name:
+      return None
+    key = name.lower()
+    book = self._spellings.get(key)
+    if book == None:
+      book = self._spellings.get(key.replace(" ", ""))
+    return book
 
   def children(self):
     return self.books
@@ -139,9 +335,37 @@ class Bible(Reference):
     raise NotImplementedError()
 
   def search(self, pattern, first_chapter=None, last_chapter=None, 
-                            first_line=None, last_line=None):
+                            first_line=None, last_line=None,
+                            limit=None, offset=0):
+    """ limit and offset select a page of the hits, and searching stops
+        once it is found.
+    """
+    if limit != None or offset:
+      return paginate(self.iter_search(pattern, first_chapter, last_chapter,
+                                       first_line, last_line), limit, offset)
+    pattern = compile_pattern(pattern)
+    if (first_chapter == None and last_chapter == None and
+        first_line == None and last_line == None):
+      return search_refs(self, pattern, self.books)
     hits = []
     for book in self.books:
       hits.extend(book.search(pattern, first_line, last_line))
     return hits
 
+  def query(self, query):
+    """ Return Lines matching a query of words and "phrases" combined
+        with AND, OR, NOT and NEAR/k, see textbites.search.positional.
+    """
+    return query_refs(self, query)
+
+  def ranked_search(self, query, k=10):
+    return rank_refs(self, query, k)
+
+  def iter_search(self, pattern, first_chapter=None, last_chapter=None,
+                                 first_line=None, last_line=None):
+    pattern = compile_pattern(pattern)
+    if (first_chapter == None and last_chapter == None and
+        first_line == None and last_line == None):
+      return iter_refs(self, pattern, self.books)
+    return (hit for book in self.books
+                  for hit in book.iter_search(pattern, first_line, last_line))
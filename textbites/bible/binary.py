@@ -0,0 +1,153 @@
+#! /usr/bin/env python
+"""
+Precompiled binary format for Bibles, which is memory mapped on load so
+startup only reads the small tables and verse text is decoded when used.
+
+Layout, all integers unsigned 32 bit little endian:
+  header      magic, # books, # chapters, # lines, names size, text size
+  books       first chapter of each book, plus the end    (# books + 1)
+  names       offset of version then each book name       (# books + 2)
+  chapters    number of each chapter                      (# chapters)
+              first line of each chapter, plus the end    (# chapters + 1)
+  lines       chapter number of each line                 (# lines)
+              verse number of each line                   (# lines)
+              offset of each line's text, plus the end    (# lines + 1)
+  names blob  UTF-8 version and book names, padded to 4 bytes
+  text blob   UTF-8 text of every line
+
+usage: python -m textbites.bible.binary <bible.json> [bible.bin]
+"""
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+
+
+MAGIC = b"TBBIBLE1"
+HEADER = struct.Struct("<8sIIIII")
+ITEM_SIZE = 4
+
+
+def _uint_array(values):
+  arr = array('I', values)
+  assert arr.itemsize == ITEM_SIZE
+  if sys.byteorder != 'little':
+    arr.byteswap()
+  return arr
+
+
+def _blob(strings):
+  """ Return (offsets including the end, UTF-8 bytes) of strings.
+  """
+  offsets = [0]
+  parts = []
+  for s in strings:
+    parts.append(s.encode('utf-8'))
+    offsets.append(offsets[-1] + len(parts[-1]))
+  return offsets, b"".join(parts)
+
+
+def write_binary(resource, bin_filename):
+  """ Write a loaded BibleResource in the binary format.
+  """
+  bible = resource.top_reference()
+  book_starts = [0]
+  chapter_nums = []
+  chapter_starts = [0]
+  cnums = []
+  lnums = []
+  texts = []
+  for book in bible.books:
+    for chapter in book.chapters:
+      chapter_nums.append(chapter.num)
+      for line in chapter.lines:
+        cnums.append(line.cnum)
+        lnums.append(line.lnum)
+        texts.append(line.text())
+      chapter_starts.append(len(texts))
+    book_starts.append(len(chapter_nums))
+  name_offsets, names = _blob([bible.version] + [b.title for b in bible.books])
+  names += b"\0" * (-len(names) % ITEM_SIZE)
+  text_offsets, text = _blob(texts)
+  with open(bin_filename, 'wb') as out:
+    out.write(HEADER.pack(MAGIC, len(bible.books), len(chapter_nums),
+                          len(texts), len(names), len(text)))
+    for values in [book_starts, name_offsets, chapter_nums, chapter_starts,
+                   cnums, lnums, text_offsets]:
+      out.write(_uint_array(values).tobytes())
+    out.write(names)
+    out.write(text)
+
+
+class MappedTexts(Sequence):
+  """ Line texts decoded from the text blob on access.
+  """
+
+  def __init__(self, blob, offsets):
+    self._blob = blob
+    self._offsets = offsets
+
+  def __len__(self):
+    return len(self._offsets) - 1
+
+  def __getitem__(self, key):
+    if isinstance(key, slice):
+      return [self[i] for i in range(*key.indices(len(self)))]
+    if key < 0:
+      key += len(self)
+    return str(self._blob[self._offsets[key]:self._offsets[key+1]], 'utf-8')
+
+
+class MappedBible(object):
+  """ Tables of a memory mapped binary Bible.
+  """
+
+  def __init__(self, bin_filename):
+    with open(bin_filename, 'rb') as f:
+      self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    (magic, num_books, num_chapters, num_lines,
+        names_size, text_size) = HEADER.unpack_from(self._mmap)
+    if magic != MAGIC:
+      raise ValueError("Not a binary bible: " + bin_filename)
+    self._view = memoryview(self._mmap)
+    self._pos = HEADER.size
+    self.book_starts = self._uints(num_books + 1)
+    name_offsets = self._uints(num_books + 2)
+    self.chapter_nums = self._uints(num_chapters)
+    self.chapter_starts = self._uints(num_chapters + 1)
+    self.cnums = self._uints(num_lines)
+    self.lnums = self._uints(num_lines)
+    text_offsets = self._uints(num_lines + 1)
+    names = MappedTexts(self._bytes(names_size), name_offsets)
+    self.version = names[0]
+    self.book_names = names[1:]
+    self.texts = MappedTexts(self._bytes(text_size), text_offsets)
+
+  def _bytes(self, size):
+    view = self._view[self._pos:self._pos + size]
+    self._pos += size
+    return view
+
+  def _uints(self, count):
+    view = self._bytes(count * ITEM_SIZE)
+    if sys.byteorder == 'little':
+      return view.cast('I')
+    arr = array('I', view.tobytes())
+    arr.byteswap()
+    return arr
+
+
+def main(args):
+  from textbites.bible.bible import BibleResource
+  if len(args) < 2:
+    print(__doc__)
+    return 1
+  json_filename = args[1]
+  bin_filename = args[2] if len(args) > 2 else (
+      json_filename[:-len(".json")] + ".bin")
+  write_binary(BibleResource.from_json(json_filename), bin_filename)
+  print("Wrote", bin_filename)
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv))
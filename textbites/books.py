@@ -20,36 +20,126 @@ Restrictions:
 4. saves no paragraph whitespace
 """
 import re
+import weakref
+from bisect import bisect_right
 
 from .api import Reference, Resource, UnparsableReferenceError, InvalidReferenceError
 from .utils import *
+from .lru import LRUCache
+from .search.text_buffer import TextBuffer
+from .search.folded_text import FoldedText
+from .search.patterns import compile_pattern
+from .simple_books import _decoded_events, _stream_events
 import json
 
+class ViewCache(LRUCache):
+  """ Flyweight cache of views keyed by (chapter, line) number, so the
+      same text traversed again reuses the same instances. Views are
+      shared while anything holds them, through weak references, and the
+      most recently used maxsize are also held here.
+  """
+
+  def __init__(self, maxsize):
+    LRUCache.__init__(self, maxsize)
+    self._shared = weakref.WeakValueDictionary()
+
+  def _reset_counts(self):
+    LRUCache._reset_counts(self)
+    self.created = 0
+
+  def view(self, key, cls, *args):
+    """ Return the view for key, creating it as cls(*args) if needed.
+    """
+    view = self.get(key)
+    if view is None:
+      view = self._shared.get(key)
+      if view is None:
+        view = cls(*args)
+        self.created += 1
+        self._shared[key] = view
+      self.put(key, view)
+    return view
+
+  def clear(self):
+    LRUCache.clear(self)
+    self._shared.clear()
+
+  def stats(self):
+    """ Return dict of counters, including views created and reused.
+    """
+    stats = LRUCache.stats(self)
+    stats["created"] = self.created
+    stats["reused"] = self.hits + self.misses - self.created
+    stats["shared"] = len(self._shared)
+    return stats
+
+
 class BookResource(Resource):
 
+  # number of recently used views held by the view cache
+  VIEW_CACHE_SIZE = 1024
+
   @staticmethod
-  def from_json(json_filename):
+  def from_json(json_filename, text_buffer=False, stream=False,
+                folded_text=False):
     """ Create a resource from json data.
         Assumes title, author, chapters/text
+        stream reads the file incrementally, a chapter at a time, rather
+        than decoding it all first, so memory stays close to the result.
     """
-    data = json.load(open(json_filename, 'r'))
-    title = data.get("title")
-    author = data.get("author")
+    title = None
+    author = None
     chapters = []
-    for chapter in data.get("chapters"):
-      lines = [l.strip() for l in chapter.get("text").split('\n')]
-      chapters.append(lines)
-    res = BookResource(title, author, chapters)
+    with open(json_filename, 'r') as f:
+      events = _stream_events(f) if stream else _decoded_events(json.load(f))
+      for kind, value in events:
+        if kind == "title":
+          title = value
+        elif kind == "author":
+          author = value
+        elif kind == "chapter":
+          chapters.append([l.strip() for l in value.get("text").split('\n')])
+    res = BookResource(title, author, chapters, text_buffer, folded_text)
     top_ref = res.top_reference()
     top_ref._resource = res
     return top_ref.resource()
 
-  def __init__(self, title, author, chapters):
+  def __init__(self, title, author, chapters, text_buffer=False,
+               folded_text=False):
     """ Chapters should be a list of list of strings.
+        text_buffer enables searching over a single buffer of all the
+        text instead of line by line.
+        folded_text keeps a case folded copy of the text for case
+        insensitive plain text queries.
     """
     self._title = title
     self._author = author
     self._chapters = chapters
+    self.view_cache = ViewCache(self.VIEW_CACHE_SIZE)
+    self._text_buffer = None
+    self._folded_text = None
+    if text_buffer or folded_text:
+      # position of each chapter's first line within the buffer
+      self._chapter_starts = []
+      texts = []
+      for chapter in chapters:
+        self._chapter_starts.append(len(texts))
+        texts.extend(chapter)
+      if text_buffer:
+        self._text_buffer = TextBuffer(texts)
+      if folded_text:
+        self._folded_text = FoldedText(texts)
+
+  def index_sizes(self):
+    """ Return dict of the approximate bytes held by each enabled search
+        structure.
+    """
+    sizes = {}
+    if self._text_buffer is not None:
+      sizes["text_buffer"] = self._text_buffer.nbytes()
+    if self._folded_text is not None:
+      sizes["folded_text"] = self._folded_text.nbytes()
+    return sizes
 
   def reference(self, str_ref):
     """ Parse this string reference and return an object. 
@@ -63,14 +153,14 @@ class BookResource(Resource):
         return self.top_reference()
       if not start:
         if not chap_end:
-          return Chapter(self, int(chap_start))
+          return self.chapter(int(chap_start))
         else:
           if int(chap_end) > len(self._chapters):
             raise InvalidReferenceError()
           return ChapterRange(self, int(chap_start), int(chap_end))
       end = m.group(4)
       if not end:
-        return Line(self, int(chap_start), int(start))
+        return self.line(int(chap_start), int(start))
       if int(end) > self.chapter_length(int(chap_start)):
         raise InvalidReferenceError()
       return LineRange(self, int(chap_start), int(start), int(end))
@@ -79,17 +169,29 @@ class BookResource(Resource):
   def top_reference(self):
     """ Produce Book reference.
     """
-    return Book(self)
+    return self.view_cache.view((None, None), Book, self)
 
   def title(self):
     return self._title
+
+  def chapter(self, chapter_num):
+    """ Produce Chapter reference, shared through the view cache.
+    """
+    return self.view_cache.view((chapter_num, None), Chapter, self,
+                                chapter_num)
+
+  def line(self, chapter_num, line_num):
+    """ Produce Line reference, shared through the view cache.
+    """
+    return self.view_cache.view((chapter_num, line_num), Line, self,
+                                chapter_num, line_num)
     
   def chapters(self):
     """ Produce list of Chapter reference.
     """
     c_refs = []
     for i, chapter in enumerate(self._chapters, 1):
-      c_refs.append(Chapter(self, i))
+      c_refs.append(self.chapter(i))
     return c_refs
 
   def chapter_length(self, chapter_num):
@@ -106,7 +208,7 @@ class BookResource(Resource):
     # create range so we have numbers for line numbers
     first = val_or_default(first_line, 1)
     last = val_or_default(last_line, self.chapter_length(chapter_num))
-    return [Line(self, chapter_num, n) for n in range(first, last+1)]
+    return [self.line(chapter_num, n) for n in range(first, last+1)]
 
   def chapter_text(self, chapter_num, first_line=None, last_line=None):
     """ Return text from a chapter. If no line numbers are given, it
@@ -116,17 +218,41 @@ class BookResource(Resource):
     return '\n'.join(chapter[zero_indexed(first_line):last_line]).strip()
 
   def search(self, pattern, first_chapter=None, last_chapter=None, 
-                            first_line=None, last_line=None):
+                            first_line=None, last_line=None,
+                            limit=None, offset=0):
     """ Return Line references for search hits within the specified limits.
         Unspecified boundaries default to open ended. e.g. last_chapter being None
         means it will search all following chapters.
+        limit and offset select a page of the hits, and searching stops
+        once it is found.
+    """
+    return paginate(self.iter_search(pattern, first_chapter, last_chapter,
+                                     first_line, last_line), limit, offset)
+
+  def iter_search(self, pattern, first_chapter=None, last_chapter=None,
+                                 first_line=None, last_line=None):
+    """ Return an iterator of the hits search() returns, which scans the
+        lines as it is consumed.
     """
     #print "chap boundary", first_chapter, last_chapter, first_line, last_line
     # don't allow line ranges across multiple chapters
     if ((first_chapter != last_chapter) and 
         not (first_line == None and last_line == None)):
       raise IllegalSearchError
-    results = []
+    pattern = compile_pattern(pattern)
+    for buffer in [self._folded_text, self._text_buffer]:
+      if buffer is not None:
+        results = self._buffer_search(buffer, pattern, first_chapter,
+                                      last_chapter, first_line, last_line)
+        if results is not None:
+          return iter(results)
+    return self._iter_scan(pattern, first_chapter, last_chapter,
+                           first_line, last_line)
+
+  def _iter_scan(self, pattern, first_chapter, last_chapter,
+                 first_line, last_line):
+    """ Generate the hits by scanning each line in the limits.
+    """
     # last value doesn't have to be converted since it's an exclusive selection
     fl = zero_indexed(first_line)
     fc = zero_indexed(first_chapter)
@@ -138,8 +264,36 @@ class BookResource(Resource):
     for i, chapter in enumerate(self._chapters[fc:last_chapter], 1):
       for j, line in enumerate(chapter[fl:last_line], 1):
         #print "Searching chapter:verse", i, j
-        if re.search(pattern, line):
-          results.append(Line(self, i+chap_offset, j+line_offset))
+        if pattern.search(line):
+          yield self.line(i+chap_offset, j+line_offset)
+
+  def _buffer_search(self, buffer, pattern, first_chapter, last_chapter,
+                     first_line, last_line):
+    """ Search the text or folded text buffer, returning None if the limits
+        don't select a contiguous run of lines or the pattern is
+        unsupported.
+    """
+    chapters = range(len(self._chapters))[zero_indexed(first_chapter):last_chapter]
+    if not chapters:
+      return []
+    if first_line == None and last_line == None:
+      first = self._chapter_starts[chapters[0]]
+      last = self._chapter_starts[chapters[-1]] + len(self._chapters[chapters[-1]])
+    elif len(chapters) == 1:
+      lines = range(len(self._chapters[chapters[0]]))[zero_indexed(first_line):last_line]
+      if not lines:
+        return []
+      first = self._chapter_starts[chapters[0]] + lines[0]
+      last = self._chapter_starts[chapters[0]] + lines[-1] + 1
+    else:
+      return None
+    positions = buffer.search(pattern, first, last)
+    if positions is None:
+      return None
+    results = []
+    for pos in positions:
+      c = bisect_right(self._chapter_starts, pos) - 1
+      results.append(self.line(c+1, pos-self._chapter_starts[c]+1))
     return results
 
 
@@ -159,6 +313,16 @@ class Book(ReferenceImpl):
   def children(self):
     return self._resource.chapters()
 
+  def __len__(self):
+    return len(self._resource._chapters)
+
+  def __getitem__(self, key):
+    """ Chapter views are made directly, rather than from children().
+    """
+    if isinstance(key, slice):
+      return self.children()[key]
+    return self._resource.chapter(range(1, len(self)+1)[key])
+
   def pretty(self):
     return self._resource._title
 
@@ -167,8 +331,14 @@ class Book(ReferenceImpl):
     raise NotImplementedError()
 
   def search(self, pattern, first_chapter=None, last_chapter=None, 
-                            first_line=None, last_line=None):
+                            first_line=None, last_line=None,
+                            limit=None, offset=0):
     return self._resource.search(pattern, 
+        first_chapter, last_chapter, first_line, last_line, limit, offset)
+
+  def iter_search(self, pattern, first_chapter=None, last_chapter=None,
+                                 first_line=None, last_line=None):
+    return self._resource.iter_search(pattern,
         first_chapter, last_chapter, first_line, last_line)
 
 
@@ -215,6 +385,23 @@ class Chapter(ReferenceImpl):
   def children(self):
     return self._resource.lines_for_chapter(self._chapter_num)
 
+  def __len__(self):
+    return self._resource.chapter_length(self._chapter_num)
+
+  def __getitem__(self, key):
+    """ Line views are made directly, rather than from children().
+    """
+    if isinstance(key, slice):
+      return self.children()[key]
+    return self._resource.line(self._chapter_num,
+                               range(1, len(self)+1)[key])
+
+  def parent(self):
+    return self._resource.top_reference()
+
+  def position(self):
+    return self._chapter_num - 1
+
   def pretty(self):
     return self._resource.title() + " %d" % self._chapter_num
 
@@ -267,6 +454,9 @@ class LineRange(ReferenceImpl):
         first_chapter=cn, last_chapter=cn,
         first_line=self._first, last_line=self._last)
 
+  def parent(self):
+    return self._resource.chapter(self._chapter_num)
+
 
 class Line(LineRange, ReferenceImpl):
   """ View of 1 line.  Implemented as special case of LineRange.
@@ -280,6 +470,9 @@ class Line(LineRange, ReferenceImpl):
     """
     return None
 
+  def position(self):
+    return self._first - 1
+
 
 class IllegalSearchError(Exception):
   pass
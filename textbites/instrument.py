@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+"""
+Opt-in timing of library loads, reference parsing and searches, per
+resource and operation. As a module to be a singleton.
+
+enable() wraps the methods in place, and disable() puts the originals
+back, so when disabled there is no cost at all. Loads are timed around the
+loader which parses the data file, so a lazy library.load is recorded when
+the resource is first used rather than when it is registered. Only the outermost
+instrumented call on a thread is recorded, so a Book's search isn't also
+counted as the searches of its chapters.
+
+stats() returns, per library resource name and operation, the call and error
+counts, total, mean, max and percentile seconds, and the number of
+results. Percentiles are of a random sample of at most SAMPLE_SIZE calls.
+"""
+import functools
+import json
+import random
+import threading
+import time
+
+from .api import Resource
+
+
+# latencies kept per resource and operation for percentiles
+SAMPLE_SIZE = 4096
+PERCENTILES = (50, 90, 99)
+# methods timed on each resource and reference class
+OPERATIONS = ["reference", "resolve_many", "search", "query", "ranked_search"]
+
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}
+# (owner, attribute, original) of each method wrapped
+_wrapped = []
+# id of each resource seen to its library name
+_names = {}
+
+
+class OperationStats(object):
+  """ Counts and latencies of one operation on one resource.
+  """
+
+  def __init__(self):
+    self.count = 0
+    self.errors = 0
+    self.total = 0.0
+    self.max = 0.0
+    self.results = 0
+    self.samples = []
+    self._rand = random.Random(0)
+
+  def add(self, seconds, results=None, error=False):
+    self.count += 1
+    self.total += seconds
+    self.max = max(self.max, seconds)
+    if error:
+      self.errors += 1
+    if results != None:
+      self.results += results
+    # reservoir sample, so each call is equally likely to be kept
+    if len(self.samples) < SAMPLE_SIZE:
+      self.samples.append(seconds)
+    else:
+      i = self._rand.randrange(self.count)
+      if i < SAMPLE_SIZE:
+        self.samples[i] = seconds
+
+  def percentile(self, p):
+    samples = sorted(self.samples)
+    if not samples:
+      return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))]
+
+  def summary(self):
+    summary = { "count" : self.count,
+                "errors" : self.errors,
+                "total" : self.total,
+                "mean" : self.total / self.count if self.count else 0.0,
+                "max" : self.max,
+                "results" : self.results }
+    for p in PERCENTILES:
+      summary["p%d" % p] = self.percentile(p)
+    return summary
+
+
+def record(resource, operation, seconds, results=None, error=False):
+  """ Add a call taking seconds, which gave results items.
+  """
+  with _lock:
+    ops = _stats.setdefault(resource, {})
+    stats = ops.get(operation)
+    if stats is None:
+      stats = ops[operation] = OperationStats()
+    stats.add(seconds, results, error)
+
+
+def stats():
+  """ Return dict of resource name to operation to its summary.
+  """
+  with _lock:
+    return dict((resource, dict((op, s.summary()) for op, s in ops.items()))
+                  for resource, ops in _stats.items())
+
+
+def to_json(indent=1):
+  return json.dumps(stats(), indent=indent, sort_keys=True)
+
+
+def dump(filename):
+  """ Write the stats as JSON.
+  """
+  with open(filename, 'w') as f:
+    f.write(to_json())
+
+
+def reset():
+  with _lock:
+    _stats.clear()
+
+
+def enabled():
+  return bool(_wrapped)
+
+
+def enable():
+  """ Start timing calls.
+  """
+  if enabled():
+    return
+  from textbites import library
+  from textbites import simple_books, books, quotes
+  from textbites.bible import bible
+  _wrapped.append((library, "_loader_for", library._loader_for))
+  library._loader_for = _timed_loader_for(library._loader_for)
+  for module in [simple_books, books, quotes, bible]:
+    for value in list(vars(module).values()):
+      if isinstance(value, type) and value.__module__ == module.__name__:
+        for operation in OPERATIONS:
+          if operation in vars(value):
+            _wrap(value, operation, operation, _resource_name)
+
+
+def disable():
+  """ Stop timing calls, keeping the stats so far.
+  """
+  while _wrapped:
+    owner, attr, original = _wrapped.pop()
+    setattr(owner, attr, original)
+
+
+def _wrap(owner, attr, operation, resource_of):
+  """ Replace owner's attr with a function recording each outermost call.
+  """
+  original = getattr(owner, attr)
+  if isinstance(vars(owner)[attr], staticmethod):
+    return
+  _wrapped.append((owner, attr, original))
+  setattr(owner, attr, _timed(original, operation, resource_of))
+
+
+def _timed(func, operation, resource_of):
+  """ Return a function calling func which records each outermost call,
+      under the resource name resource_of gives for its arguments.
+  """
+
+  @functools.wraps(func)
+  def timed(*args, **kwargs):
+    if getattr(_local, "active", False):
+      return func(*args, **kwargs)
+    _local.active = True
+    start = time.perf_counter()
+    results = None
+    error = True
+    try:
+      result = func(*args, **kwargs)
+      error = False
+      if isinstance(result, (list, tuple)):
+        results = len(result)
+      return result
+    finally:
+      _local.active = False
+      record(resource_of(args), operation, time.perf_counter() - start,
+             results, error)
+
+  return timed
+
+
+def _timed_loader_for(loader_for):
+  """ Wrap library._loader_for so the loaders it returns are timed as the
+      load of their resource, whenever they are called.
+  """
+
+  @functools.wraps(loader_for)
+  def timed_loader_for(datafile):
+    name, loader = loader_for(datafile)
+    if loader is not None:
+      loader = _timed(loader, "load", lambda args: name)
+    return name, loader
+
+  return timed_loader_for
+
+
+def _resource_name(args):
+  """ Library name of the resource of a Resource or Reference method call,
+      else the resource's own name.
+  """
+  from textbites import library
+  resource = args[0]
+  if not isinstance(resource, Resource):
+    try:
+      root = resource.root()
+    except AttributeError:
+      # parent isn't a reference, e.g. ChapterRange
+      root = next(resource.walk()).root()
+    resource = getattr(root, "_resource", root)
+  name = _names.get(id(resource))
+  if name is None or (library.is_loaded(name) and
+                      library.get(name) is not resource):
+    name = resource.name()
+    for lib_name in library.resources():
+      if library.is_loaded(lib_name) and library.get(lib_name) is resource:
+        name = lib_name
+        break
+    _names[id(resource)] = name
+  return name
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""
+Index of stored spans, such as highlights and notes keyed by a reference's
+Index, answering which of them overlap a reference.
+
+Spans are kept in runs, each sorted by start in parallel arrays, over which
+a tree of maximum ends lets a query skip every part of the run ending
+before it, so finding the k overlaps in a run costs about O(log n + k).
+A bulk build makes a single run. Spans added later go in a new run, which
+is merged with the runs before it while they are no bigger, so there are
+O(log n) runs and each span is merged O(log n) times. Removed spans are
+cleared in place until half of a run is removed.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+from .api import Index
+
+
+class IntervalIndex(object):
+  """ Multiset of (Index, value) pairs, inclusive at both ends like
+      Reference.indices(), queried for the ones overlapping a span.
+  """
+
+  def __init__(self, items=()):
+    """ items are (Index, value) pairs, built in bulk.
+    """
+    self.build(items)
+
+  def build(self, items):
+    """ Replace the contents with these (Index, value) pairs, where the
+        Index may be any (start, end) pair.
+    """
+    run = _Run(items)
+    self._runs = [run] if len(run) else []
+
+  def items(self):
+    """ Return all (Index, value) pairs, ordered by span.
+    """
+    items = [item for run in self._runs for item in run.items()]
+    return [(Index(*span), value) for span, value in
+              sorted(items, key=itemgetter(0))]
+
+  def add(self, span, value):
+    """ Store value under the Index span.
+    """
+    items = [(tuple(span), value)]
+    while self._runs and len(self._runs[-1]) <= len(items):
+      items = self._runs.pop().items() + items
+    self._runs.append(_Run(items))
+
+  def remove(self, span, value):
+    """ Remove one value stored under the Index span, raising KeyError if
+        there is none.
+    """
+    for i, run in enumerate(self._runs):
+      if run.remove(span, value):
+        if not len(run):
+          del self._runs[i]
+        elif run.removed > len(run):
+          self._runs[i] = _Run(run.items())
+        return
+    raise KeyError((Index(*span), value))
+
+  def overlapping(self, span):
+    """ Return the (Index, value) pairs overlapping span, ordered by
+        span. span is an Index or a Reference.
+    """
+    if hasattr(span, 'indices'):
+      span = span.indices()
+    start, end = span
+    results = []
+    for run in self._runs:
+      run.overlapping(start, end, results)
+    if len(self._runs) > 1:
+      results.sort(key=itemgetter(0))
+    return results
+
+  def __len__(self):
+    return sum(len(run) for run in self._runs)
+
+
+class _Run(object):
+  """ Spans sorted by start with a tree of maximum ends.
+  """
+
+  def __init__(self, items):
+    items = sorted(items, key=itemgetter(0))
+    self.starts = array('l', [span[0] for span, value in items])
+    self.ends = array('l', [span[1] for span, value in items])
+    self.values = [value for span, value in items]
+    self.removed = 0
+    # leaves are at size + position, padded with ends of -1
+    self.size = 1
+    while self.size < len(items):
+      self.size *= 2
+    self.max = array('l', [-1]) * (2 * self.size)
+    self.max[self.size:self.size + len(items)] = self.ends
+    for node in range(self.size - 1, 0, -1):
+      self.max[node] = max(self.max[2*node], self.max[2*node+1])
+
+  def items(self):
+    """ ((start, end), value) pairs in order, without removed ones.
+    """
+    return [((s, e), v) for s, e, v in
+              zip(self.starts, self.ends, self.values) if e >= 0]
+
+  def remove(self, span, value):
+    """ Clear one matching span, giving it an end of -1 which never
+        overlaps. Returns whether one was found.
+    """
+    start, end = span
+    pos = bisect_left(self.starts, start)
+    while pos < len(self.starts) and self.starts[pos] == start:
+      if self.ends[pos] == end and self.values[pos] == value:
+        self.ends[pos] = -1
+        self.values[pos] = None
+        node = self.size + pos
+        self.max[node] = -1
+        while node > 1:
+          node //= 2
+          self.max[node] = max(self.max[2*node], self.max[2*node+1])
+        self.removed += 1
+        return True
+      pos += 1
+    return False
+
+  def overlapping(self, start, end, results):
+    """ Append the (Index, value) pairs overlapping start to end.
+    """
+    # only spans starting by the end can overlap, and of those, only the
+    # ones ending from the start
+    stop = bisect_right(self.starts, end)
+    stack = [(1, 0, self.size)]
+    while stack:
+      node, lo, hi = stack.pop()
+      if lo >= stop or self.max[node] < start:
+        continue
+      if node >= self.size:
+        results.append((Index(self.starts[lo], self.ends[lo]),
+                        self.values[lo]))
+        continue
+      mid = (lo + hi) // 2
+      stack.append((2*node+1, mid, hi))
+      stack.append((2*node, lo, mid))
+
+  def __len__(self):
+    return len(self.starts) - self.removed
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""
+Incremental JSON parsing, so large resources can be built while reading
+rather than holding the whole decoded document alongside the objects built
+from it.
+
+parse() yields events like ijson: (prefix, event, value), where prefix is
+the dotted path of keys to the value, with "item" for array elements, and
+event is one of start_map, map_key, end_map, start_array, end_array, or
+the type of a scalar (string, number, boolean, null). build() turns the
+events of one value into Python objects, so a loader can materialize each
+small piece (e.g. a chapter) as it passes.
+
+Being pure Python, it is about ten times slower than json.load, so it only
+pays when the memory of decoding the whole document matters. Invalid JSON
+raises ValueError, as json.load would.
+"""
+import json
+import re
+
+
+CHUNK_SIZE = 1 << 16
+TOKEN_RE = re.compile(r"""
+    [ \t\n\r]*(?:
+      (?P<punct>[{}\[\]:,])
+    | "(?P<string>[^"\\]*(?:\\.[^"\\]*)*)"
+    | (?P<number>-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)
+    | (?P<literal>true|false|null)
+    )""", re.VERBOSE | re.DOTALL)
+WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+# must be escaped within strings
+CONTROL_RE = re.compile(r"[\x00-\x1f]")
+# rest of a buffer which could still belong to the number before it
+NUMBER_TAIL_RE = re.compile(r"[0-9.eE+-]*\Z")
+LITERALS = { "true" : ("boolean", True),
+             "false" : ("boolean", False),
+             "null" : ("null", None) }
+SCALARS = ("string", "number", "boolean", "null")
+
+
+def _tokens(f, chunk_size):
+  """ Yield (kind, value) tokens read from file f a chunk at a time.
+  """
+  buf = ""
+  pos = 0
+  eof = False
+  while True:
+    m = TOKEN_RE.match(buf, pos)
+    # a number reaching the end of the buffer may continue in the next chunk
+    if m is None or (not eof and m.lastgroup == "number" and
+                     NUMBER_TAIL_RE.match(buf, m.end())):
+      if eof:
+        if WHITESPACE_RE.match(buf, pos).end() == len(buf):
+          return
+        raise ValueError("Invalid JSON at: %r" % buf[pos:pos+20])
+      chunk = f.read(chunk_size)
+      eof = not chunk
+      buf = buf[pos:] + chunk
+      pos = 0
+      continue
+    pos = m.end()
+    kind = m.lastgroup
+    if kind == "punct":
+      yield m.group(kind), None
+    elif kind == "string":
+      s = m.group(kind)
+      if CONTROL_RE.search(s):
+        raise ValueError("Invalid control character in JSON string: %r" %
+                         s[:20])
+      yield "string", json.loads('"' + s + '"') if "\\" in s else s
+    elif kind == "number":
+      yield "number", json.loads(m.group(kind))
+    else:
+      yield LITERALS[m.group(kind)]
+
+
+def parse(f, chunk_size=CHUNK_SIZE):
+  """ Yield (prefix, event, value) for the JSON document in file f,
+      raising ValueError where it isn't valid JSON.
+  """
+  # for each open container: whether it's a map, its prefix, the prefix
+  # of its current child, which for a map is None until a key, and the
+  # token expected next: "first" after the opening bracket, then "key",
+  # "colon", "value" or "comma"
+  stack = []
+  done = False
+  for kind, value in _tokens(f, chunk_size):
+    if done:
+      raise ValueError("Extra data after JSON value: %r" % kind)
+    frame = stack[-1] if stack else None
+    expect = frame[3] if frame else "value"
+    if kind == ",":
+      if expect != "comma":
+        raise ValueError("Unexpected ',' in JSON")
+      frame[3] = "key" if frame[0] else "value"
+      continue
+    if kind == ":":
+      if expect != "colon":
+        raise ValueError("Unexpected ':' in JSON")
+      frame[3] = "value"
+      continue
+    if kind == "}" or kind == "]":
+      if expect not in ("first", "comma") or frame[0] != (kind == "}"):
+        raise ValueError("Unexpected %r in JSON" % kind)
+      stack.pop()
+      yield frame[1], "end_map" if kind == "}" else "end_array", None
+    elif frame and frame[0] and expect in ("first", "key"):
+      if kind != "string":
+        raise ValueError("Expected a key in JSON, not %r" % kind)
+      frame[2] = frame[1] + "." + value if frame[1] else value
+      frame[3] = "colon"
+      yield frame[1], "map_key", value
+      continue
+    elif expect not in ("first", "value"):
+      raise ValueError("Expected %r in JSON, not %r" % (
+          ":" if expect == "colon" else ",", kind))
+    else:
+      prefix = frame[2] if frame else ""
+      if kind == "{":
+        yield prefix, "start_map", None
+        stack.append([True, prefix, None, "first"])
+        continue
+      elif kind == "[":
+        yield prefix, "start_array", None
+        stack.append([False, prefix, prefix + ".item" if prefix else "item",
+                      "first"])
+        continue
+      yield prefix, kind, value
+    # a completed value is followed by a comma or the end of its container
+    if stack:
+      stack[-1][3] = "comma"
+      if stack[-1][0]:
+        stack[-1][2] = None
+    else:
+      done = True
+  if not done:
+    raise ValueError("Incomplete JSON")
+
+
+def build(events, event, value):
+  """ Return the Python value whose first event has just been read from
+      events, consuming the rest of its events.
+  """
+  if event in SCALARS:
+    return value
+  if event == "start_map":
+    obj = {}
+    for prefix, event, value in events:
+      if event == "end_map":
+        return obj
+      # map_key
+      obj[value] = build(events, *next(events)[1:])
+  if event == "start_array":
+    arr = []
+    for prefix, event, value in events:
+      if event == "end_array":
+        return arr
+      arr.append(build(events, event, value))
+  raise ValueError("Unexpected event: " + event)
@@ -6,29 +6,80 @@ As a module to be a singleton.
 
 import os
 import re
+import heapq
 import os.path
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError
 
 _resources = {}
+# (data file, loader options) each resource was loaded from, for reloading
+_sources = {}
 
 
+class LazyResource(object):
+  """ Holds a loader thunk which is called once, on first use, to produce
+      the resource. Safe to use from several threads.
+  """
+
+  def __init__(self, loader):
+    self._loader = loader
+    self._resource = None
+    self._lock = threading.Lock()
+
+  def loaded(self):
+    return self._loader is None
+
+  def get(self):
+    if self._loader is not None:
+      with self._lock:
+        if self._loader is not None:
+          self._resource = self._loader()
+          self._loader = None
+    return self._resource
+
 
 def resources():
-  """ Return list of Resources available in this library.
+  """ Return list of Resources available in this library, without
+      loading them.
   """
   return sorted(_resources.keys())
 
 def get(name):
-  """ Retrieve resource of this name.
+  """ Retrieve resource of this name, loading it if necessary.
+  """
+  item = _resources.get(name)
+  if isinstance(item, LazyResource):
+    return item.get()
+  return item
+
+def is_loaded(name):
+  """ Whether the named resource has been loaded.
   """
-  return _resources.get(name)
+  item = _resources.get(name)
+  return item is not None and (
+      not isinstance(item, LazyResource) or item.loaded())
 
-def add(name, resource):
-  """ Add item to the library.
+def add(name, resource=None, loader=None):
+  """ Add item to the library. Rather than a resource, a loader may be
+      given which is called to produce it on the first get.
   """
+  if loader is not None:
+    resource = LazyResource(loader)
   _resources[name] = resource
 
-def load(datafile):
-  """ Returns true if loaded.
+def reload(name, lazy=True):
+  """ Load the named resource again from its data file, with the same
+      options, replacing it along with anything it had cached. Returns true
+      if reloaded.
+  """
+  source = _sources.get(name)
+  return source is not None and load(source[0], lazy, **source[1])
+
+def _loader_for(datafile):
+  """ Returns (name, loader function) for the file based on its suffix,
+      or (None, None) for an unknown format.
   """
   from textbites.simple_books import SimpleBookResource
   from textbites.quotes import QuotesResource
@@ -36,18 +87,33 @@ def load(datafile):
 
   suffix_map = { "simple.json" : SimpleBookResource.from_json,
                  "quotes.tsv" : QuotesResource.from_tsv,
-                 "bible.json" : BibleResource.from_json }
+                 "bible.json" : BibleResource.from_json,
+                 "bible.bin" : BibleResource.from_binary }
 
   # load file according to its type based on the map
   for pattern in suffix_map:
     if (datafile.endswith(pattern)):
-      file_handle = suffix_map.get(pattern)(datafile)
-      add(re.sub("\." + pattern + "$", "", os.path.basename(datafile)), file_handle)
-      return True
+      name = re.sub("\." + pattern + "$", "", os.path.basename(datafile))
+      return name, suffix_map.get(pattern)
+  return None, None
 
-  return False
+def load(datafile, lazy=True, **options):
+  """ Returns true if the file exists and is a known format. If lazy, it
+      is only registered and parsed on the first get. Options are passed
+      to the format's loader, e.g. word_index=True for simple books and
+      Bibles.
+  """
+  name, loader = _loader_for(datafile)
+  if loader is None or not os.path.isfile(datafile):
+    return False
+  _sources[name] = (datafile, options)
+  if lazy:
+    add(name, loader=lambda: loader(datafile, **options))
+  else:
+    add(name, loader(datafile, **options))
+  return True
 
-def dynamically_load_dir(dirname):
+def dynamically_load_dir(dirname, lazy=True):
   """ Load resources in given directory based on suffix.
   """
   for f in os.listdir(dirname):
@@ -58,11 +124,119 @@ def dynamically_load_dir(dirname):
     if (f.startswith("_")):
       continue
 
-    if not load(datafile):
+    if not load(datafile, lazy):
       print("Unknown resource format for file:", f)
 
   print("Dynamically loaded library of:", resources())
 
+def _parse_file(datafile):
+  """ Worker which parses datafile, returning (name, resource, seconds).
+      JSON formats are stored compactly, as LineTable columns are much
+      cheaper to send back than an object per line.
+  """
+  start = time.perf_counter()
+  name, loader = _loader_for(datafile)
+  if datafile.endswith(".json"):
+    resource = loader(datafile, compact=True)
+  else:
+    resource = loader(datafile)
+  return name, resource, time.perf_counter() - start
+
+def parallel_load_dir(dirname, processes=None):
+  """ Load resources in given directory based on suffix, parsing the files
+      in a pool of worker processes. Returns a dict with the seconds each
+      file took to parse, the overall wall-clock seconds and the
+      concurrency, the total parse time over the wall-clock time. That is
+      how many files were parsed at once on average, not the speedup over
+      loading serially, see bin/benchmark.py load.
+  """
+  start = time.perf_counter()
+  datafiles = []
+  for f in sorted(os.listdir(dirname)):
+    datafile = os.path.join(dirname, f)
+    # don't load files staring with underscore
+    if (f.startswith("_")):
+      continue
+    name, loader = _loader_for(datafile)
+    if loader is None:
+      print("Unknown resource format for file:", f)
+    elif f.endswith("bible.bin"):
+      # already quick to map, and maps can't be sent between processes
+      add(name, loader(datafile))
+      _sources[name] = (datafile, {})
+    else:
+      datafiles.append(datafile)
+
+  times = {}
+  with ProcessPoolExecutor(processes) as pool:
+    for datafile, (name, resource, seconds) in zip(datafiles,
+        pool.map(_parse_file, datafiles)):
+      add(name, resource)
+      _sources[name] = (datafile, {})
+      times[os.path.basename(datafile)] = seconds
+      print("Loaded {} in {:.3f}s".format(os.path.basename(datafile), seconds))
+  wall = time.perf_counter() - start
+  print("Parallel loaded library of:", resources())
+  return { "files" : times,
+           "wall" : wall,
+           "concurrency" : sum(times.values()) / wall if wall else 0.0 }
+
+def _search_resource(name, pattern):
+  """ Worker which searches the named resource, loading it if necessary.
+  """
+  return get(name).top_reference().search(pattern)
+
+def search(pattern, names=None, timeout=None, max_workers=None):
+  """ Search the named resources, or all of them, concurrently in a thread
+      pool. Returns a dict with the hits as (resource name, reference)
+      pairs ordered by resource name, and the names of resources which
+      didn't finish within timeout seconds of this call, or raised, whose
+      hits are left out. The timeout is one deadline for the whole search,
+      not a limit per resource, so if max_workers is fewer than the
+      resources, those queued behind others get less time.
+      Slow searches are left to finish in the background.
+  """
+  from textbites.search.patterns import compile_pattern
+  pattern = compile_pattern(pattern)
+  names = resources() if names is None else sorted(names)
+  hits = []
+  timed_out = []
+  errors = {}
+  if not names:
+    return { "hits" : hits, "timed_out" : timed_out, "errors" : errors }
+  pool = ThreadPoolExecutor(max_workers or len(names))
+  futures = [(name, pool.submit(_search_resource, name, pattern))
+               for name in names]
+  deadline = None if timeout is None else time.perf_counter() + timeout
+  for name, future in futures:
+    remaining = None
+    if deadline is not None:
+      remaining = max(deadline - time.perf_counter(), 0)
+    try:
+      hits.extend((name, ref) for ref in future.result(remaining))
+    except TimeoutError:
+      future.cancel()
+      timed_out.append(name)
+    except Exception as e:
+      errors[name] = e
+  pool.shutdown(wait=False)
+  return { "hits" : hits, "timed_out" : timed_out, "errors" : errors }
+
+def ranked_search(query, k=10, names=None):
+  """ Return the k (score, resource name, reference) triples most
+      relevant to query across the named resources, or all of them, best
+      first. Resources without ranked search are skipped.
+  """
+  names = resources() if names is None else sorted(names)
+  ranked = []
+  for name in names:
+    try:
+      hits = get(name).top_reference().ranked_search(query, k)
+    except NotImplementedError:
+      continue
+    ranked.extend((score, name, ref) for score, ref in hits)
+  return heapq.nsmallest(k, ranked, key=lambda hit: (-hit[0], hit[1]))
+
 
 # TODO Move this somewhere!!
 def load_resources():
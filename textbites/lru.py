@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Bounded least recently used cache with counters, shared by the caches of
+compiled patterns, search results and parsed references.
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+  """ Thread-safe LRU mapping which counts hits, misses and evictions.
+      A maxsize of 0 disables it.
+  """
+
+  def __init__(self, maxsize):
+    self.maxsize = maxsize
+    self._items = OrderedDict()
+    self._lock = threading.Lock()
+    self._reset_counts()
+
+  def _reset_counts(self):
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, key):
+    """ Return the cached value, or None.
+    """
+    with self._lock:
+      value = self._items.get(key)
+      if value is None:
+        self.misses += 1
+      else:
+        self.hits += 1
+        self._items.move_to_end(key)
+      return value
+
+  def put(self, key, value):
+    """ Store value, evicting the least recently used if full.
+    """
+    if self.maxsize <= 0:
+      return
+    with self._lock:
+      self._items[key] = value
+      self._items.move_to_end(key)
+      self._evict()
+
+  def _evict(self):
+    while len(self._items) > self.maxsize:
+      self._items.popitem(last=False)
+      self.evictions += 1
+
+  def resize(self, maxsize):
+    """ Change the bound, evicting least recently used items.
+    """
+    with self._lock:
+      self.maxsize = maxsize
+      self._evict()
+
+  def clear(self):
+    """ Drop all items and reset counters.
+    """
+    with self._lock:
+      self._items.clear()
+      self._reset_counts()
+
+  def stats(self):
+    """ Return dict of counters.
+    """
+    return { "hits" : self.hits,
+             "misses" : self.misses,
+             "evictions" : self.evictions,
+             "size" : len(self._items),
+             "maxsize" : self.maxsize }
+
+  def __len__(self):
+    return len(self._items)
+
+  def __getstate__(self):
+    """ Only the size is kept when pickled, e.g. between processes.
+    """
+    return { "maxsize" : self.maxsize }
+
+  def __setstate__(self, state):
+    self.__init__(state["maxsize"])
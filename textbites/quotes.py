@@ -9,6 +9,9 @@ import logging
 
 from .api import Reference, Resource, UnparsableReferenceError, InvalidReferenceError, Index
 from .utils import *
+from .search.patterns import compile_pattern
+from .search.bm25 import BM25Index
+from bisect import bisect_left
 from collections import defaultdict
 import json
 
@@ -52,15 +55,13 @@ class QuotesResource(Resource, ReferenceImpl):
         log.debug("Discarding w/ wrong # tokens: %s", vals)
     # build data
     people = []
-    res_index = 0
     for person, data in list(quote_dict.items()):
-      res_index += 1
       quotes = []
       for qnum, quote_pair in enumerate(data, 1):
         date, quote = quote_pair
         #print qnum, date, quote
         qid = str(person+ QuotesResource.REF_DELIM + str(qnum))
-        quotes.append(Quote(person, quote, qid, res_index));
+        quotes.append(Quote(person, quote, qid));
       people.append(Person(person, quotes))
     return QuotesResource(people)
 
@@ -81,9 +82,24 @@ class QuotesResource(Resource, ReferenceImpl):
     return QuotesResource(people)
 
   def __init__(self, people):
-    """ Stores only the top reference.
+    """ Stores only the top reference. Quotes are numbered from 1 in
+        reading order as their res_index, and speakers are looked up by
+        case folded name.
     """
     self.people = sorted(people, key=lambda x:x.name)
+    self.quotes = [q for p in self.people for q in p.quotes]
+    for res_index, quote in enumerate(self.quotes, 1):
+      quote.res_index = res_index
+    # case folded name to the first person having it
+    self._people_by_name = {}
+    for person in self.people:
+      self._people_by_name.setdefault(person.name.casefold(), person)
+    # sorted folded names and their people for prefix lookups
+    folded = sorted(self._people_by_name.items())
+    self._folded_names = [name for name, _ in folded]
+    self._folded_people = [person for _, person in folded]
+    # built on the first ranked search
+    self.bm25_index = None
     ReferenceImpl.__init__(self)
 
   def reference(self, str_ref):
@@ -97,22 +113,66 @@ class QuotesResource(Resource, ReferenceImpl):
     else: 
       name = str_ref
       num = None
-    lower_name = name.lower()
-    for person in self.people:
-      if person.name.lower() == lower_name:
-        if num == None:
-          return person
-        else:
-          try:
-            ref = person.children()[int(num)-1]
-            return ref
-          except Exception as e:
-            log.info("Can't parse reference: %s %s", str_ref, e)
-            raise InvalidReferenceError
-    return None
+    person = self._people_by_name.get(name.casefold())
+    if person == None:
+      return None
+    if num == None:
+      return person
+    try:
+      return person.children()[int(num)-1]
+    except Exception as e:
+      log.info("Can't parse reference: %s %s", str_ref, e)
+      raise InvalidReferenceError
+
+  def speakers(self, prefix, limit=None):
+    """ People whose names start with prefix, ignoring case, in order of
+        their folded names, for completing speaker names.
+    """
+    prefix = prefix.casefold()
+    people = []
+    i = bisect_left(self._folded_names, prefix)
+    while (i < len(self._folded_names) and
+           self._folded_names[i].startswith(prefix) and
+           (limit == None or len(people) < limit)):
+      people.append(self._folded_people[i])
+      i += 1
+    return people
+
+  def quote(self, res_index):
+    """ Quote having this res_index.
+    """
+    self._check_span(Index(res_index, res_index))
+    return self.quotes[res_index - 1]
+
+  def quotes_in(self, span):
+    """ Quotes within the Index span, inclusive.
+    """
+    self._check_span(span)
+    return self.quotes[span.start - 1:span.end]
+
+  def resolve(self, index):
+    """ Return the Quote, else the Person or the resource covering the
+        Index.
+    """
+    self._check_span(index)
+    first = self.quotes[index.start - 1]
+    if index.start == index.end:
+      return first
+    person = first.parent()
+    if person is self.quotes[index.end - 1].parent():
+      return person
+    return self
+
+  def _check_span(self, span):
+    if not 1 <= span.start <= span.end <= len(self.quotes):
+      raise InvalidReferenceError("%s is outside of %s" % (str(span),
+                                                           self.name()))
 
   def top_reference(self):
     return self
+
+  # as its own top reference, walk the children rather than Resource.walk
+  walk = ReferenceImpl.walk
   
   def children(self):
     return self.people
@@ -124,12 +184,29 @@ class QuotesResource(Resource, ReferenceImpl):
     """ Too much text. """
     raise NotImplementedError()
 
-  def search(self, pattern):
+  def search(self, pattern, limit=None, offset=0):
+    """ limit and offset select a page of the hits, and searching stops
+        once it is found.
+    """
+    if limit != None or offset:
+      return paginate(self.iter_search(pattern), limit, offset)
+    pattern = compile_pattern(pattern)
     hits = []
     for q in self.people:
       hits.extend(q.search(pattern))
     return hits
 
+  def ranked_search(self, query, k=10):
+    if self.bm25_index is None:
+      self.bm25_index = BM25Index.from_texts(q.quote for q in self.quotes)
+    return [(score, self.quotes[pos])
+              for score, pos in self.bm25_index.top(query, k)]
+
+  def iter_search(self, pattern):
+    pattern = compile_pattern(pattern)
+    return (hit for person in self.people
+                  for hit in person.iter_search(pattern))
+
 
 class Person(ReferenceImpl):
   """ A single person's quotes.
@@ -150,15 +227,22 @@ class Person(ReferenceImpl):
     raise NotImplementedError()
 
   def search(self, pattern):
+    pattern = compile_pattern(pattern)
     hits = []
     for q in self.quotes:
       hits.extend(q.search(pattern))
     return hits
 
+  def iter_search(self, pattern):
+    pattern = compile_pattern(pattern)
+    return (q for q in self.quotes if pattern.search(q.quote))
+
 class Quote(ReferenceImpl):
   """ A single quote.
   """
-  def __init__(self, speaker, quote, qid, res_index):
+  def __init__(self, speaker, quote, qid, res_index=None):
+    """ res_index is numbered by the QuotesResource.
+    """
     self.speaker = speaker
     self.quote = quote
     self.qid = qid
@@ -176,7 +260,7 @@ class Quote(ReferenceImpl):
     return self.quote
 
   def search(self, pattern):
-    if re.search(pattern, self.quote):
+    if compile_pattern(pattern).search(self.quote):
       return [self]
     return []
 
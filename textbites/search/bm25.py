@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Okapi BM25 ranking of a resource's units of text, lines or quotes, by
+relevance to a query of words.
+
+Term frequencies, unit lengths and document frequencies are computed once
+when the index is built. A query only visits the postings of its own
+words, accumulating a score per unit, and keeps the k best with a heap, so
+only those k units are turned into references.
+"""
+import heapq
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+from .word_index import WORD_RE
+
+
+# term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+  """ Lowercased words of text.
+  """
+  return WORD_RE.findall(text.lower())
+
+
+class BM25Index(object):
+  """ Maps each lowercased word to the sorted positions of the units it
+      appears in and its frequency in each. Units are numbered from 0 in
+      the order they are added.
+  """
+
+  @staticmethod
+  def from_texts(texts):
+    index = BM25Index()
+    for text in texts:
+      index.add(text)
+    return index
+
+  def __init__(self):
+    # word -> (unit positions, term frequencies)
+    self._postings = {}
+    self._lengths = array('I')
+    self._total_length = 0
+    self._norms = None
+
+  def add(self, text):
+    """ Add the next unit.
+    """
+    pos = len(self._lengths)
+    words = tokenize(text)
+    for word, count in Counter(words).items():
+      postings = self._postings.get(word)
+      if postings is None:
+        postings = self._postings[word] = (array('I'), array('I'))
+      postings[0].append(pos)
+      postings[1].append(count)
+    self._lengths.append(len(words))
+    self._total_length += len(words)
+    self._norms = None
+
+  def __len__(self):
+    """ Number of units.
+    """
+    return len(self._lengths)
+
+  def nbytes(self):
+    """ Approximate memory held, in bytes.
+    """
+    held = sum(a.itemsize * len(a) for postings in self._postings.values()
+                                   for a in postings)
+    held += self._lengths.itemsize * len(self._lengths)
+    if self._norms is not None:
+      held += self._norms.itemsize * len(self._norms)
+    return held
+
+  def idf(self, word):
+    """ Inverse document frequency, which is never negative.
+    """
+    postings = self._postings.get(word)
+    df = len(postings[0]) if postings else 0
+    return math.log(1 + (len(self._lengths) - df + 0.5) / (df + 0.5))
+
+  def norms(self):
+    """ Per unit length normalization of the term frequency.
+    """
+    if self._norms is None:
+      average = self._total_length / float(len(self._lengths) or 1)
+      self._norms = array('d', [K1 * (1 - B + B * n / (average or 1))
+                                  for n in self._lengths])
+    return self._norms
+
+  def top(self, query, k=10, first=0, last=None):
+    """ Return up to k (score, position) pairs of the units in
+        [first, last) best matching the words of query, highest score
+        first, with ties in unit order.
+    """
+    if k <= 0:
+      return []
+    last = len(self._lengths) if last == None else last
+    norms = self.norms()
+    scores = {}
+    get = scores.get
+    for word in set(tokenize(query)):
+      postings = self._postings.get(word)
+      if postings is None:
+        continue
+      positions, freqs = postings
+      idf = self.idf(word) * (K1 + 1)
+      lo = bisect_left(positions, first)
+      hi = bisect_right(positions, last - 1)
+      for i in range(lo, hi):
+        pos = positions[i]
+        tf = freqs[i]
+        scores[pos] = get(pos, 0.0) + idf * tf / (tf + norms[pos])
+    best = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+    return [(score, pos) for pos, score in best]
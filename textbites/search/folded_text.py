@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Case folded copy of a resource's lines in a single buffer, so that case
+insensitive searches for plain text are answered with str.find instead of
+an IGNORECASE regex.
+
+Only patterns which are case insensitive and otherwise ASCII literal text,
+like "(?i)the lord" or "(?i)Mr\\.", are searched here. The text is folded
+with patterns.fold, which also maps the few other characters IGNORECASE
+matches with ASCII letters, such as İ, ı and ſ, so the hits are the same
+as the regex gives. Non-ASCII literals are left to the regex, since
+IGNORECASE matches some of them with characters lowercasing differently.
+It costs roughly the size of the text again, see nbytes().
+"""
+import re
+from bisect import bisect_right
+
+from .patterns import compile_pattern, fold
+from .text_buffer import TextBuffer
+
+
+# literal text, allowing escaped punctuation, after an optional (?i)
+LITERAL_QUERY_RE = re.compile(r"^(?:\(\?i\))?((?:[^\\.^$*+?{}\[\]|()\n]|\\[^\w\n])+)\Z")
+ESCAPE_RE = re.compile(r"\\(.)")
+
+
+class FoldedText(TextBuffer):
+  """ TextBuffer over the case folded lines.
+  """
+
+  def __init__(self, texts):
+    TextBuffer.__init__(self, [fold(text) for text in texts])
+
+  def literal(self, pattern):
+    """ Return the lowercased text a case insensitive ASCII literal
+        pattern matches, or None for other patterns.
+    """
+    pattern = compile_pattern(pattern)
+    if (not pattern.flags & re.IGNORECASE or pattern.flags & re.VERBOSE or
+        not isinstance(pattern.pattern, str)):
+      return None
+    m = LITERAL_QUERY_RE.match(pattern.pattern)
+    if not m:
+      return None
+    literal = ESCAPE_RE.sub(r"\1", m.group(1))
+    if not literal.isascii():
+      return None
+    return literal.lower()
+
+  def search(self, pattern, first=0, last=None):
+    """ Return sorted positions of lines in [first, last) matching pattern,
+        or None if it isn't a case insensitive literal.
+    """
+    needle = self.literal(pattern)
+    if needle is None or not self.exact:
+      return None
+    last = len(self.starts) if last == None else min(last, len(self.starts))
+    if first >= last:
+      return []
+    hits = []
+    starts = self.starts
+    buf = self.buffer
+    pos = starts[first]
+    endpos = self.line_end(last - 1)
+    while pos <= endpos:
+      at = buf.find(needle, pos, endpos)
+      if at < 0:
+        break
+      # the needle has no separator, so it lies within one line
+      i = bisect_right(starts, at) - 1
+      hits.append(i)
+      if i + 1 >= last:
+        break
+      pos = starts[i + 1]
+    return hits
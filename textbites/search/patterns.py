@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+Bounded LRU cache of compiled regular expressions.
+
+Searches compile their pattern once on entry and hand the compiled form
+down to each level, rather than passing the string to re.search at every
+line and relying on re's small internal cache, which thrashes under a mix
+of queries. As a module to be a singleton, like the library.
+"""
+import re
+
+from ..lru import LRUCache
+
+
+DEFAULT_SIZE = 256
+PATTERN_TYPE = type(re.compile(""))
+# characters matching ASCII letters under IGNORECASE which don't lowercase
+# to them, the Kelvin sign does
+FOLD_TABLE = {0x130: "i", 0x131: "i", 0x17f: "s"}
+
+
+class PatternCache(LRUCache):
+  """ LRU of compiled patterns keyed by pattern string and flags.
+  """
+
+  def __init__(self, maxsize=DEFAULT_SIZE):
+    LRUCache.__init__(self, maxsize)
+
+  def compile(self, pattern, flags=0):
+    """ Return the compiled form of pattern, which may already be compiled.
+    """
+    if isinstance(pattern, PATTERN_TYPE):
+      if not flags or pattern.flags & flags == flags:
+        return pattern
+      pattern, flags = pattern.pattern, pattern.flags | flags
+    key = (type(pattern), pattern, flags)
+    regex = self.get(key)
+    if regex is None:
+      regex = re.compile(pattern, flags)
+      self.put(key, regex)
+    return regex
+
+
+cache = PatternCache()
+
+def compile_pattern(pattern, flags=0):
+  """ Compile through the shared cache.
+  """
+  return cache.compile(pattern, flags)
+
+def stats():
+  """ Counters of the shared cache.
+  """
+  return cache.stats()
+
+def fold(text):
+  """ Case fold text for comparing with ASCII text as IGNORECASE does: an
+      ASCII string matches text case insensitively exactly when its fold
+      is in the fold of text. Non-ASCII queries have no such guarantee.
+  """
+  return text.translate(FOLD_TABLE).lower()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+"""
+Positional inverted index from words to the lines and word positions they
+appear at, answering a small query language with posting list operations
+instead of regexes.
+
+Queries are made of case insensitive words and "quoted phrases",
+combined with (highest binding first):
+
+  a NEAR/k b    a and b within k words of each other, on the same line,
+                where a and b are words, phrases, NEARs or their ORs
+  NOT a         lines without a
+  a AND b       both, also written as just a b
+  a OR b        either
+
+and parentheses. e.g. faith AND works NOT law, "love one another",
+(hope OR faith) NEAR/3 love. Words are matched whole, ignoring case and
+punctuation, so "mr bennet" matches "Mr. Bennet".
+"""
+import re
+from array import array
+from bisect import bisect_left
+
+from .patterns import fold
+from .word_index import WORD_RE
+
+
+TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+NEAR_RE = re.compile(r"^NEAR/(\d+)$")
+OPERATORS = ("AND", "OR", "NOT")
+
+
+class QuerySyntaxError(Exception):
+  """ Query can't be parsed.
+  """
+  def __init__(self, val=""):
+    self.val = val
+  def __str__(self):
+    return repr(self.val)
+
+
+class PositionalIndex(object):
+  """ Maps each case folded word to the sorted line numbers it appears on,
+      and its word positions within each of those lines. Lines must be
+      added in increasing line number order.
+  """
+
+  @staticmethod
+  def from_lines(lines):
+    """ Build from objects having line_num and text().
+    """
+    index = PositionalIndex()
+    for line in lines:
+      index.add(line.line_num, line.text())
+    return index
+
+  def __init__(self):
+    # word -> (line numbers, offset of each line's positions, positions)
+    self._postings = {}
+    self._line_nums = array('I')
+
+  def add(self, line_num, text):
+    self._line_nums.append(line_num)
+    positions = {}
+    for pos, word in enumerate(WORD_RE.findall(fold(text))):
+      positions.setdefault(word, []).append(pos)
+    for word, word_positions in positions.items():
+      postings = self._postings.get(word)
+      if postings is None:
+        postings = self._postings[word] = (array('I'), array('I'), array('I'))
+      postings[0].append(line_num)
+      postings[1].append(len(postings[2]))
+      postings[2].extend(word_positions)
+
+  def __len__(self):
+    """ Number of distinct words.
+    """
+    return len(self._postings)
+
+  def nbytes(self):
+    """ Approximate memory held, in bytes.
+    """
+    return sum(sum(a.itemsize * len(a) for a in postings)
+                 for postings in self._postings.values())
+
+  def lines(self, word):
+    """ Sorted line numbers containing word.
+    """
+    postings = self._postings.get(word)
+    return postings[0] if postings else array('I')
+
+  def positions(self, word, line_num):
+    """ Word positions of word within the line.
+    """
+    line_nums, offsets, positions = self._postings[word]
+    i = bisect_left(line_nums, line_num)
+    end = offsets[i + 1] if i + 1 < len(offsets) else len(positions)
+    return positions[offsets[i]:end]
+
+  def query(self, query, start=None, end=None):
+    """ Return sorted line numbers within [start, end] matching query.
+    """
+    line_nums = self._lines(parse(query))
+    if start != None or end != None:
+      line_nums = [n for n in line_nums if (start == None or n >= start) and
+                                           (end == None or n <= end)]
+    return sorted(line_nums)
+
+  def _lines(self, node):
+    """ Set of line numbers matching the parsed query.
+    """
+    kind = node[0]
+    if kind == "word":
+      return set(self.lines(node[1]))
+    if kind == "and":
+      if node[2][0] == "not":
+        return self._lines(node[1]) - self._lines(node[2][1])
+      return self._lines(node[1]) & self._lines(node[2])
+    if kind == "or":
+      return self._lines(node[1]) | self._lines(node[2])
+    if kind == "not":
+      return set(self._line_nums) - self._lines(node[1])
+    return set(self._spans(node))
+
+  def _candidates(self, node):
+    """ Set of lines containing all of the words of a positional node.
+    """
+    if node[0] == "word":
+      return set(self.lines(node[1]))
+    if node[0] == "phrase":
+      lines = set(self.lines(node[1][0]))
+      for word in node[1][1:]:
+        lines.intersection_update(self.lines(word))
+      return lines
+    if node[0] == "near":
+      return self._candidates(node[2]) & self._candidates(node[3])
+    if node[0] == "or":
+      return self._candidates(node[1]) | self._candidates(node[2])
+    raise QuerySyntaxError("NEAR needs words, phrases or their OR")
+
+  def _spans(self, node, candidates=None):
+    """ Dict of line number to the (first, last) word positions matching
+        a word, phrase, NEAR or OR node, within candidates.
+    """
+    lines = self._candidates(node)
+    if candidates is not None:
+      lines &= candidates
+    spans = {}
+    if node[0] == "word":
+      for line_num in lines:
+        spans[line_num] = [(p, p) for p in self.positions(node[1], line_num)]
+    elif node[0] == "phrase":
+      words = node[1]
+      for line_num in lines:
+        starts = self.positions(words[0], line_num)
+        for i, word in enumerate(words[1:], 1):
+          following = set(self.positions(word, line_num))
+          starts = [s for s in starts if s + i in following]
+        if starts:
+          spans[line_num] = [(s, s + len(words) - 1) for s in starts]
+    elif node[0] == "or":
+      spans = self._spans(node[1], lines)
+      for line_num, matched in self._spans(node[2], lines).items():
+        spans[line_num] = spans.get(line_num, []) + matched
+    else:
+      distance = node[1]
+      left = self._spans(node[2], lines)
+      right = self._spans(node[3], lines)
+      for line_num in set(left) & set(right):
+        matched = [(min(a[0], b[0]), max(a[1], b[1]))
+                     for a in left[line_num] for b in right[line_num]
+                     if b[0] - a[1] <= distance and a[0] - b[1] <= distance]
+        if matched:
+          spans[line_num] = matched
+    return spans
+
+
+def parse(query):
+  """ Return the query parsed into nested tuples of ("word", word),
+      ("phrase", [words]), ("near", k, a, b), ("and", a, b), ("or", a, b)
+      and ("not", a).
+  """
+  tokens = []
+  pos = 0
+  query = query.strip()
+  while pos < len(query):
+    m = TOKEN_RE.match(query, pos)
+    if not m:
+      raise QuerySyntaxError("Unbalanced quote: " + query)
+    tokens.append(m.group(0).strip())
+    pos = m.end()
+  parser = _Parser(tokens)
+  node = parser.or_expr()
+  if parser.peek() != None:
+    raise QuerySyntaxError("Unexpected %s in %s" % (parser.peek(), query))
+  return node
+
+
+class _Parser(object):
+  """ Recursive descent over the query tokens.
+  """
+
+  def __init__(self, tokens):
+    self.tokens = tokens
+    self.pos = 0
+
+  def peek(self):
+    return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+  def next(self):
+    token = self.peek()
+    self.pos += 1
+    return token
+
+  def or_expr(self):
+    node = self.and_expr()
+    while self.peek() == "OR":
+      self.next()
+      node = ("or", node, self.and_expr())
+    return node
+
+  def and_expr(self):
+    node = self.not_expr()
+    while self.peek() not in (None, "OR", ")"):
+      if self.peek() == "AND":
+        self.next()
+      node = ("and", node, self.not_expr())
+    return node
+
+  def not_expr(self):
+    if self.peek() == "NOT":
+      self.next()
+      return ("not", self.not_expr())
+    return self.near_expr()
+
+  def near_expr(self):
+    node = self.atom()
+    while self.peek() != None and NEAR_RE.match(self.peek()):
+      distance = int(NEAR_RE.match(self.next()).group(1))
+      node = ("near", distance, node, self.atom())
+    return node
+
+  def atom(self):
+    token = self.next()
+    if token == "(":
+      node = self.or_expr()
+      if self.next() != ")":
+        raise QuerySyntaxError("Missing )")
+      return node
+    if token == None or token == ")" or token in OPERATORS or NEAR_RE.match(token):
+      raise QuerySyntaxError("Expected a word or phrase, not %s" % token)
+    words = WORD_RE.findall(fold(token.strip('"')))
+    if not words:
+      raise QuerySyntaxError("No words in %s" % token)
+    if len(words) == 1:
+      return ("word", words[0])
+    return ("phrase", words)
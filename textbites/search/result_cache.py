@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+"""
+Bounded LRU cache of search results for a resource, so repeated searches
+of the same scope don't rescan it. Results are stored as arrays of global
+line numbers rather than references, keeping entries compact.
+"""
+from array import array
+
+from ..lru import LRUCache
+
+
+DEFAULT_SIZE = 128
+
+
+class ResultCache(LRUCache):
+  """ LRU of line number arrays keyed by (start, end, compiled pattern).
+  """
+
+  def __init__(self, maxsize=DEFAULT_SIZE):
+    LRUCache.__init__(self, maxsize)
+
+  def key(self, span, pattern):
+    return (span.start, span.end, pattern)
+
+  def put(self, key, line_nums):
+    LRUCache.put(self, key, array('I', line_nums))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Lines of a resource concatenated into a single newline separated buffer,
+along with the sorted offsets at which each line starts.
+
+A search runs the regex over the buffer, starting each scan where the
+previous hit's line ends, and maps match offsets back to line positions by
+bisecting the offsets. The per-line Python overhead of calling re.search
+for every line is replaced by one C-level scan per hit.
+
+Patterns are compiled with MULTILINE so that ^ and $ match at line
+boundaries as they would against a single line. A match which strays
+across a line boundary is re-checked against just that line, so results
+are the same as searching line by line for patterns which don't look
+beyond a line. Patterns using \\A, \\Z, lookahead or lookbehind aren't
+supported, since a lookahead at the end of a line would see the separator,
+and those are searched line by line.
+"""
+import re
+import sys
+from array import array
+from bisect import bisect_right
+
+from .patterns import compile_pattern
+
+
+SEPARATOR = '\n'
+# constructs whose meaning changes when lines share a buffer
+UNSUPPORTED_RE = re.compile(r"\\[AZ]|\(\?<?[=!]")
+
+
+class TextBuffer(object):
+  """ Single buffer over a list of line strings.
+  """
+
+  def __init__(self, texts):
+    self.buffer = SEPARATOR.join(texts)
+    self.starts = array('L')
+    offset = 0
+    for text in texts:
+      self.starts.append(offset)
+      offset += len(text) + len(SEPARATOR)
+    # lines containing the separator would be split by ^ and $
+    self.exact = self.buffer.count(SEPARATOR) == max(len(texts) - 1, 0)
+
+  def __len__(self):
+    """ Number of lines.
+    """
+    return len(self.starts)
+
+  def nbytes(self):
+    """ Approximate memory held, in bytes.
+    """
+    return (sys.getsizeof(self.buffer) +
+            self.starts.itemsize * len(self.starts))
+
+  def line_end(self, pos):
+    """ Offset just past the text of line at position pos.
+    """
+    if pos + 1 < len(self.starts):
+      return self.starts[pos + 1] - len(SEPARATOR)
+    return len(self.buffer)
+
+  def text(self, pos):
+    """ Text of line at position pos.
+    """
+    return self.buffer[self.starts[pos]:self.line_end(pos)]
+
+  def compile(self, pattern):
+    """ Return the buffer form of pattern, or None if unsupported.
+    """
+    source = pattern if isinstance(pattern, str) else pattern.pattern
+    if not self.exact or not isinstance(source, str) or UNSUPPORTED_RE.search(source):
+      return None
+    return compile_pattern(pattern, re.MULTILINE)
+
+  def search(self, pattern, first=0, last=None):
+    """ Return sorted positions of lines in [first, last) matching pattern,
+        or None if the pattern can't be searched in the buffer.
+    """
+    regex = self.compile(pattern)
+    if regex is None:
+      return None
+    last = len(self.starts) if last == None else min(last, len(self.starts))
+    if first >= last:
+      return []
+    hits = []
+    starts = self.starts
+    buf = self.buffer
+    pos = starts[first]
+    endpos = self.line_end(last - 1)
+    while pos <= endpos:
+      m = regex.search(buf, pos, endpos)
+      if not m:
+        break
+      i = bisect_right(starts, m.start()) - 1
+      end = self.line_end(i)
+      # a match leaving its line is confirmed against the line alone
+      if m.end() <= end or regex.search(buf, starts[i], end):
+        hits.append(i)
+      if i + 1 >= last:
+        break
+      pos = starts[i + 1]
+    return hits
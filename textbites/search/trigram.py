@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""
+Trigram index from every three character substring of the lowercased text
+to the positions of the lines containing it, used to narrow a regex search
+to candidate lines as code search engines do.
+
+A regex is parsed and the literal text it must match, such as "the Lord"
+in "the Lord (God|Jesus)", is turned into trigrams which every matching
+line must contain: ANDed along a sequence, ORed across alternatives. Only
+the lines having those trigrams are run through the real regex, so the
+hits are the same as scanning every line. Patterns with no literal run of
+three characters, like "\\d+" or "^Mr\\b", can't be narrowed and are left
+to a scan.
+
+Text and literals are lowercased so one index serves case sensitive and
+insensitive patterns. Only ASCII literals are used, and the few other
+characters IGNORECASE matches them with are folded to ASCII in the text.
+"""
+import re
+import sys
+from array import array
+
+try:
+  from re import _parser as sre_parse
+except ImportError:
+  import sre_parse
+
+from .patterns import compile_pattern, fold
+
+
+class TrigramIndex(object):
+  """ Maps each trigram of the lowercased lines to the sorted positions of
+      the lines containing it. Lines are numbered from 0 in the order they
+      are added.
+  """
+
+  @staticmethod
+  def from_texts(texts):
+    index = TrigramIndex()
+    for text in texts:
+      index.add(text)
+    return index
+
+  def __init__(self):
+    self._postings = {}
+    self._count = 0
+
+  def add(self, text):
+    """ Add the next line.
+    """
+    pos = self._count
+    self._count += 1
+    text = fold(text)
+    for trigram in set([text[i:i+3] for i in range(len(text) - 2)]):
+      postings = self._postings.get(trigram)
+      if postings is None:
+        postings = self._postings[trigram] = array('I')
+      postings.append(pos)
+
+  def __len__(self):
+    """ Number of lines.
+    """
+    return self._count
+
+  def nbytes(self):
+    """ Approximate memory held, in bytes.
+    """
+    return sys.getsizeof(self._postings) + sum(
+        sys.getsizeof(t) + sys.getsizeof(p) for t, p in self._postings.items())
+
+  def candidates(self, pattern, first=0, last=None):
+    """ Return sorted positions of lines in [first, last) which may match
+        pattern, or None if it has no trigrams to narrow the search.
+    """
+    query = trigram_query(pattern)
+    if query is None:
+      return None
+    last = self._count if last == None else min(last, self._count)
+    return sorted(p for p in self._evaluate(query) if first <= p < last)
+
+  def _evaluate(self, query):
+    """ Set of line positions satisfying the trigram query.
+    """
+    kind, args = query
+    if kind == "trigram":
+      return set(self._postings.get(args, ()))
+    sets = [self._evaluate(q) for q in args]
+    if kind == "and":
+      sets.sort(key=len)
+      return sets[0].intersection(*sets[1:])
+    return set().union(*sets)
+
+
+def trigram_query(pattern):
+  """ Return the trigrams any text matching pattern must contain, as
+      nested ("and", [queries]), ("or", [queries]) and ("trigram", text),
+      or None if there are none.
+  """
+  pattern = compile_pattern(pattern)
+  if not isinstance(pattern.pattern, str):
+    return None
+  try:
+    parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+  except re.error:
+    return None
+  return _sequence(parsed)
+
+
+def _literal_run(chars):
+  """ The trigrams of a run of literal characters, ANDed.
+  """
+  text = "".join(chars)
+  trigrams = sorted(set(text[i:i+3] for i in range(len(text) - 2)))
+  return _and([("trigram", t) for t in trigrams])
+
+
+def _and(queries):
+  queries = [q for q in queries if q is not None]
+  if not queries:
+    return None
+  return queries[0] if len(queries) == 1 else ("and", queries)
+
+
+def _or(queries):
+  if not queries or None in queries:
+    return None
+  return queries[0] if len(queries) == 1 else ("or", queries)
+
+
+def _sequence(items):
+  """ Query for a parsed sequence of regex items, all of which must match.
+      Literals are lowercased whatever the case flags, as the text is.
+  """
+  required = []
+  run = []
+  for op, av in items:
+    if op is sre_parse.LITERAL:
+      char = chr(av)
+      if char.isascii():
+        run.append(char.lower())
+        continue
+    required.append(_literal_run(run))
+    run = []
+    if op is sre_parse.SUBPATTERN:
+      required.append(_sequence(av[-1]))
+    elif op is sre_parse.BRANCH:
+      required.append(_or([_sequence(branch) for branch in av[1]]))
+    elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+                getattr(sre_parse, "POSSESSIVE_REPEAT", None)):
+      low, high, sub = av
+      if low >= 1:
+        required.append(_sequence(sub))
+    elif op is getattr(sre_parse, "ATOMIC_GROUP", None):
+      required.append(_sequence(av))
+  required.append(_literal_run(run))
+  return _and(required)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Inverted index from words to the global line numbers containing them.
+
+A query made only of word characters can only ever match inside a single
+word of a line, so the lines matching it are exactly the union of the
+postings of every indexed word containing the query. That lets a plain
+word (or an alternation of words like "faith|hope") be answered from the
+postings without running a regex over every line, giving the same hits as
+the regex scan.
+
+Finding the words containing a query checks every distinct word, so a
+query costs a pass over the vocabulary, far smaller than the text, plus
+the postings of the words found. Case insensitive queries compare folded
+words, see patterns.fold, and are left to the scan unless ASCII.
+"""
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .patterns import fold
+
+
+WORD_RE = re.compile(r"\w+")
+# plain word queries, optionally case-insensitive and/or alternated
+PLAIN_QUERY_RE = re.compile(r"^(\(\?i\))?(\w+(?:\|\w+)*)\Z")
+# compiled pattern flags which don't change what a plain word matches
+IGNORED_FLAGS = (re.IGNORECASE | re.UNICODE | re.MULTILINE | re.DOTALL |
+                 re.VERBOSE)
+
+
+class WordIndex(object):
+  """ Maps each word to the sorted line numbers it appears on.
+      Lines must be added in increasing line number order.
+  """
+
+  @staticmethod
+  def from_lines(lines):
+    """ Build from objects having line_num and text().
+    """
+    index = WordIndex()
+    for line in lines:
+      index.add(line.line_num, line.text())
+    return index
+
+  def __init__(self):
+    self._postings = {}
+    # lazily built, maps folded word to the words folding to it
+    self._folded = None
+
+  def add(self, line_num, text):
+    for word in set(WORD_RE.findall(text)):
+      postings = self._postings.get(word)
+      if postings is None:
+        postings = self._postings[word] = array('I')
+      postings.append(line_num)
+    self._folded = None
+
+  def __len__(self):
+    """ Number of distinct words.
+    """
+    return len(self._postings)
+
+  def nbytes(self):
+    """ Approximate memory held, in bytes, not counting the folded words.
+    """
+    return sys.getsizeof(self._postings) + sum(
+        sys.getsizeof(w) + sys.getsizeof(p) for w, p in self._postings.items())
+
+  def postings(self, word):
+    """ Sorted line numbers containing exactly this word.
+    """
+    return self._postings.get(word, array('I'))
+
+  def search(self, pattern, start=None, end=None):
+    """ Return sorted line numbers within [start, end] which pattern
+        matches, or None if pattern isn't a plain word query and must be
+        answered by scanning.
+    """
+    if isinstance(pattern, str):
+      source, flags = pattern, 0
+    else:
+      source, flags = pattern.pattern, pattern.flags
+    if not isinstance(source, str) or flags & ~IGNORED_FLAGS:
+      return None
+    m = PLAIN_QUERY_RE.match(source)
+    if not m:
+      return None
+    ignore_case = m.group(1) != None or bool(flags & re.IGNORECASE)
+    if ignore_case and not m.group(2).isascii():
+      return None
+    words = set()
+    for query in m.group(2).split('|'):
+      words.update(self._expand(query, ignore_case))
+    spans = [self._span(self._postings[w], start, end) for w in words]
+    if len(spans) == 1:
+      return list(spans[0])
+    return sorted(set().union(*spans))
+
+  def _expand(self, query, ignore_case):
+    """ Indexed words which contain query.
+    """
+    if not ignore_case:
+      return [w for w in self._postings if query in w]
+    if self._folded is None:
+      self._folded = {}
+      for w in self._postings:
+        self._folded.setdefault(fold(w), []).append(w)
+    query = query.lower()
+    return [w for folded, ws in self._folded.items() if query in folded
+              for w in ws]
+
+  @staticmethod
+  def _span(postings, start, end):
+    lo = 0 if start == None else bisect_left(postings, start)
+    hi = len(postings) if end == None else bisect_right(postings, end)
+    return postings[lo:hi]
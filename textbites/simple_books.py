@@ -5,41 +5,321 @@ user.
 """
 import re
 import logging
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
 
 from .api import Reference, Resource, UnparsableReferenceError, InvalidReferenceError, Index
 from .utils import *
+from .search.word_index import WordIndex
+from .search.text_buffer import TextBuffer
+from .search.folded_text import FoldedText
+from .search.positional import PositionalIndex
+from .search.bm25 import BM25Index
+from .search.trigram import TrigramIndex
+from .search.patterns import compile_pattern
+from .search.result_cache import ResultCache
+from . import json_stream
 import json
 
 log = logging.getLogger(__name__)
 
 
-class SimpleBookResource(Resource):
+class LineResource(Resource):
+  """ A resource whose text is a contiguous run of numbered Lines, which
+      allows searching a span of line numbers using resource-wide
+      structures instead of visiting each Line.
+  """
+
+  # size of the search result cache, 0 to disable
+  RESULT_CACHE_SIZE = 128
+
+  def __init__(self, lines, word_index=False, text_buffer=False,
+               folded_text=False, positional_index=False,
+               trigram_index=False):
+    """ lines must be ordered by line_num, which must be consecutive.
+        word_index enables the inverted index for plain word queries.
+        text_buffer enables searching other patterns over a single
+        buffer of all the text instead of line by line.
+        folded_text keeps a case folded copy of the text for case
+        insensitive plain text queries.
+        positional_index builds the index for phrase and boolean queries
+        now, rather than on the first query.
+        trigram_index narrows other patterns to the lines having the
+        trigrams of their literal text before running the regex.
+    """
+    self.result_cache = ResultCache(self.RESULT_CACHE_SIZE)
+    self.lines = lines
+    self._first_line_num = lines[0].line_num if lines else 1
+    self.word_index = WordIndex.from_lines(lines) if word_index else None
+    self.text_buffer = None
+    if text_buffer:
+      self.text_buffer = TextBuffer([l.text() for l in lines])
+    self.folded_text = None
+    if folded_text:
+      self.folded_text = FoldedText([l.text() for l in lines])
+    self.positional_index = None
+    if positional_index:
+      self.positional_index = PositionalIndex.from_lines(lines)
+    # built on the first ranked search
+    self.bm25_index = None
+    self.trigram_index = None
+    if trigram_index:
+      self.trigram_index = TrigramIndex.from_texts(l.text() for l in lines)
+
+  def index_sizes(self):
+    """ Return dict of the approximate bytes held by each enabled search
+        structure.
+    """
+    sizes = {}
+    for name in ["word_index", "text_buffer", "folded_text",
+                 "positional_index", "bm25_index", "trigram_index"]:
+      structure = getattr(self, name)
+      if structure is not None:
+        sizes[name] = structure.nbytes()
+    return sizes
+
+  def line(self, line_num):
+    """ Line having this global line number.
+    """
+    self._check_span(Index(line_num, line_num))
+    return self._line(line_num)
+
+  def _line(self, line_num):
+    """ Line having this global line number, known to be in range.
+    """
+    return self.lines[line_num - self._first_line_num]
+
+  def lines_in(self, span):
+    """ Lines within the Index span, inclusive.
+    """
+    self._check_span(span)
+    return self._lines_in(span)
+
+  def _lines_in(self, span):
+    return self.lines[span.start - self._first_line_num:
+                      span.end - self._first_line_num + 1]
+
+  def text_in(self, span):
+    """ Text of the lines within the Index span, joined by lines.
+    """
+    return '\n'.join([l.text() for l in self.lines_in(span)])
+
+  def resolve(self, index):
+    """ Return the smallest Line, LineRange, Chapter, ChapterRange or Book
+        covering the Index, or the top reference if it spans books.
+    """
+    self._check_span(index)
+    first = self._line(index.start)
+    last = self._line(index.end)
+    if index.start == index.end:
+      return first
+    chapter = first.parent()
+    last_chapter = last.parent()
+    if chapter is last_chapter:
+      if first.position() == 0 and last.position() == len(chapter) - 1:
+        return chapter
+      return LineRange(chapter.book, chapter, first.lnum, last.lnum)
+    book = chapter.parent()
+    if book is last_chapter.parent():
+      if chapter.position() == 0 and last_chapter.position() == len(book) - 1:
+        return book
+      return ChapterRange(book.title,
+          book.children()[chapter.position():last_chapter.position() + 1])
+    return self.top_reference()
+
+  def _check_span(self, span):
+    if not (self._first_line_num <= span.start <= span.end <
+            self._first_line_num + len(self.lines)):
+      raise InvalidReferenceError("%s is outside of %s" % (str(span),
+                                                           self.name()))
+
+  def search_span(self, pattern, span):
+    """ Return Lines within the Index span which match pattern. Results
+        are cached by span and pattern.
+    """
+    pattern = compile_pattern(pattern)
+    key = self.result_cache.key(span, pattern)
+    line_nums = self.result_cache.get(key)
+    if line_nums is None:
+      line_nums = self._search_line_nums(pattern, span)
+      self.result_cache.put(key, line_nums)
+    return [self._line(n) for n in line_nums]
+
+  def query_span(self, query, span):
+    """ Return Lines within the Index span matching a phrase and boolean
+        query, see textbites.search.positional.
+    """
+    if self.positional_index is None:
+      self.positional_index = PositionalIndex.from_lines(self.lines)
+    return [self._line(n) for n in
+              self.positional_index.query(query, span.start, span.end)]
+
+  def rank_span(self, query, span, k=10):
+    """ Return up to k (score, Line) pairs within the Index span, most
+        relevant to the words of query by BM25 first.
+    """
+    if self.bm25_index is None:
+      self.bm25_index = BM25Index.from_texts(l.text() for l in self.lines)
+    first = self._first_line_num
+    return [(score, self._line(pos + first)) for score, pos in
+              self.bm25_index.top(query, k, span.start - first,
+                                  span.end - first + 1)]
+
+  def iter_span(self, pattern, span):
+    """ Return an iterator of the Lines within the Index span which match
+        pattern. Unless cached or found with an index, lines are only
+        scanned as far as the iterator is consumed.
+    """
+    pattern = compile_pattern(pattern)
+    key = self.result_cache.key(span, pattern)
+    line_nums = self.result_cache.get(key)
+    if line_nums is None:
+      line_nums = self._indexed_line_nums(pattern, span)
+      if line_nums is None:
+        return self._iter_scan(pattern, span, key)
+      self.result_cache.put(key, line_nums)
+    return (self._line(n) for n in line_nums)
+
+  def _iter_scan(self, pattern, span, key):
+    """ Generate matching Lines, caching their numbers once the whole
+        span has been scanned.
+    """
+    line_nums = []
+    for line_num in range(span.start, span.end + 1):
+      line = self._line(line_num)
+      if pattern.search(line.text()):
+        line_nums.append(line_num)
+        yield line
+    self.result_cache.put(key, line_nums)
+
+  def _search_line_nums(self, pattern, span):
+    """ Line numbers within span matching the compiled pattern, found
+        with an index, otherwise by scanning each line.
+    """
+    line_nums = self._indexed_line_nums(pattern, span)
+    if line_nums is None:
+      line_nums = [l.line_num for l in self._lines_in(span)
+                     if l.search(pattern)]
+    return line_nums
+
+  def _indexed_line_nums(self, pattern, span):
+    """ Line numbers within span matching the compiled pattern. Plain
+        word queries use the word index, case insensitive text the folded
+        text, patterns with literal text the trigram index, then the text
+        buffer is tried. Returns None if none apply.
+    """
+    if self.word_index is not None:
+      line_nums = self.word_index.search(pattern, span.start, span.end)
+      if line_nums is not None:
+        return line_nums
+    first = span.start - self._first_line_num
+    last = span.end - self._first_line_num + 1
+    if self.folded_text is not None:
+      positions = self.folded_text.search(pattern, first, last)
+      if positions is not None:
+        return [p + self._first_line_num for p in positions]
+    if self.trigram_index is not None:
+      positions = self.trigram_index.candidates(pattern, first, last)
+      if positions is not None:
+        return [self.lines[p].line_num for p in positions
+                  if pattern.search(self.lines[p].text())]
+    if self.text_buffer is not None:
+      positions = self.text_buffer.search(pattern, first, last)
+      if positions is not None:
+        return [p + self._first_line_num for p in positions]
+    return None
+
+
+def search_refs(ref, pattern, refs):
+  """ Search refs, a contiguous run of references under ref, through the
+      resource if ref belongs to one, else by searching each in turn.
+  """
+  resource = getattr(ref.root(), '_resource', None)
+  if not isinstance(resource, LineResource) or not refs:
+    return [hit for r in refs for hit in r.search(pattern)]
+  return resource.search_span(pattern,
+      Index(refs[0].indices().start, refs[-1].indices().end))
+
+
+def iter_refs(ref, pattern, refs):
+  """ Lazy version of search_refs, returning an iterator of the hits.
+  """
+  resource = getattr(ref.root(), '_resource', None)
+  if not isinstance(resource, LineResource) or not refs:
+    return (hit for r in refs for hit in r.iter_search(pattern))
+  return resource.iter_span(pattern,
+      Index(refs[0].indices().start, refs[-1].indices().end))
+
+
+def line_resource(ref):
+  """ The LineResource holding the lines under ref.
+  """
+  resource = getattr(next(ref.walk()).root(), '_resource', None)
+  if not isinstance(resource, LineResource):
+    raise NotImplementedError()
+  return resource
+
+
+def query_refs(ref, query):
+  """ Lines under ref matching a phrase and boolean query, found with
+      the positional index of its resource.
+  """
+  return line_resource(ref).query_span(query, ref.indices())
+
+
+def rank_refs(ref, query, k):
+  """ Up to k (score, Line) pairs of the lines under ref most relevant
+      to query.
+  """
+  return line_resource(ref).rank_span(query, ref.indices(), k)
+
+
+class SimpleBookResource(LineResource):
 
   @staticmethod
-  def from_json(json_filename):
+  def from_json(json_filename, word_index=False, text_buffer=False,
+                compact=False, stream=False, folded_text=False,
+                positional_index=False, trigram_index=False):
     """ Create a XXX book & resource from json data.
         Assumes title, author, chapters/text
+        compact stores lines in a LineTable rather than as Line objects.
+        stream reads the file incrementally, a chapter at a time, rather
+        than decoding it all first, so memory stays close to the result.
     """
-    data = json.load(open(json_filename, 'r'))
-    chapters = []
-    title = data.get("title")
-    author = data.get("author")
-    line_num = 0
-    for cnum, chapter in enumerate(data.get("chapters"), 1):
-      lines = []
-      for lnum, line in enumerate(chapter.get("text").split('\n'), 1):
-        line_num += 1
-        lines.append(Line(title, cnum, lnum, line.strip(), line_num))
-      chapters.append(Chapter(title, cnum, lines))
+    with open(json_filename, 'r') as f:
+      events = _stream_events(f) if stream else _decoded_events(json.load(f))
+      chapters = []
+      title = None
+      author = None
+      table = LineTable() if compact else None
+      line_num = 0
+      for kind, value in events:
+        if kind == "title":
+          title = value
+        elif kind == "author":
+          author = value
+        elif kind == "chapter":
+          cnum = len(chapters) + 1
+          numbered = [(lnum, line.strip()) for lnum, line in
+                        enumerate(value.get("text").split('\n'), 1)]
+          lines = build_lines(title, cnum, numbered, line_num, table)
+          line_num += len(lines)
+          chapters.append(Chapter(title, cnum, lines))
     book = Book(chapters, title, author)
-    book._resource = SimpleBookResource(book)
+    book._resource = SimpleBookResource(book, word_index, text_buffer,
+        folded_text, positional_index, trigram_index)
     #return book
     return book.resource()
 
-  def __init__(self, book):
-    """ Stores only the top reference.
+  def __init__(self, book, word_index=False, text_buffer=False,
+               folded_text=False, positional_index=False,
+               trigram_index=False):
+    """ Stores the top reference and its lines.
     """
     self.book = book
+    LineResource.__init__(self, all_lines(book.chapters), word_index,
+        text_buffer, folded_text, positional_index, trigram_index)
 
   def reference(self, str_ref):
     """ Parse this string reference and return an object. 
@@ -74,12 +354,59 @@ class SimpleBookResource(Resource):
     return self.book
 
 
+def _decoded_events(data):
+  """ Yield the ("title", title), ("author", author) and ("chapter",
+      chapter) events from which a book is built, chapters coming last.
+  """
+  yield "title", data.get("title")
+  yield "author", data.get("author")
+  for chapter in data.get("chapters"):
+    yield "chapter", chapter
+
+
+def _stream_events(f):
+  """ Yield the same events as _decoded_events while reading file f, so
+      only one chapter is decoded at a time. Chapters are held back until
+      the title has been read.
+  """
+  title_read = False
+  pending = []
+  events = json_stream.parse(f)
+  for prefix, event, value in events:
+    if prefix in ("title", "author") and event in json_stream.SCALARS:
+      yield prefix, value
+      if prefix == "title":
+        title_read = True
+        for chapter in pending:
+          yield "chapter", chapter
+        pending = []
+    elif prefix == "chapters.item" and event == "start_map":
+      chapter = json_stream.build(events, event, value)
+      if title_read:
+        yield "chapter", chapter
+      else:
+        pending.append(chapter)
+  for chapter in pending:
+    yield "chapter", chapter
+
+
 class ReferenceImpl(Reference):
   """ Represents some section of text.
   """
+  __slots__ = ()
+
   def __init__(self):
     Reference.__init__(self)
 
+  def query(self, query):
+    """ Return Lines matching a query of words and "phrases" combined
+        with AND, OR, NOT and NEAR/k, see textbites.search.positional.
+    """
+    return query_refs(self, query)
+
+  def ranked_search(self, query, k=10):
+    return rank_refs(self, query, k)
+
 
 class Book(ReferenceImpl):
   """ A single book.
@@ -104,13 +431,33 @@ class Book(ReferenceImpl):
     raise NotImplementedError()
 
   def search(self, pattern, first_chapter=None, last_chapter=None, 
-                            first_line=None, last_line=None):
-    hits = []
+                            first_line=None, last_line=None,
+                            limit=None, offset=0):
+    """ limit and offset select a page of the hits, and searching stops
+        once it is found.
+    """
+    if limit != None or offset:
+      return paginate(self.iter_search(pattern, first_chapter, last_chapter,
+                                       first_line, last_line), limit, offset)
+    pattern = compile_pattern(pattern)
     fc = zero_indexed(first_chapter)
-    for chap in self.chapters[fc:last_chapter]:
+    chapters = self.chapters[fc:last_chapter]
+    if first_line == None and last_line == None:
+      return search_refs(self, pattern, chapters)
+    hits = []
+    for chap in chapters:
       hits.extend(chap.search(pattern, first_line, last_line))
     return hits
 
+  def iter_search(self, pattern, first_chapter=None, last_chapter=None,
+                                 first_line=None, last_line=None):
+    pattern = compile_pattern(pattern)
+    chapters = self.chapters[zero_indexed(first_chapter):last_chapter]
+    if first_line == None and last_line == None:
+      return iter_refs(self, pattern, chapters)
+    return (hit for chap in chapters
+                  for hit in chap.iter_search(pattern, first_line, last_line))
+
 
 class ChapterRange(ReferenceImpl):
   """ A range of chapters.
@@ -138,10 +485,9 @@ class ChapterRange(ReferenceImpl):
     raise NotImplementedError()
 
   def search(self, pattern, first_line=None, last_line=None):
-    hits = []
-    for chap in self.chapters:
-      hits.extend(chap.search(pattern))
-    return hits
+    # the chapters are contiguous, and are searched as one span
+    return search_refs(self.chapters[0], compile_pattern(pattern),
+                       self.chapters)
 
   def parent(self):
     return self.book
@@ -151,10 +497,16 @@ class Chapter(ReferenceImpl):
   """ A single chapter.
   """
   def __init__(self, book, num, lines):
+    """ lines is a list of Line, or LineViews which create them on demand.
+    """
     self.book = book
     self.num = num
     self.lines = lines 
-    ReferenceImpl.__init__(self)
+    if isinstance(lines, LineViews):
+      # views are created already knowing their parent
+      lines.bind(self)
+    else:
+      ReferenceImpl.__init__(self)
 
   def children(self):
     return self.lines
@@ -169,8 +521,14 @@ class Chapter(ReferenceImpl):
     return '\n'.join([l.text() for l in self.lines]).strip()
 
   def search(self, pattern, first_line=None, last_line=None):
+    pattern = compile_pattern(pattern)
     fl = zero_indexed(first_line)
-    return [l for l in self.lines[fl:last_line] if l.search(pattern)]
+    return search_refs(self, pattern, self.lines[fl:last_line])
+
+  def iter_search(self, pattern, first_line=None, last_line=None):
+    pattern = compile_pattern(pattern)
+    fl = zero_indexed(first_line)
+    return iter_refs(self, pattern, self.lines[fl:last_line])
     # unfold list
     #return [inner for outer in lists for inner in outer]
 
@@ -221,8 +579,13 @@ class LineRange(ReferenceImpl):
 
 
 class Line(ReferenceImpl):
-  """ A single line.
+  """ A single line. Either stored in its Chapter, or a view of a
+      LineTable row created on demand, so it is slotted to stay small
+      and compares equal to other views of the same line.
   """
+  __slots__ = ('book', 'line', 'cnum', 'lnum', 'line_num', '_parent',
+               '_position')
+
   def __init__(self, book, cnum, lnum, line, line_num):
     self.book = book
     self.line = line
@@ -246,7 +609,7 @@ class Line(ReferenceImpl):
   def search(self, pattern):
     """ Return a list for consistency.
     """
-    if re.search(pattern, self.line):
+    if compile_pattern(pattern).search(self.line):
       return [self]
     return []
 
@@ -255,11 +618,133 @@ class Line(ReferenceImpl):
         'size' number of siblings before and after.
     """
     siblings = self.parent().children()
-    idx = siblings.index(self)
+    idx = self.position()
     # ending index beyond size is not a problem for slice
     return LineRange.from_lines(siblings[max(idx-size, 0):idx+size+1])
 
   def indices(self):
     return Index(self.line_num, self.line_num)
 
+  def __eq__(self, other):
+    return (isinstance(other, Line) and self.line_num == other.line_num
+            and self.parent() is other.parent())
+
+  def __hash__(self):
+    return hash((self.line_num, id(self.parent())))
+
+
+def build_lines(book, cnum, numbered, line_num, table=None):
+  """ Return the lines of a chapter from (lnum, text) pairs, numbered
+      globally after line_num. These are Line objects, or if a LineTable
+      is given, the pairs are stored in it and LineViews are returned.
+  """
+  if table is not None:
+    return table.add_lines(cnum, numbered)
+  return [Line(book, cnum, lnum, text, n)
+            for n, (lnum, text) in enumerate(numbered, line_num + 1)]
+
+
+def all_lines(chapters):
+  """ Sequence of all lines of these chapters in order.
+  """
+  if chapters and isinstance(chapters[0].lines, LineViews):
+    return chapters[0].lines.table.views()
+  return [l for c in chapters for l in c.lines]
+
+
+class LineTable(object):
+  """ Compact storage of a resource's lines as parallel arrays, with a
+      text list and the chapter and line numbers of each row. The global
+      line number of a row is its position plus first_line_num. Line
+      objects are only created as views when requested.
+  """
+
+  def __init__(self, first_line_num=1, texts=None, cnums=None, lnums=None,
+               chapter_starts=None):
+    """ Starts empty to be filled by add_lines, unless given existing
+        columns, such as ones mapped from a file.
+    """
+    self.first_line_num = first_line_num
+    self.texts = [] if texts is None else texts
+    self.cnums = array('I') if cnums is None else cnums
+    self.lnums = array('I') if lnums is None else lnums
+    # first row of each chapter, and the Chapter bound to it
+    self.chapter_starts = array('I') if chapter_starts is None else chapter_starts
+    self.chapters = []
+
+  def __len__(self):
+    return len(self.texts)
+
+  def add_lines(self, cnum, numbered):
+    """ Append a chapter's (lnum, text) pairs and return views of them.
+    """
+    start = len(self.texts)
+    self.chapter_starts.append(start)
+    for lnum, text in numbered:
+      self.cnums.append(cnum)
+      self.lnums.append(lnum)
+      self.texts.append(text)
+    return LineViews(self, start, len(self.texts))
+
+  def chapter_at(self, pos):
+    """ Chapter containing row pos.
+    """
+    return self.chapters[bisect_right(self.chapter_starts, pos) - 1]
+
+  def line(self, pos, chapter=None):
+    """ Create a Line view of row pos.
+    """
+    if chapter is None:
+      chapter = self.chapter_at(pos)
+    line = Line(chapter.book, self.cnums[pos], self.lnums[pos],
+                self.texts[pos], self.first_line_num + pos)
+    line._parent = chapter
+    line._position = pos - chapter.lines.start
+    return line
+
+  def views(self, start=0, stop=None):
+    """ Views of rows [start, stop), resolving each row's chapter.
+    """
+    return LineViews(self, start, len(self) if stop == None else stop)
+
+
+class LineViews(Sequence):
+  """ Sequence of Line views over rows [start, stop) of a LineTable.
+      Lines within one chapter are bound to it, others look it up.
+  """
+
+  def __init__(self, table, start, stop):
+    self.table = table
+    self.start = start
+    self.stop = stop
+    self.chapter = None
+
+  def bind(self, chapter):
+    """ Make chapter the parent of these lines.
+    """
+    self.chapter = chapter
+    self.table.chapters.append(chapter)
+
+  def __len__(self):
+    return self.stop - self.start
+
+  def __getitem__(self, key):
+    if isinstance(key, slice):
+      return [self[i] for i in range(*key.indices(len(self)))]
+    if key < 0:
+      key += len(self)
+    if not 0 <= key < len(self):
+      raise IndexError(key)
+    return self.table.line(self.start + key, self.chapter)
+
+  def index(self, line, start=0, stop=None):
+    """ Position of line, found from its line number.
+    """
+    if isinstance(line, Line):
+      pos = line.line_num - self.table.first_line_num - self.start
+      if (start <= pos < len(self) and (stop == None or pos < stop) and
+          self[pos] == line):
+        return pos
+    raise ValueError("line not in sequence")
+
 
@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+"""
+Generates synthetic data files of any size, in the formats library.load
+accepts, for scale testing. Text is made of words drawn at random from the
+Pride and Prejudice text in the data directory, so word frequencies are
+realistic. The same seed and sizes always give the same files.
+
+usage: python -m textbites.synthetic <out dir> [--seed N]
+           [--translations N] [--books N] [--chapters N] [--verses N]
+           [--lines N] [--quotes N] [--people N]
+"""
+import argparse
+import json
+import os.path
+import random
+import sys
+
+from textbites.bible.data import BIBLE_ABBRS
+
+
+DEFAULT_SOURCE = os.path.join(os.path.dirname(__file__), "data",
+                              "_pride_and_prejudice.pg1342.txt")
+# words per line
+WORDS = (8, 30)
+FIRST_NAMES = ["Elizabeth", "Jane", "Mary", "Kitty", "Lydia", "Charlotte",
+               "Georgiana", "Caroline", "Fitzwilliam", "Charles", "George",
+               "William", "Edward", "Thomas", "Louisa", "Anne"]
+LAST_NAMES = ["Bennet", "Darcy", "Bingley", "Wickham", "Collins", "Lucas",
+              "Gardiner", "Phillips", "Hurst", "Long", "Forster", "Denny",
+              "Reynolds", "Jenkinson", "Pope", "Younge"]
+
+
+class Generator(object):
+  """ Random text and names, seeded.
+  """
+
+  def __init__(self, seed=0, source=DEFAULT_SOURCE):
+    self.rand = random.Random(seed)
+    with open(source, 'r') as f:
+      self.words = f.read().split()
+
+  def text(self, words=WORDS):
+    """ A line of between words[0] and words[1] random words.
+    """
+    count = self.rand.randint(words[0], words[1])
+    return " ".join(self.rand.choices(self.words, k=count))
+
+  def bible(self, version, books=len(BIBLE_ABBRS), chapters=20, verses=25,
+            words=WORDS):
+    """ Data for a bible.json file, with books named after the first books
+        of the Bible.
+    """
+    names = list(BIBLE_ABBRS)
+    if books > len(names):
+      raise ValueError("At most %d books" % len(names))
+    data = { "version" : version, "books" : [] }
+    for name in names[:books]:
+      book = { "name" : name, "chapters" : [] }
+      for cnum in range(1, chapters + 1):
+        book["chapters"].append({ "num" : cnum,
+            "verses" : [{ "num" : vnum, "text" : self.text(words) }
+                          for vnum in range(1, verses + 1)] })
+      data["books"].append(book)
+    return data
+
+  def simple_book(self, title, chapters=60, lines=40, words=WORDS):
+    """ Data for a simple.json file.
+    """
+    return { "title" : title,
+             "author" : "Synthetic",
+             "chapters" : [{ "name" : "Chapter %d" % cnum,
+                             "text" : "\n".join(self.text(words)
+                                                  for _ in range(lines)) }
+                           for cnum in range(1, chapters + 1)] }
+
+  def person(self, n):
+    """ The unique name of the nth person, of at most 3 words.
+    """
+    first = FIRST_NAMES[n % len(FIRST_NAMES)]
+    n //= len(FIRST_NAMES)
+    name = first + " " + LAST_NAMES[n % len(LAST_NAMES)]
+    n //= len(LAST_NAMES)
+    return name + " %d" % (n + 1) if n else name
+
+  def quotes(self, count, people, words=WORDS):
+    """ Generate count (name, date, quote) rows, said by people people.
+    """
+    names = [self.person(n) for n in range(people)]
+    dates = []
+    for _ in range(people):
+      born = self.rand.randint(1500, 1950)
+      dates.append("%d-%d" % (born, born + self.rand.randint(30, 90)))
+    for _ in range(count):
+      n = self.rand.randrange(people)
+      yield names[n], dates[n], self.text(words)
+
+
+def write_bible(filename, seed=0, version="SYN", **sizes):
+  """ Write a bible.json file, see Generator.bible for the sizes.
+  """
+  with open(filename, 'w') as f:
+    json.dump(Generator(seed).bible(version, **sizes), f)
+
+
+def write_simple_book(filename, seed=0, title="SYNTHETIC", **sizes):
+  """ Write a simple.json file, see Generator.simple_book for the sizes.
+  """
+  with open(filename, 'w') as f:
+    json.dump(Generator(seed).simple_book(title, **sizes), f)
+
+
+def write_quotes(filename, seed=0, count=1000, people=100, words=WORDS):
+  """ Write a quotes.tsv file, a row at a time.
+  """
+  with open(filename, 'w') as f:
+    for name, date, quote in Generator(seed).quotes(count, people, words):
+      f.write('%s\t%s\t"%s"\n' % (name, date, quote))
+
+
+def generate(out_dir, seed=0, translations=1, books=len(BIBLE_ABBRS),
+             chapters=20, verses=25, lines=40, quotes=1000, people=100):
+  """ Write translations bible.json files, a simple.json book of the same
+      number of chapters as each bible book, and a quotes.tsv file into
+      out_dir, returning their names. Each file has its own seed derived
+      from seed.
+  """
+  filenames = []
+  for n in range(1, translations + 1):
+    filename = os.path.join(out_dir, "SYN%d.bible.json" % n)
+    write_bible(filename, seed + n, "SYN%d" % n, books=books,
+                chapters=chapters, verses=verses)
+    filenames.append(filename)
+  filename = os.path.join(out_dir, "SYNBook.simple.json")
+  write_simple_book(filename, seed, chapters=chapters, lines=lines)
+  filenames.append(filename)
+  filename = os.path.join(out_dir, "SYNQuotes.quotes.tsv")
+  write_quotes(filename, seed, quotes, people)
+  filenames.append(filename)
+  return filenames
+
+
+def main(args):
+  parser = argparse.ArgumentParser(description="Generate synthetic data files")
+  parser.add_argument("out_dir")
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--translations", type=int, default=1,
+                      help="number of bible.json files")
+  parser.add_argument("--books", type=int, default=len(BIBLE_ABBRS),
+                      help="books per bible, at most %d" % len(BIBLE_ABBRS))
+  parser.add_argument("--chapters", type=int, default=20,
+                      help="chapters per bible book and simple book")
+  parser.add_argument("--verses", type=int, default=25,
+                      help="verses per bible chapter")
+  parser.add_argument("--lines", type=int, default=40,
+                      help="lines per simple book chapter")
+  parser.add_argument("--quotes", type=int, default=1000)
+  parser.add_argument("--people", type=int, default=100,
+                      help="number of people the quotes are by")
+  args = parser.parse_args(args[1:])
+  if not os.path.isdir(args.out_dir):
+    os.makedirs(args.out_dir)
+  for filename in generate(args.out_dir, args.seed, args.translations,
+                           args.books, args.chapters, args.verses,
+                           args.lines, args.quotes, args.people):
+    print("Wrote", filename)
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv))
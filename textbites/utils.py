@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+from itertools import islice
 
 def zero_indexed(val, none_val=None):
   """ Convert this 1-based index to a 0-based one,
@@ -18,3 +19,9 @@ def safe_int(val):
 def min0(val):
   return 0 if val < 0 else val
 
+def paginate(refs, limit=None, offset=0):
+  """ List of up to limit refs after skipping offset of them, consuming
+      no more of the refs iterable than needed.
+  """
+  stop = None if limit == None else offset + limit
+  return list(islice(refs, offset, stop))